@@ -4,26 +4,57 @@ app/agents/graph_system.py - VERSIÓN OPTIMIZADA CON LANGGRAPH
 - 1 query unificada para RAG + Productos
 - Cache embeddings reducido (10 items)
 - Checkpointer optimizado
+- Grafo compilado una vez por proceso (sesión DB por turno vía config)
+- Escrituras del turno en una sola transacción (TurnUnitOfWork)
+- Embeddings de mensajes fuera del camino crítico (write-behind)
+- Circuit breaker en LLM y embeddings: modo degradado con plantillas y reglas
 """
 
-from typing import TypedDict, Annotated, Sequence, Dict, Any
+from typing import TypedDict, Annotated, Sequence, Dict, Any, Optional
 from langgraph.graph import StateGraph, END
+from langgraph.graph.message import add_messages
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
 from langchain_openai import ChatOpenAI
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import text, update as sql_update
+from sqlalchemy import text
 from datetime import datetime, timezone
-from uuid import UUID
-import operator
+from uuid import UUID, uuid4
+import asyncio
 import json
+import time
 
+from app.config import settings
 from app.models import Lead, Conversacion, Mensaje
 from app.services.embeddings import embedding_service
+from app.services.http_client import get_async_http_client
+from app.services.embedding_queue import message_embedding_queue
+from app.services.hybrid_search import hybrid_product_search
+from app.services.semantic_cache import lexical_key, semantic_cache
+from app.services.pre_extraction import pre_extract, record
+from app.services.circuit_breaker import llm_breaker, CircuitOpenError
+from app.services.checkpointer import default_checkpointer
+from app.services.metrics import (
+    metrics,
+    count_db_statements,
+    COUNT_BUCKETS,
+    FINE_LATENCY_BUCKETS_MS,
+)
+from app.agents.response_templates import response_templates
+from app.services.unit_of_work import TurnUnitOfWork
 from app.tools.email_tools import send_lead_notification, send_client_card
 
 
+# Estrategias que cierran la conversación (pasan por _finalize)
+CLOSING_STRATEGIES = {"farewell", "close_confirmed", "soft_close"}
+
+
+class DeltaSendError(Exception):
+    """Fallo enviando un delta al cliente: no cuenta como fallo del LLM"""
+
+
 class AgentState(TypedDict):
-    messages: Annotated[Sequence[BaseMessage], operator.add]
+    messages: Annotated[Sequence[BaseMessage], add_messages]
     lead_id: str
     conversacion_id: str
     session_id: str
@@ -43,33 +74,123 @@ class AgentState(TypedDict):
 
 
 class SalesAgent:
-    def __init__(self, db: AsyncSession, openai_key: str, checkpointer=None):
-        self.db = db
+    """
+    Runtime compartido por proceso: LLMs y grafo se construyen una sola vez.
+    La sesión DB de cada turno llega a los nodos vía config["configurable"]["db"].
+    """
+
+    _instance = None
+
+    def __init__(self, openai_key: str, checkpointer=None):
+        # Ambos LLMs (y los embeddings) comparten el pool keep-alive del proceso
+        self.http_client = get_async_http_client()
         self.llm = ChatOpenAI(
             model="gpt-4o-mini",
             temperature=0.7,
             api_key=openai_key,
+            base_url=settings.OPENAI_BASE_URL,
             max_tokens=400,
             timeout=25.0,
+            http_async_client=self.http_client,
         )
         self.extractor_llm = ChatOpenAI(
-            model="gpt-4o-mini", temperature=0.0, api_key=openai_key, max_tokens=200
+            model="gpt-4o-mini",
+            temperature=0.0,
+            api_key=openai_key,
+            base_url=settings.OPENAI_BASE_URL,
+            max_tokens=200,
+            http_async_client=self.http_client,
         )
         self.checkpointer = checkpointer
         self.graph = self._build_graph()
 
+    @classmethod
+    def get_instance(cls, openai_key: str, checkpointer=None) -> "SalesAgent":
+        if cls._instance is None:
+            cls._instance = cls(openai_key, checkpointer)
+        elif cls._instance.http_client.is_closed:
+            # http_client.aclose() cerró el pool: se recrea con uno nuevo
+            cls._instance = cls(openai_key, checkpointer or cls._instance.checkpointer)
+        elif checkpointer is not None and checkpointer is not cls._instance.checkpointer:
+            # El grafo compilado fija el checkpointer: se recompila con el nuevo
+            cls._instance.checkpointer = checkpointer
+            cls._instance.graph = cls._instance._build_graph()
+        return cls._instance
+
+    @staticmethod
+    def _get_db(config: RunnableConfig) -> AsyncSession:
+        return config["configurable"]["db"]
+
+    @staticmethod
+    def _get_uow(config: RunnableConfig) -> TurnUnitOfWork:
+        return config["configurable"]["uow"]
+
+    @staticmethod
+    def _instrumented(name: str, node):
+        async def run(state: AgentState, config: RunnableConfig) -> AgentState:
+            start = time.perf_counter()
+            with count_db_statements() as statements:
+                result = await node(state, config)
+            metrics.observe(f"agent.node.{name}.ms", (time.perf_counter() - start) * 1000)
+            metrics.observe(
+                f"agent.node.{name}.db_roundtrips", statements[0], buckets=COUNT_BUCKETS
+            )
+            return result
+
+        return run
+
+    @staticmethod
+    def _lead_score(extracted: dict) -> int:
+        score = 0
+        urgencia = extracted.get("urgencia_dias")
+        presupuesto = extracted.get("presupuesto_declarado")
+
+        if urgencia is not None:
+            if urgencia <= 7:
+                score += 40
+            elif urgencia <= 30:
+                score += 20
+
+        if presupuesto is not None:
+            if presupuesto >= 100:
+                score += 30
+            elif presupuesto >= 50:
+                score += 15
+
+        if extracted.get("es_decisor") is True:
+            score += 20
+
+        # Bonus por datos capturados
+        if extracted.get("nombre"):
+            score += 10
+        if extracted.get("email"):
+            score += 15
+        if extracted.get("telefono"):
+            score += 10
+
+        return min(score, 100)
+
     def _build_graph(self) -> StateGraph:
         workflow = StateGraph(AgentState)
 
-        workflow.add_node("initialize", self._initialize)
-        workflow.add_node("extract_with_llm", self._extract_with_llm)
-        workflow.add_node("qualify", self._qualify)
-        workflow.add_node("respond", self._respond)
-        workflow.add_node("finalize", self._finalize)
+        # parallel: la respuesta se genera especulativamente durante la extracción
+        if settings.AGENT_EXECUTION_MODE == "parallel":
+            extract = ("extract_speculative", self._extract_speculative)
+        else:
+            extract = ("extract_with_llm", self._extract_with_llm)
+
+        for name, node in (
+            ("initialize", self._initialize),
+            extract,
+            ("qualify", self._qualify),
+            ("respond", self._respond),
+            ("finalize", self._finalize),
+        ):
+            workflow.add_node(name, self._instrumented(name, node))
 
         workflow.set_entry_point("initialize")
-        workflow.add_edge("initialize", "extract_with_llm")
-        workflow.add_edge("extract_with_llm", "qualify")
+        workflow.add_edge("initialize", extract[0])
+        workflow.add_edge(extract[0], "qualify")
         workflow.add_edge("qualify", "respond")
 
         workflow.add_conditional_edges(
@@ -88,10 +209,19 @@ class SalesAgent:
                 return msg.content
         return ""
 
-    async def _initialize(self, state: AgentState) -> AgentState:
+    def _get_last_ai_message(self, state: AgentState) -> str:
+        for msg in reversed(state["messages"]):
+            if isinstance(msg, AIMessage):
+                return msg.content
+        return ""
+
+    async def _initialize(
+        self, state: AgentState, config: RunnableConfig
+    ) -> AgentState:
+        db = self._get_db(config)
         session_id = state["session_id"]
 
-        result = await self.db.execute(
+        result = await db.execute(
             text("SELECT get_conversation_state(:session_id)"),
             {"session_id": session_id},
         )
@@ -107,19 +237,17 @@ class SalesAgent:
             return state
 
         if not db_state or not db_state.get("conversacion_id"):
-            lead = Lead(origen="web_chat", estado="nuevo")
-            self.db.add(lead)
-            await self.db.flush()
-
+            uow = self._get_uow(config)
+            lead = Lead(id=uuid4(), origen="web_chat", estado="nuevo")
             conv = Conversacion(
+                id=uuid4(),
                 lead_id=lead.id,
                 session_id=session_id,
                 canal="web_chat",
                 estado="activa",
             )
-            self.db.add(conv)
-            await self.db.flush()
-            await self.db.commit()
+            uow.add(lead)
+            uow.add(conv)
 
             state.update(
                 {
@@ -143,18 +271,14 @@ class SalesAgent:
             )
             state["messages"].append(AIMessage(content=saludo_inicial))
 
-            embedding = embedding_service.encode_single(saludo_inicial)
-            mensaje = Mensaje(
-                conversacion_id=UUID(state["conversacion_id"]),
-                lead_id=UUID(state["lead_id"]),
-                rol="assistant",
-                contenido=saludo_inicial,
-                embedding=embedding,
-                intenciones={"strategy": "greeting", "is_initial": True},
+            self._queue_message(
+                config,
+                state["conversacion_id"],
+                state["lead_id"],
+                "assistant",
+                saludo_inicial,
+                {"strategy": "greeting", "is_initial": True},
             )
-            self.db.add(mensaje)
-            await self.db.flush()
-            await self.db.commit()
         else:
             estado_agente = db_state.get("estado_agente", {})
             extracted = estado_agente.get("extracted_data", {})
@@ -182,7 +306,9 @@ class SalesAgent:
 
         return state
 
-    async def _extract_with_llm(self, state: AgentState) -> AgentState:
+    async def _extract_with_llm(
+        self, state: AgentState, config: RunnableConfig
+    ) -> AgentState:
         if state.get("should_close"):
             return state
 
@@ -208,7 +334,14 @@ class SalesAgent:
         if not missing_fields:
             return state
 
-        extraction_prompt = f"""Extrae SOLO los datos faltantes del mensaje del usuario.
+        # Nivel 1: reglas deterministas; el LLM solo si quedan indicios sin resolver
+        pre = pre_extract(user_msg, missing_fields, self._get_last_ai_message(state))
+        record(pre)
+        current_data.update(pre.data)
+        missing_fields = [f for f in missing_fields if f not in pre.data]
+
+        if pre.needs_llm and missing_fields:
+            extraction_prompt = f"""Extrae SOLO los datos faltantes del mensaje del usuario.
 
 MENSAJE: "{user_msg}"
 
@@ -236,145 +369,171 @@ REGLAS:
 
 RESPONDE SOLO JSON CON LOS CAMPOS FALTANTES:"""
 
-        extraction_msg = await self.extractor_llm.ainvoke(
-            [
-                SystemMessage(
-                    content="Eres un extractor de datos. Responde SOLO JSON válido con campos faltantes."
-                ),
-                HumanMessage(content=extraction_prompt),
-            ]
-        )
+            try:
+                extraction_msg = await llm_breaker.call(
+                    lambda: self.extractor_llm.ainvoke(
+                        [
+                            SystemMessage(
+                                content="Eres un extractor de datos. Responde SOLO JSON válido con campos faltantes."
+                            ),
+                            HumanMessage(content=extraction_prompt),
+                        ]
+                    ),
+                    settings.LLM_EXTRACTION_TIMEOUT_S,
+                )
+                raw_response = extraction_msg.content.strip()
+                if raw_response.startswith("```json"):
+                    raw_response = raw_response.split("```json")[1].split("```")[0].strip()
+                elif raw_response.startswith("```"):
+                    raw_response = raw_response.split("```")[1].split("```")[0].strip()
+
+                extracted = json.loads(raw_response)
+
+                for k, v in extracted.items():
+                    if (
+                        k in missing_fields
+                        and v
+                        and v not in [None, "", "null", "N/A", "None"]
+                    ):
+                        current_data[k] = v
+
+            except CircuitOpenError:
+                # Modo degradado: solo lo que resolvieron las reglas
+                metrics.inc("extraction.degraded")
+            except Exception as e:
+                print(f"Error extracción LLM: {e}")
 
-        try:
-            raw_response = extraction_msg.content.strip()
-            if raw_response.startswith("```json"):
-                raw_response = raw_response.split("```json")[1].split("```")[0].strip()
-            elif raw_response.startswith("```"):
-                raw_response = raw_response.split("```")[1].split("```")[0].strip()
-
-            extracted = json.loads(raw_response)
-
-            for k, v in extracted.items():
-                if (
-                    k in missing_fields
-                    and v
-                    and v not in [None, "", "null", "N/A", "None"]
-                ):
-                    current_data[k] = v
-
-            state["extracted_data"] = current_data
-
-            if current_data:
-                updates = {}
-                if current_data.get("nombre"):
-                    updates["nombre_completo"] = current_data["nombre"]
-                if current_data.get("email"):
-                    updates["email"] = current_data["email"]
-                if current_data.get("telefono"):
-                    updates["telefono"] = current_data["telefono"]
-                if current_data.get("empresa"):
-                    updates["empresa"] = current_data["empresa"]
-                if current_data.get("sector"):
-                    updates["sector"] = current_data["sector"]
-                if current_data.get("urgencia_dias") is not None:
-                    updates["urgencia_dias"] = current_data["urgencia_dias"]
-                if current_data.get("presupuesto_declarado") is not None:
-                    updates["presupuesto_declarado"] = current_data[
-                        "presupuesto_declarado"
-                    ]
-                if current_data.get("es_decisor") is not None:
-                    updates["es_decisor"] = current_data["es_decisor"]
-
-                if updates:
-                    score = 0
-                    urgencia = current_data.get("urgencia_dias")
-                    presupuesto = current_data.get("presupuesto_declarado")
-                    decisor = current_data.get("es_decisor")
-
-                    if urgencia is not None and urgencia <= 7:
-                        score += 40
-                    elif urgencia is not None and urgencia <= 30:
-                        score += 20
-
-                    if presupuesto is not None and presupuesto >= 100:
-                        score += 30
-                    elif presupuesto is not None and presupuesto >= 50:
-                        score += 15
-
-                    if decisor is True:
-                        score += 20
-
-                    updates["score_total"] = min(score, 100)
-                    updates["updated_at"] = datetime.now(timezone.utc)
-
-                    await self.db.execute(
-                        sql_update(Lead)
-                        .where(Lead.id == UUID(state["lead_id"]))
-                        .values(**updates)
-                    )
-                    await self.db.commit()
+        if current_data == state["extracted_data"]:
+            return state
+        state["extracted_data"] = current_data
+
+        updates = {}
+        if current_data.get("nombre"):
+            updates["nombre_completo"] = current_data["nombre"]
+        if current_data.get("email"):
+            updates["email"] = current_data["email"]
+        if current_data.get("telefono"):
+            updates["telefono"] = current_data["telefono"]
+        if current_data.get("empresa"):
+            updates["empresa"] = current_data["empresa"]
+        if current_data.get("sector"):
+            updates["sector"] = current_data["sector"]
+        if current_data.get("urgencia_dias") is not None:
+            updates["urgencia_dias"] = current_data["urgencia_dias"]
+        if current_data.get("presupuesto_declarado") is not None:
+            updates["presupuesto_declarado"] = current_data[
+                "presupuesto_declarado"
+            ]
+        if current_data.get("es_decisor") is not None:
+            updates["es_decisor"] = current_data["es_decisor"]
 
-        except Exception as e:
-            print(f"Error extracción LLM: {e}")
+        if updates:
+            # score_total se calcula una sola vez en _respond
+            updates["updated_at"] = datetime.now(timezone.utc)
+            self._get_uow(config).update_lead(state["lead_id"], **updates)
 
         return state
 
-    def _detect_product_interest(self, user_msg: str) -> str:
-        msg_lower = user_msg.lower()
-
-        dashboard_keywords = [
-            "dashboard",
-            "analítico",
-            "analytics",
-            "métricas",
-            "reportes",
-            "datos",
-            "visualiz",
-            "kpi",
-            "indicadores",
-            "análisis",
-            "business intelligence",
-            "bi",
-        ]
-        crm_keywords = [
-            "crm",
-            "facturación",
-            "sunat",
-            "clientes",
-            "gestión",
-            "ventas",
-            "factura",
-            "boleta",
-            "comprobante",
-            "facturacion",
-        ]
-        agentes_keywords = [
-            "agente",
-            "cobranza",
-            "whatsapp",
-            "automatización",
-            "bot",
-            "chatbot",
-            "inteligencia artificial",
-            "automático",
-            "chatbot",
-        ]
-
-        for kw in dashboard_keywords:
-            if kw in msg_lower:
-                return "dashboard"
+    async def _extract_speculative(
+        self, state: AgentState, config: RunnableConfig
+    ) -> AgentState:
+        """
+        Modo paralelo: la extracción corre a la vez que la respuesta especulativa.
+        La estrategia se predice con el estado previo al turno (productos
+        detectados incluidos); _respond la usa solo si la estrategia real coincide.
+        """
+        if state.get("should_close"):
+            return state
 
-        for kw in crm_keywords:
-            if kw in msg_lower:
-                return "crm-facturacion"
+        previo = {
+            **state,
+            "messages": list(state["messages"]),
+            "extracted_data": dict(state["extracted_data"]),
+            "interest_signals": list(state["interest_signals"]),
+            "productos_recomendados": list(state["productos_recomendados"]),
+        }
+        extraction = asyncio.create_task(self._extract_with_llm(state, config))
+        try:
+            # La sesión DB solo la usa esta rama mientras la extracción corre
+            if not previo["productos_recomendados"]:
+                previo = await self._qualify(previo, config)
+            strategy = self._choose_strategy(previo)
+            if not response_templates.handles(strategy) and not llm_breaker.is_open:
+                # Contenedor del turno: LangGraph copia "configurable" entre nodos
+                config["configurable"]["speculation"]["respuesta"] = (
+                    strategy,
+                    asyncio.create_task(
+                        llm_breaker.call(
+                            lambda: self._llm_response(previo, strategy, None),
+                            settings.LLM_RESPONSE_TIMEOUT_S,
+                        )
+                    ),
+                )
+                metrics.inc("agent.speculation.started")
+        except Exception as e:
+            print(f"Error especulación: {e}")
+        finally:
+            state = await extraction
 
-        for kw in agentes_keywords:
-            if kw in msg_lower:
-                return "agentes-ia"
+        # Productos ya detectados con el mismo sector: _qualify no repite la búsqueda
+        if (
+            previo["productos_recomendados"]
+            and not state["productos_recomendados"]
+            and previo["extracted_data"].get("sector") == state["extracted_data"].get("sector")
+        ):
+            state["productos_recomendados"] = previo["productos_recomendados"]
 
-        return None
+        return state
 
-    async def _qualify(self, state: AgentState) -> AgentState:
+    @staticmethod
+    async def _use_speculation(speculation, strategy: str) -> Optional[str]:
+        if not speculation:
+            return None
+        predicha, task = speculation
+        if predicha != strategy:
+            task.cancel()
+            metrics.inc("agent.speculation.misses")
+            return None
+        try:
+            response_text = await task
+        except Exception as e:
+            print(f"Error respuesta especulativa: {e}")
+            metrics.inc("agent.speculation.errors")
+            return None
+        metrics.inc("agent.speculation.hits")
+        return response_text
+
+    @staticmethod
+    def _discard_speculation(speculation) -> None:
+        if speculation:
+            speculation[1].cancel()
+            metrics.inc("agent.speculation.discarded")
+
+    async def _detect_product_interest(self, db: AsyncSession, user_msg: str) -> Optional[str]:
+        """Slug del producto por búsqueda híbrida (full-text + embeddings, RRF)"""
+        if not user_msg:
+            return None
+        try:
+            query_embedding = await embedding_service.embed_text_strict(user_msg)
+        except Exception as e:
+            if not isinstance(e, CircuitOpenError):
+                print(f"Error embedding: {e}")
+            # Sin embeddings: solo el ranking full-text
+            return await hybrid_product_search.detect_product(db, user_msg, None)
+        # La búsqueda full-text distingue cifras y códigos que el embedding no
+        lexical = lexical_key(user_msg)
+        cached = semantic_cache.get("producto", query_embedding, lexical)
+        if cached is not None:
+            return cached or None
+        slug = await hybrid_product_search.detect_product(db, user_msg, query_embedding)
+        # "" = sin producto: también se cachea para no repetir la búsqueda
+        semantic_cache.set("producto", query_embedding, slug or "", lexical)
+        return slug
+
+    async def _qualify(
+        self, state: AgentState, config: RunnableConfig
+    ) -> AgentState:
+        db = self._get_db(config)
         if state.get("should_close"):
             return state
 
@@ -419,39 +578,6 @@ RESPONDE SOLO JSON CON LOS CAMPOS FALTANTES:"""
 
         state["probability"] = max(0, min(100, score))
 
-        try:
-            lead_score = 0
-            urgencia = extracted.get("urgencia_dias")
-            presupuesto = extracted.get("presupuesto_declarado")
-            decisor = extracted.get("es_decisor")
-
-            if urgencia is not None and urgencia <= 7:
-                lead_score += 40
-            elif urgencia is not None and urgencia <= 30:
-                lead_score += 20
-
-            if presupuesto is not None and presupuesto >= 100:
-                lead_score += 30
-            elif presupuesto is not None and presupuesto >= 50:
-                lead_score += 15
-
-            if decisor is True:
-                lead_score += 20
-
-            lead_score = min(lead_score, 100)
-
-            if lead_score > 0:
-                await self.db.execute(
-                    sql_update(Lead)
-                    .where(Lead.id == UUID(state["lead_id"]))
-                    .values(
-                        score_total=lead_score, updated_at=datetime.now(timezone.utc)
-                    )
-                )
-                await self.db.commit()
-        except Exception as e:
-            print(f"Error actualizando score: {e}")
-
         if state["probability"] < 40:
             state["current_stage"] = "descubrimiento"
         elif state["probability"] < 70:
@@ -465,42 +591,15 @@ RESPONDE SOLO JSON CON LOS CAMPOS FALTANTES:"""
         user_msg = self._get_user_message(state)
         interes_producto = None
 
-        # Primero intenta detectar por keywords
-        interes_producto = self._detect_product_interest(user_msg)
-
-        # Si no hay keyword, usar RAG para buscar productos similares
-        if not interes_producto and user_msg:
-            try:
-                query_embedding = embedding_service.encode_single(user_msg)
-                result = await self.db.execute(
-                    text("""
-                        SELECT metadata->>'producto_id' as producto_id
-                        FROM conocimiento_rag
-                        WHERE tipo = 'guia_producto'
-                        AND activo = TRUE
-                        AND (1 - (embedding <=> CAST(:embedding AS vector))) >= 0.5
-                        ORDER BY embedding <=> CAST(:embedding AS vector)
-                        LIMIT 1
-                    """),
-                    {"embedding": str(query_embedding)},
-                )
-                rag_row = result.fetchone()
-                if rag_row and rag_row[0]:
-                    # Buscar producto por ID
-                    prod_result = await self.db.execute(
-                        text("SELECT slug FROM productos WHERE id = :id"),
-                        {"id": rag_row[0]},
-                    )
-                    prod_row = prod_result.fetchone()
-                    if prod_row:
-                        interes_producto = prod_row[0]
-            except Exception as e:
-                print(f"Error RAG productos: {e}")
+        try:
+            interes_producto = await self._detect_product_interest(db, user_msg)
+        except Exception as e:
+            print(f"Error RAG productos: {e}")
 
         sector = extracted.get("sector")
 
         if interes_producto:
-            result = await self.db.execute(
+            result = await db.execute(
                 text("""
                     SELECT p.nombre, p.descripcion_corta, p.precio_base, p.slug,
                         json_agg(
@@ -533,7 +632,7 @@ RESPONDE SOLO JSON CON LOS CAMPOS FALTANTES:"""
             state["productos_recomendados"] = productos_lista
 
         elif sector and not state["productos_recomendados"]:
-            result = await self.db.execute(
+            result = await db.execute(
                 text("""
                     SELECT p.nombre, p.descripcion_corta, p.precio_base, p.slug,
                         json_agg(
@@ -568,8 +667,13 @@ RESPONDE SOLO JSON CON LOS CAMPOS FALTANTES:"""
 
         return state
 
-    async def _respond(self, state: AgentState) -> AgentState:
+    async def _respond(
+        self, state: AgentState, config: RunnableConfig
+    ) -> AgentState:
+        uow = self._get_uow(config)
+        speculation = config["configurable"]["speculation"].pop("respuesta", None)
         if state.get("should_close"):
+            self._discard_speculation(speculation)
             return state
 
         extracted = state["extracted_data"]
@@ -580,50 +684,206 @@ RESPONDE SOLO JSON CON LOS CAMPOS FALTANTES:"""
             f"DEBUG: msg_count={msg_count}, user_msg='{user_msg}', is_first={state.get('is_first_interaction')}"
         )
 
-        has_nombre = bool(extracted.get("nombre"))
-        has_sector = bool(extracted.get("sector"))
-        has_email = bool(extracted.get("email"))
-        has_telefono = bool(extracted.get("telefono"))
-        has_contact = has_email or has_telefono
-
         print(
-            f"DEBUG estrategia: msg_count={msg_count}, nombre={extracted.get('nombre')}, sector={has_sector}, email={has_email}, telefono={has_telefono}"
+            f"DEBUG estrategia: msg_count={msg_count}, nombre={extracted.get('nombre')}, sector={bool(extracted.get('sector'))}, email={bool(extracted.get('email'))}, telefono={bool(extracted.get('telefono'))}"
         )
 
         # SALUDO FIJO PARA PRIMERA INTERACCIÓN - retorna temprano
         if msg_count == 0 and not user_msg:
+            self._discard_speculation(speculation)
             return state
 
+        strategy = self._choose_strategy(state)
+        if strategy in CLOSING_STRATEGIES:
+            state["should_close"] = True
+
+        start = time.perf_counter()
+        productos = state["productos_recomendados"]
+        slots = {
+            "nombre": extracted.get("nombre"),
+            "producto": productos[0]["nombre"] if productos else None,
+            "email": extracted.get("email"),
+        }
+        seed = f"{state['conversacion_id']}:{msg_count}"
+        previous = self._get_last_ai_message(state)
+        response_text = response_templates.render(strategy, slots, seed, previous)
+        on_delta = config["configurable"].get("on_delta")
+        if response_text is not None:
+            metrics.inc("agent.fast_path")
+            self._discard_speculation(speculation)
+            if on_delta:
+                await on_delta(response_text)
+        else:
+            # Modo paralelo: respuesta generada durante la extracción
+            response_text = await self._use_speculation(speculation, strategy)
+            if response_text is not None:
+                if on_delta:
+                    await on_delta(response_text)
+            else:
+                metrics.inc("agent.llm_path")
+                emitidos = []
+
+                async def emitir(delta: str):
+                    await on_delta(delta)
+                    emitidos.append(delta)
+
+                try:
+                    if on_delta:
+                        # El breaker ve solo el upstream, no los envíos al cliente
+                        response_text = await self._stream_llm_response(state, strategy, emitir)
+                    else:
+                        response_text = await llm_breaker.call(
+                            lambda: self._llm_response(state, strategy, None),
+                            settings.LLM_RESPONSE_TIMEOUT_S,
+                        )
+                except DeltaSendError:
+                    raise
+                except Exception as e:
+                    if not isinstance(e, CircuitOpenError):
+                        print(f"Error respuesta LLM: {e}")
+                    # Modo degradado: la máquina de estrategias sigue, sin LLM
+                    metrics.inc("agent.degraded_path")
+                    response_text = response_templates.render_degraded(
+                        strategy, slots, seed, previous
+                    )
+                    if on_delta:
+                        # Si ya salió parte de la respuesta del LLM, el cliente
+                        # la reemplaza por la plantilla en vez de concatenarla
+                        await on_delta(response_text, replace=bool(emitidos))
+        metrics.observe(
+            f"agent.strategy.{strategy}.ms",
+            (time.perf_counter() - start) * 1000,
+            buckets=FINE_LATENCY_BUCKETS_MS,
+        )
+
+        state["messages"].append(AIMessage(content=response_text))
+
+        self._queue_message(
+            config,
+            state["conversacion_id"],
+            state["lead_id"],
+            "assistant",
+            response_text,
+            {"strategy": strategy, "probability": state["probability"]},
+        )
+
+        estado_agente_dict = {
+            "current_stage": state["current_stage"],
+            "extracted_data": extracted,
+            "lead_profile": state["profile"],
+            "cooperatividad_score": state["cooperatividad"],
+            "productos_recomendados": state["productos_recomendados"],
+        }
+
+        # Persistir probability en lead (único UPDATE de score del turno)
+        try:
+            uow.update_lead(
+                state["lead_id"],
+                score_total=self._lead_score(state["extracted_data"]),
+                updated_at=datetime.now(timezone.utc),
+            )
+        except Exception as e:
+            print(f"Error actualizando score lead: {e}")
+
+        uow.update_conversation(
+            state["conversacion_id"],
+            estado_agente=estado_agente_dict,
+            probabilidad_compra=state["probability"],
+            senales_interes=state["interest_signals"],
+        )
+
+        state["mensaje_count"] += 1
+        state["is_first_interaction"] = False
+
+        return state
+
+    def _choose_strategy(self, state: AgentState) -> str:
+        """Estrategia de respuesta a partir del estado (sin efectos)"""
+        extracted = state["extracted_data"]
+        msg_count = state["mensaje_count"]
+        user_msg = self._get_user_message(state)
+
+        has_nombre = bool(extracted.get("nombre"))
+        has_sector = bool(extracted.get("sector"))
+        has_email = bool(extracted.get("email"))
+        has_telefono = bool(extracted.get("telefono"))
+        has_contact = has_email or has_telefono
+
         despedida_kw = ["adios", "gracias chao", "hasta luego", "bye"]
         if any(kw in user_msg.lower() for kw in despedida_kw) and msg_count > 1:
-            state["should_close"] = True
-            strategy = "farewell"
+            return "farewell"
         elif msg_count == 0 and not user_msg:
-            strategy = "greeting"
+            return "greeting"
         elif state["is_first_interaction"]:
-            strategy = "greeting"
+            return "greeting"
         elif (
             not state.get("productos_recomendados")
             or len(state["productos_recomendados"]) == 0
         ):
-            strategy = "ask_product"
+            return "ask_product"
         elif not has_nombre:
-            strategy = "ask_name_only"
+            return "ask_name_only"
         elif has_nombre and not has_sector:
-            strategy = "ask_sector"
+            return "ask_sector"
         elif has_nombre and has_sector and has_email and has_telefono:
-            strategy = "close_confirmed"
-            state["should_close"] = True
+            return "close_confirmed"
         elif has_nombre and has_sector and not has_contact:
-            strategy = "present_ask_contact"
+            return "present_ask_contact"
         elif has_nombre and has_sector and (has_email or has_telefono):
             missing = "teléfono" if not has_telefono else "correo"
-            strategy = f"ask_missing_{missing}"
+            return f"ask_missing_{missing}"
         elif msg_count >= 10:
-            strategy = "soft_close"
-            state["should_close"] = True
+            return "soft_close"
         else:
-            strategy = "continue"
+            return "continue"
+
+    async def _stream_llm_response(self, state: AgentState, strategy: str, on_delta) -> str:
+        """
+        Streaming bajo llm_breaker contando solo el tiempo del upstream (primer
+        token y resto): un cliente lento o desconectado no abre el breaker.
+        Un error al enviar se propaga como DeltaSendError.
+        """
+        if not llm_breaker.allow():
+            metrics.inc(f"circuit.{llm_breaker.name}.rejected")
+            raise CircuitOpenError(llm_breaker.name)
+
+        upstream_s = 0.0
+
+        async def medir(chunks):
+            nonlocal upstream_s
+            iterador = chunks.__aiter__()
+            while True:
+                start = time.perf_counter()
+                try:
+                    chunk = await asyncio.wait_for(
+                        iterador.__anext__(),
+                        max(0.001, settings.LLM_RESPONSE_TIMEOUT_S - upstream_s),
+                    )
+                except StopAsyncIteration:
+                    return
+                finally:
+                    upstream_s += time.perf_counter() - start
+                yield chunk
+
+        async def enviar(delta: str):
+            try:
+                await on_delta(delta)
+            except Exception as e:
+                raise DeltaSendError(str(e)) from e
+
+        try:
+            response_text = await self._llm_response(state, strategy, enviar, medir)
+        except (DeltaSendError, asyncio.CancelledError):
+            llm_breaker.release()
+            raise
+        except Exception:
+            llm_breaker.record_failure()
+            raise
+        llm_breaker.record_success(upstream_s * 1000)
+        return response_text
+
+    async def _llm_response(self, state: AgentState, strategy: str, on_delta, wrap_stream=None) -> str:
+        extracted = state["extracted_data"]
 
         productos_info = ""
         if state["productos_recomendados"]:
@@ -719,86 +979,25 @@ REGLAS ABSOLUTAS:
         for msg in state["messages"][-5:]:
             messages.append(msg)
 
-        response = await self.llm.ainvoke(messages)
-        response_text = response.content.strip()
-
-        state["messages"].append(AIMessage(content=response_text))
-
-        embedding = embedding_service.encode_single(response_text)
-        mensaje = Mensaje(
-            conversacion_id=UUID(state["conversacion_id"]),
-            lead_id=UUID(state["lead_id"]),
-            rol="assistant",
-            contenido=response_text,
-            embedding=embedding,
-            intenciones={"strategy": strategy, "probability": state["probability"]},
-        )
-        self.db.add(mensaje)
-        await self.db.flush()
-
-        estado_agente_dict = {
-            "current_stage": state["current_stage"],
-            "extracted_data": extracted,
-            "lead_profile": state["profile"],
-            "cooperatividad_score": state["cooperatividad"],
-            "productos_recomendados": state["productos_recomendados"],
-        }
-
-        # Persistir probability en lead
-        try:
-            lead_score = 0
-            extracted = state["extracted_data"]
-
-            if extracted.get("urgencia_dias") is not None:
-                if extracted["urgencia_dias"] <= 7:
-                    lead_score += 40
-                elif extracted["urgencia_dias"] <= 30:
-                    lead_score += 20
-
-            if extracted.get("presupuesto_declarado") is not None:
-                if extracted["presupuesto_declarado"] >= 100:
-                    lead_score += 30
-                elif extracted["presupuesto_declarado"] >= 50:
-                    lead_score += 15
-
-            if extracted.get("es_decisor") is True:
-                lead_score += 20
-
-            # Bonus por datos capturados
-            if extracted.get("nombre"):
-                lead_score += 10
-            if extracted.get("email"):
-                lead_score += 15
-            if extracted.get("telefono"):
-                lead_score += 10
-
-            lead_score = min(lead_score, 100)
-
-            await self.db.execute(
-                sql_update(Lead)
-                .where(Lead.id == UUID(state["lead_id"]))
-                .values(score_total=lead_score, updated_at=datetime.now(timezone.utc))
-            )
-        except Exception as e:
-            print(f"Error actualizando score lead: {e}")
-
-        await self.db.execute(
-            sql_update(Conversacion)
-            .where(Conversacion.session_id == state["session_id"])
-            .values(
-                estado_agente=estado_agente_dict,
-                probabilidad_compra=state["probability"],
-                senales_interes=state["interest_signals"],
-            )
-        )
-
-        await self.db.commit()
-        state["mensaje_count"] += 1
-        state["is_first_interaction"] = False
-
-        return state
-
-    async def _finalize(self, state: AgentState) -> AgentState:
+        if on_delta:
+            chunks = []
+            stream = self.llm.astream(messages)
+            if wrap_stream is not None:
+                stream = wrap_stream(stream)
+            async for chunk in stream:
+                if chunk.content:
+                    chunks.append(chunk.content)
+                    await on_delta(chunk.content)
+            response_text = "".join(chunks).strip()
+        else:
+            response = await self.llm.ainvoke(messages)
+            response_text = response.content.strip()
+        return response_text
+
+    async def _finalize(
+        self, state: AgentState, config: RunnableConfig
+    ) -> AgentState:
+        uow = self._get_uow(config)
         extracted = state["extracted_data"]
         prob = state["probability"]
         email = extracted.get("email")
@@ -812,38 +1011,98 @@ REGLAS ABSOLUTAS:
                 if email:
                     await send_client_card(email_cliente=email, nombre_cliente=nombre)
 
-                await self.db.execute(
-                    sql_update(Conversacion)
-                    .where(Conversacion.id == UUID(state["conversacion_id"]))
-                    .values(
-                        email_notificacion_enviado=True,
-                        fecha_email_enviado=datetime.now(timezone.utc),
-                    )
+                uow.update_conversation(
+                    state["conversacion_id"],
+                    email_notificacion_enviado=True,
+                    fecha_email_enviado=datetime.now(timezone.utc),
                 )
             except Exception as e:
                 print(f"Error emails: {e}")
 
-        await self.db.execute(
-            sql_update(Conversacion)
-            .where(Conversacion.id == UUID(state["conversacion_id"]))
-            .values(estado="finalizada", fin_sesion=datetime.now(timezone.utc))
+        uow.update_conversation(
+            state["conversacion_id"],
+            estado="finalizada",
+            fin_sesion=datetime.now(timezone.utc),
         )
-        await self.db.commit()
 
         return state
 
-    async def _is_conversation_closed(self, session_id: str) -> bool:
-        result = await self.db.execute(
+    async def _is_conversation_closed(self, db: AsyncSession, session_id: str) -> bool:
+        result = await db.execute(
             text("SELECT estado FROM conversaciones WHERE session_id = :sid LIMIT 1"),
             {"sid": session_id},
         )
         row = result.fetchone()
         return row is not None and row[0] == "finalizada"
 
+    @staticmethod
+    def _queue_message(
+        config: RunnableConfig,
+        conversacion_id: str,
+        lead_id: str,
+        rol: str,
+        contenido: str,
+        intenciones: dict = None,
+    ) -> None:
+        config["configurable"]["pending_messages"].append(
+            {
+                "conversacion_id": conversacion_id,
+                "lead_id": lead_id,
+                "rol": rol,
+                "contenido": contenido,
+                "intenciones": intenciones,
+            }
+        )
+
+    @staticmethod
+    def _add_messages(uow: TurnUnitOfWork, pending: list) -> None:
+        # Se insertan con embedding NULL; el write-behind lo rellena tras el commit
+        mensajes = [
+            Mensaje(
+                id=uuid4(),
+                conversacion_id=UUID(item["conversacion_id"]),
+                lead_id=UUID(item["lead_id"]),
+                rol=item["rol"],
+                contenido=item["contenido"],
+                embedding=None,
+                intenciones=item["intenciones"],
+            )
+            for item in pending
+        ]
+        for mensaje in mensajes:
+            uow.add(mensaje)
+
+        def encolar_embeddings():
+            for mensaje in mensajes:
+                message_embedding_queue.enqueue(mensaje.id, mensaje.contenido)
+
+        uow.after_commit(encolar_embeddings)
+
+    async def persist_pending(self, db: AsyncSession, pending: list) -> None:
+        """Persiste los mensajes diferidos de un turno en modo streaming"""
+        if not pending:
+            return
+        uow = TurnUnitOfWork()
+        self._add_messages(uow, pending)
+        try:
+            await uow.commit(db)
+        except Exception as e:
+            print(f"Error persistiendo mensajes diferidos: {e}")
+
     async def process_message(
-        self, session_id: str, message: str = None, initial_state: dict = None
+        self,
+        db: AsyncSession,
+        session_id: str,
+        message: str = None,
+        initial_state: dict = None,
+        on_delta=None,
     ) -> dict:
-        if await self._is_conversation_closed(session_id):
+        """
+        Procesa un turno. Con on_delta (async callable) la respuesta se emite
+        token a token y la persistencia de mensajes queda en result["pending_messages"],
+        que el llamador debe pasar a persist_pending() después del frame final.
+        """
+        if await self._is_conversation_closed(db, session_id):
             return {
                 "response": "Esta conversación ha finalizado. Por favor, recarga la página para iniciar una nueva.",
                 "state": {},
@@ -853,32 +1112,73 @@ REGLAS ABSOLUTAS:
                 "extracted": {},
                 "productos": [],
                 "closed": True,
+                "pending_messages": [],
             }
 
-        state = initial_state or {"messages": [], "session_id": session_id}
+        if self.checkpointer is not None:
+            # El estado previo del hilo sale del checkpoint, no del llamador
+            state = {"messages": [], "session_id": session_id}
+        else:
+            state = initial_state or {"messages": [], "session_id": session_id}
 
         if message:
             state["messages"].append(HumanMessage(content=message))
 
-        config = {"configurable": {"thread_id": session_id}}
-        final_state = await self.graph.ainvoke(state, config)
+        turn_start = time.perf_counter()
+        uow = TurnUnitOfWork()
+        pending_messages = []
+        config = {
+            "configurable": {
+                "thread_id": session_id,
+                "db": db,
+                "uow": uow,
+                "on_delta": on_delta,
+                "pending_messages": pending_messages,
+                "speculation": {},
+            }
+        }
+        try:
+            try:
+                final_state = await self.graph.ainvoke(state, config)
+            finally:
+                self._discard_speculation(
+                    config["configurable"]["speculation"].pop("respuesta", None)
+                )
+
+            if (
+                message
+                and final_state.get("conversacion_id")
+                and final_state.get("lead_id")
+            ):
+                self._queue_message(
+                    config,
+                    final_state["conversacion_id"],
+                    final_state["lead_id"],
+                    "user",
+                    message,
+                )
 
-        if (
-            message
-            and final_state.get("conversacion_id")
-            and final_state.get("lead_id")
-        ):
-            embedding = embedding_service.encode_single(message)
-            user_msg = Mensaje(
-                conversacion_id=UUID(final_state["conversacion_id"]),
-                lead_id=UUID(final_state["lead_id"]),
-                rol="user",
-                contenido=message,
-                embedding=embedding,
-            )
-            self.db.add(user_msg)
-            await self.db.flush()
-            await self.db.commit()
+            # Sin streaming los mensajes entran en la transacción del turno;
+            # en streaming los persiste el llamador tras el frame final
+            if not on_delta and pending_messages:
+                self._add_messages(uow, pending_messages)
+                pending_messages = []
+
+            await uow.commit(db)
+        except BaseException:
+            # Sin commit del turno, sus checkpoints tampoco valen
+            discard = getattr(self.checkpointer, "discard", None)
+            if discard is not None:
+                discard(session_id)
+            raise
+
+        # Checkpoints del turno en un solo INSERT, con la conexión ya liberada
+        flush = getattr(self.checkpointer, "flush", None)
+        if flush is not None:
+            await flush(session_id)
+        turn_ms = (time.perf_counter() - turn_start) * 1000
+        metrics.observe("agent.turn.ms", turn_ms)
+        metrics.observe(f"agent.turn.{settings.AGENT_EXECUTION_MODE}.ms", turn_ms)
 
         last_ai_msg = None
         for msg in reversed(final_state["messages"]):
@@ -895,10 +1195,16 @@ REGLAS ABSOLUTAS:
             "extracted": final_state.get("extracted_data", {}),
             "productos": final_state.get("productos_recomendados", []),
             "closed": final_state.get("should_close", False),
+            "pending_messages": pending_messages,
         }
 
 
-async def initialize_system(
-    db: AsyncSession, openai_key: str, checkpointer=None
-) -> SalesAgent:
-    return SalesAgent(db, openai_key, checkpointer)
+_init_lock = asyncio.Lock()
+
+
+async def initialize_system(openai_key: str, checkpointer=None) -> SalesAgent:
+    """Sin checkpointer explícito, el de la app si graph_checkpoints existe"""
+    async with _init_lock:
+        if checkpointer is None and SalesAgent._instance is None:
+            checkpointer = await default_checkpointer()
+        return SalesAgent.get_instance(openai_key, checkpointer)
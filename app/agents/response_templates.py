@@ -0,0 +1,146 @@
+"""
+app/agents/response_templates.py - Respuestas por plantilla (fast-path)
+Las estrategias deterministas (saludo, pedir nombre, pedir el dato de
+contacto que falta) le pedían al LLM una frase casi fija: aquí se resuelven
+en microsegundos con slots ({nombre}, {producto}) y un pool pequeño de
+variantes. Las estrategias abiertas siguen yendo al LLM.
+Con el circuito del LLM abierto (modo degradado) todas las estrategias se
+responden por plantilla: las de fast-path y DEGRADED_TEMPLATES.
+"""
+import hashlib
+from typing import Dict, List, Optional
+
+from app.config import settings
+
+# Cada estrategia tiene variantes con y sin slot; se usan las que se pueden
+# rellenar con los datos del turno
+TEMPLATES: Dict[str, List[str]] = {
+    "greeting": [
+        "¡Hola! Soy Artur, asistente de NexWebs. ¿Cómo puedo ayudarte hoy?",
+        "¡Hola! Soy Artur, de NexWebs. ¿En qué puedo ayudarte hoy?",
+        "¡Hola! Te saluda Artur, asistente de NexWebs. ¿Qué estás buscando hoy?",
+    ],
+    "ask_name_only": [
+        "Perfecto, nuestro {producto} es ideal para ti. ¿Cuál es tu nombre?",
+        "¡Genial! El {producto} encaja muy bien con lo que buscas. ¿Cuál es tu nombre?",
+        "Perfecto, el {producto} te puede ayudar mucho. ¿Me dices tu nombre?",
+        "Perfecto, tenemos una solución ideal para ti. ¿Cuál es tu nombre?",
+    ],
+    "ask_missing_teléfono": [
+        "Perfecto, {nombre}, solo me falta tu teléfono para que un asesor se contacte contigo.",
+        "Gracias, {nombre}. Solo me falta tu teléfono para que un asesor te contacte.",
+        "Perfecto, solo me falta tu teléfono para que un asesor se contacte contigo.",
+    ],
+    "ask_missing_correo": [
+        "Perfecto, {nombre}, solo me falta tu correo para enviarte la información.",
+        "Gracias, {nombre}. Solo me falta tu correo para enviarte la información.",
+        "Perfecto, solo me falta tu correo para enviarte la información.",
+    ],
+}
+
+# Modo degradado: estrategias abiertas (normalmente LLM) con frase fija
+DEGRADED_TEMPLATES: Dict[str, List[str]] = {
+    "ask_product": [
+        "¿En qué puedo ayudarte? Cuéntame qué tipo de solución buscas para tu negocio.",
+        "¿Qué tipo de solución estás buscando para tu negocio?",
+    ],
+    "ask_sector": [
+        "¡Hola {nombre}! ¿A qué se dedica tu negocio?",
+        "Gracias, {nombre}. ¿En qué sector trabajas?",
+        "¿A qué se dedica tu negocio?",
+    ],
+    "present_ask_contact": [
+        "El {producto} es una gran opción para tu negocio, {nombre}. ¿Me compartes tu correo y teléfono para que un asesor te contacte?",
+        "Perfecto, {nombre}. ¿Me compartes tu correo y teléfono para enviarte la información del {producto}?",
+        "Tenemos una solución ideal para tu negocio. ¿Me compartes tu correo y teléfono para que un asesor te contacte?",
+    ],
+    "close_confirmed": [
+        "¡Gracias, {nombre}! Un asesor se contactará contigo sobre {producto}. Te enviamos información a {email}.",
+        "¡Gracias, {nombre}! Un asesor se contactará contigo muy pronto sobre {producto}.",
+        "¡Gracias! Un asesor se contactará contigo muy pronto.",
+    ],
+    "farewell": [
+        "¡Gracias por escribirnos, {nombre}! Que tengas un excelente día.",
+        "¡Gracias por escribirnos! Que tengas un excelente día.",
+    ],
+    "soft_close": [
+        "Gracias por tu tiempo, {nombre}. Si quieres, un asesor puede contactarte para resolver tus dudas.",
+        "Gracias por tu tiempo. Si quieres, un asesor puede contactarte para resolver tus dudas.",
+    ],
+    "continue": [
+        "Entiendo, {nombre}. ¿Hay algo más que quieras saber sobre el {producto}?",
+        "Entiendo. ¿Hay algo más en lo que pueda ayudarte?",
+    ],
+}
+
+
+class ResponseTemplates:
+    def __init__(
+        self,
+        templates: Dict[str, List[str]],
+        strategies: List[str],
+        degraded: Optional[Dict[str, List[str]]] = None,
+    ):
+        self.templates = templates
+        self.strategies = {s for s in strategies if s in templates}
+        self.degraded = {**templates, **(degraded or {})}
+
+    def handles(self, strategy: str) -> bool:
+        return strategy in self.strategies
+
+    def render(
+        self,
+        strategy: str,
+        slots: Dict[str, Optional[str]],
+        seed: str = "",
+        previous: str = "",
+    ) -> Optional[str]:
+        """
+        Variante elegida de forma estable por `seed` (conversación + turno)
+        entre las que tienen todos sus slots; nunca repite `previous`.
+        None si la estrategia no es de fast-path.
+        """
+        if strategy not in self.strategies:
+            return None
+        return self._pick(self.templates[strategy], slots, seed, previous)
+
+    def render_degraded(
+        self,
+        strategy: str,
+        slots: Dict[str, Optional[str]],
+        seed: str = "",
+        previous: str = "",
+    ) -> Optional[str]:
+        """Como render, para cualquier estrategia (LLM no disponible)"""
+        if strategy not in self.degraded:
+            return None
+        return self._pick(self.degraded[strategy], slots, seed, previous)
+
+    @staticmethod
+    def _pick(
+        templates: List[str], slots: Dict[str, Optional[str]], seed: str, previous: str
+    ) -> Optional[str]:
+        valores = {k: v for k, v in slots.items() if v}
+        genericas, personalizadas = [], []
+        for template in templates:
+            try:
+                texto = template.format(**valores)
+            except KeyError:
+                continue
+            (personalizadas if "{" in template else genericas).append(texto)
+        # Las genéricas solo se usan si faltan datos para personalizar
+        pool = personalizadas or genericas
+        if not pool:
+            return None
+
+        i = int.from_bytes(hashlib.md5(seed.encode("utf-8")).digest()[:4], "big") % len(pool)
+        if pool[i] == previous and len(pool) > 1:
+            i = (i + 1) % len(pool)
+        return pool[i]
+
+
+response_templates = ResponseTemplates(
+    TEMPLATES,
+    [s.strip() for s in settings.FAST_PATH_STRATEGIES.split(",") if s.strip()],
+    DEGRADED_TEMPLATES,
+)
@@ -16,7 +16,11 @@ router = APIRouter()
 
 
 @router.websocket("/ws/{session_id}")
-async def websocket_chat(websocket: WebSocket, session_id: str):
+async def websocket_chat(websocket: WebSocket, session_id: str, stream: bool = False):
+    """
+    stream=true: la respuesta llega como frames "delta" y luego el frame
+    "message" con la metadata (probabilidad, etapa, datos)
+    """
     client_host = websocket.client.host if websocket.client else "unknown"
 
     can_connect, message = await ws_manager.can_connect(client_host)
@@ -35,13 +39,13 @@ async def websocket_chat(websocket: WebSocket, session_id: str):
 
         from app.agents.graph_system import initialize_system
 
-        agent = await initialize_system(db=db, openai_key=settings.OPENAI_API_KEY)
+        agent = await initialize_system(openai_key=settings.OPENAI_API_KEY)
 
         current_state = None
 
         # El agente genera el saludo inicial
         initial_result = await agent.process_message(
-            session_id=session_id, message="", initial_state={}
+            db=db, session_id=session_id, message="", initial_state={}
         )
 
         current_state = initial_result["state"]
@@ -89,11 +93,23 @@ async def websocket_chat(websocket: WebSocket, session_id: str):
                 )
                 break
 
+            on_delta = None
+            if stream:
+
+                async def on_delta(delta: str, replace: bool = False):
+                    data = {"delta": delta}
+                    if replace:
+                        # Descarta lo recibido hasta ahora (respuesta degradada)
+                        data["replace"] = True
+                    await websocket.send_json({"type": "delta", "data": data})
+
             # El agente procesa el mensaje y responde
             result = await agent.process_message(
+                db=db,
                 session_id=session_id,
                 message=message_data.get("message", ""),
                 initial_state=current_state,
+                on_delta=on_delta,
             )
 
             current_state = result["state"]
@@ -112,6 +128,9 @@ async def websocket_chat(websocket: WebSocket, session_id: str):
                 }
             )
 
+            # Fuera del camino de streaming: mensajes + embeddings tras el frame final
+            await agent.persist_pending(db, result["pending_messages"])
+
             if result["closed"]:
                 await websocket.send_json(
                     {
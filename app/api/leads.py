@@ -15,6 +15,7 @@ from sqlalchemy import select, text
 from app.services.database import AsyncSessionLocal
 from app.models import ConocimientoRAG, Producto
 from app.services.embeddings import embedding_service
+from app.services.vector_index import knowledge_index
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Body
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -650,14 +651,19 @@ async def generar_embeddings_conocimiento():
             print("⚠️  No hay conocimiento en la base de datos")
             return
 
-        count = 0
-        for item in conocimientos:
-            # Combinar título y contenido para embedding
-            texto_completo = f"{item.titulo}\n{item.contenido}"
-
-            # Generar embedding
-            embedding = embedding_service.encode_single(texto_completo)
+        # Combinar título y contenido; embeddings en lotes del dispatcher
+        embeddings = await embedding_service.embed_batch(
+            [f"{item.titulo}\n{item.contenido}" for item in conocimientos],
+            strict=True,
+            return_exceptions=True,
+        )
 
+        count = 0
+        for item, embedding in zip(conocimientos, embeddings):
+            if isinstance(embedding, BaseException):
+                # Se conserva el embedding anterior en vez de uno de ceros
+                print(f"  ✗ Embedding falló para: {item.titulo} ({embedding})")
+                continue
             # Actualizar en BD
             await db.execute(
                 text("""
@@ -671,6 +677,7 @@ async def generar_embeddings_conocimiento():
             count += 1
             print(f"  ✓ Embedding generado para: {item.titulo}")
 
+        knowledge_index.refresh_after_commit(db)
         await db.commit()
         print(f"✅ {count} embeddings generados exitosamente\n")
 
@@ -685,18 +692,26 @@ async def generar_embeddings_productos():
         result = await db.execute(select(Producto).where(Producto.activo == True))
         productos = result.scalars().all()
 
-        count = 0
+        textos = []
         for producto in productos:
             # Combinar toda la info del producto
-            texto_producto = f"""
+            textos.append(f"""
             {producto.nombre}
             {producto.descripcion_corta}
             Sectores: {", ".join(producto.sectores or [])}
             Características: {", ".join(producto.features or [])}
-            """
+            """)
 
-            embedding = embedding_service.encode_single(texto_producto)
+        # Embeddings en lotes del dispatcher
+        embeddings = await embedding_service.embed_batch(
+            textos, strict=True, return_exceptions=True
+        )
 
+        count = 0
+        for producto, embedding in zip(productos, embeddings):
+            if isinstance(embedding, BaseException):
+                print(f"  ✗ Embedding falló para: {producto.nombre} ({embedding})")
+                continue
             # Insertar en contexto_embeddings
             await db.execute(
                 text("""
@@ -779,6 +794,12 @@ async def main():
         print("❌ Primero ejecuta el script SQL de inicialización")
         return
 
+    # Índices HNSW y demás migraciones de esquema
+    from app.services.database import engine
+    from app.services.migrations import aplicar_migraciones
+
+    await aplicar_migraciones(engine)
+
     # Generar embeddings
     await generar_embeddings_conocimiento()
     await generar_embeddings_productos()
@@ -10,6 +10,7 @@ from sqlalchemy import select, text
 from app.services.database import get_db
 from app.services.product_embeddings import (
     generar_embedding_producto,
+    generar_embeddings_productos,
     eliminar_embedding_producto,
 )
 from app.models import Producto, Paquete
@@ -332,15 +333,9 @@ async def sincronizar_conocimiento(
         result = await db.execute(text("SELECT id FROM productos WHERE activo = TRUE"))
         productos = result.fetchall()
 
-        sincronizados = 0
-        errores = []
-
-        for (producto_id,) in productos:
-            try:
-                await generar_embedding_producto(db, str(producto_id))
-                sincronizados += 1
-            except Exception as e:
-                errores.append(f"Producto {producto_id}: {str(e)}")
+        sincronizados, errores = await generar_embeddings_productos(
+            db, [str(producto_id) for (producto_id,) in productos]
+        )
 
         await db.commit()
 
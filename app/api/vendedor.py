@@ -381,7 +381,7 @@ async def cerrar_venta(
     if cierre.resultado == 'venta_ganada' and cierre.objecion_principal and cierre.momento_critico:
         from app.services.embeddings import embedding_service
         
-        contexto_emb = embedding_service.encode_single(cierre.objecion_principal)
+        contexto_emb = await embedding_service.embed_text(cierre.objecion_principal)
         
         await db.execute(
             text("""
@@ -33,11 +33,29 @@ class Settings(BaseSettings):
     OPENAI_MODEL: str = "gpt-4o-mini"
     OPENAI_TIMEOUT: int = 20
     OPENAI_MAX_RETRIES: int = 2
+    OPENAI_BASE_URL: str = "https://api.openai.com/v1"
+    # Transporte HTTP compartido. HTTP/2 necesita h2 (httpx[http2], declarado en
+    # pyproject.toml); si no está instalado se usa HTTP/1.1
+    OPENAI_HTTP2: bool = True
+    OPENAI_HTTP_MAX_CONNECTIONS: int = 10
+    OPENAI_HTTP_MAX_KEEPALIVE: int = 5
+    OPENAI_HTTP_KEEPALIVE_EXPIRY_S: float = 120
 
     EMBEDDING_MODEL: str = "text-embedding-3-small"
+    # openai | local (sentence-transformers en CPU); cambiarlo exige re-indexar
+    EMBEDDING_BACKEND: str = "openai"
+    EMBEDDING_LOCAL_MODEL: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+    EMBEDDING_LOCAL_BATCH_SIZE: int = 32
+    EMBEDDING_LOCAL_WORKERS: int = 2
     EMBEDDING_DIMENSIONS: int = 384
     EMBEDDING_BATCH_SIZE: int = 3
-    EMBEDDING_CACHE_SIZE: int = 10
+    EMBEDDING_BATCH_WINDOW_MS: int = 5
+    EMBEDDING_QUEUE_MAXSIZE: int = 500
+    EMBEDDING_QUEUE_MAX_RETRIES: int = 3
+    EMBEDDING_RECOVERY_INTERVAL_S: int = 300
+    # Cache persistente en disco (vacío = desactivada)
+    EMBEDDING_DISK_CACHE_DIR: str = ""
+    EMBEDDING_DISK_CACHE_MAX_MB: int = 256
 
     CHAT_MODEL: str = "gpt-4o-mini"
     CHAT_MAX_TOKENS: int = 400
@@ -48,8 +66,59 @@ class Settings(BaseSettings):
     MAX_WEBSOCKET_CONNECTIONS: int = 3
     REQUEST_TIMEOUT: int = 25
 
+    # sequential | parallel (respuesta especulativa durante la extracción)
+    AGENT_EXECUTION_MODE: str = "sequential"
+    # Estrategias respondidas por plantilla, sin LLM (app/agents/response_templates.py)
+    FAST_PATH_STRATEGIES: str = "greeting,ask_name_only,ask_missing_teléfono,ask_missing_correo"
+    # Timeouts por llamada bajo el circuit breaker (app/services/circuit_breaker.py)
+    LLM_RESPONSE_TIMEOUT_S: float = 12
+    LLM_EXTRACTION_TIMEOUT_S: float = 6
+    EMBEDDING_TIMEOUT_S: float = 5
+    # Se abre con >= X de errores (o de llamadas lentas) en las últimas N llamadas
+    CIRCUIT_FAILURE_RATE: float = 0.5
+    CIRCUIT_SLOW_RATE: float = 0.5
+    CIRCUIT_MIN_CALLS: int = 5
+    CIRCUIT_WINDOW: int = 20
+    CIRCUIT_OPEN_S: float = 30
+    CIRCUIT_LLM_SLOW_MS: float = 8000
+    CIRCUIT_EMBEDDINGS_SLOW_MS: float = 2000
+
+    # Checkpoints de LangGraph (app/services/checkpoint_serde.py). Opt-in:
+    # activado, el estado del turno sale del checkpoint y no del llamador
+    # (initial_state). Sin la tabla graph_checkpoints (migración 003) el
+    # agente sigue sin checkpointer aunque esté activado
+    CHECKPOINTER_ENABLED: bool = False
+    CHECKPOINT_SERIALIZER: str = "msgpack"  # msgpack | orjson | pickle
+    CHECKPOINT_ZSTD_LEVEL: int = 3  # 0 = sin compresión
+    # full | delta (solo cambios respecto al padre + snapshot cada N pasos)
+    CHECKPOINT_MODE: str = "full"
+    CHECKPOINT_SNAPSHOT_EVERY: int = 10
+    # Escritura diferida: un INSERT multi-fila por turno (True = cada aput escribe)
+    CHECKPOINT_DURABLE: bool = False
+    CHECKPOINT_BUFFER_MAX_ROWS: int = 50
+    # Retención (app/services/checkpoint_retention.py): últimos K por hilo activo,
+    # un solo snapshot por conversación finalizada; 0 = desactivada
+    CHECKPOINT_RETENTION_KEEP: int = 20
+    CHECKPOINT_RETENTION_BATCH: int = 500
+    CHECKPOINT_RETENTION_MAX_BATCHES: int = 20
+    CHECKPOINT_RETENTION_INTERVAL_S: int = 900
+
     RAG_TOP_K: int = 2
     RAG_SIMILARITY_THRESHOLD: float = 0.65
+    # MMR: candidatos sobre-recuperados y peso relevancia vs diversidad (1 = sin MMR)
+    RAG_MMR_CANDIDATES: int = 8
+    RAG_MMR_LAMBDA: float = 0.7
+    RAG_INDEX_HNSW_MIN_ROWS: int = 2000
+    # Cache semántica (LSH del embedding) de producto detectado y conocimiento
+    RAG_CACHE_TTL_S: int = 600  # 0 = desactivada
+    RAG_CACHE_MAX_ENTRIES: int = 2000
+    RAG_CACHE_LSH_BITS: int = 8
+    RAG_CACHE_PROBES: int = 8
+    RAG_CACHE_MIN_SIMILARITY: float = 0.95
+    # pgvector HNSW: candidatos explorados por búsqueda (recall vs latencia)
+    PGVECTOR_EF_SEARCH: int = 40
+    # Candidatos ANN cuando se reordena por otra columna (patrones por tasa_exito)
+    PGVECTOR_ANN_CANDIDATES: int = 20
 
     SECRET_KEY: str = os.getenv("SECRET_KEY", "CAMBIAR-EN-PRODUCCION")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
@@ -125,7 +194,9 @@ MEMORY_LIMITS = {
     "app_max_mb": 400,
     "embedding_cache_mb": 5,
     "conversation_cache_mb": 10,
-    "buffer_mb": 97,
+    "checkpoint_cache_mb": 8,
+    "checkpoint_tips_mb": 4,
+    "buffer_mb": 85,
 }
 
 GC_CONFIG = {
@@ -17,7 +17,18 @@ from fastapi.middleware.gzip import GZipMiddleware
 from contextlib import asynccontextmanager
 import uvicorn
 
-from app.config import settings, GC_CONFIG
+from app.config import settings, GC_CONFIG, MEMORY_LIMITS
+from app.services.metrics import metrics as runtime_metrics
+from app.services.embedding_queue import message_embedding_queue
+from app.services import http_client
+from app.services.embeddings import embedding_service
+from app.services.vector_index import knowledge_index
+from app.services.hybrid_search import hybrid_product_search
+from app.services.semantic_cache import semantic_cache
+from app.services import pre_extraction
+from app.services import circuit_breaker
+from app.services.checkpoint_cache import checkpoint_hot_tier
+from app.services.checkpoint_retention import checkpoint_retention
 from app.middleware.security import (
     SecurityHeadersMiddleware,
     RateLimitMiddleware,
@@ -69,6 +80,14 @@ async def lifespan(app: FastAPI):
             )
             print("pgvector OK")
 
+        await knowledge_index.load()
+        print(f"Índice RAG en memoria: {len(knowledge_index.entries)} filas")
+
+        if await hybrid_product_search.check_lexical():
+            print("Búsqueda híbrida: full-text + embeddings")
+        else:
+            print("Búsqueda híbrida: solo embeddings (falta migración 002)")
+
     except Exception as e:
         print(f"Error DB: {e}")
 
@@ -79,6 +98,15 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"Warning - Embeddings: {e}")
 
+    if settings.OPENAI_HTTP2 and not http_client.HTTP2_AVAILABLE:
+        print("Warning - OPENAI_HTTP2 activo pero falta h2 (httpx[http2]): HTTP/1.1")
+    try:
+        if await http_client.warm_up():
+            http2 = http_client.tracker.stats()["http2"]
+            print(f"Transporte OpenAI precalentado ({'HTTP/2' if http2 else 'HTTP/1.1'})")
+    except Exception as e:
+        print(f"Warning - Transporte OpenAI: {e}")
+
     print(f"Rate Limits:")
     print(
         f"   Public: {settings.RATE_LIMIT_PUBLIC_RPM}/min, {settings.RATE_LIMIT_PUBLIC_RPH}/hora"
@@ -100,6 +128,21 @@ async def lifespan(app: FastAPI):
     cleanup_task = asyncio.create_task(run_rate_limiter_cleanup())
     print("Rate limiter cleanup iniciado")
 
+    await message_embedding_queue.start()
+    print("Write-behind de embeddings iniciado")
+
+    try:
+        from app.agents.graph_system import initialize_system
+
+        # Crea el checkpointer (si graph_checkpoints existe) antes del primer chat
+        agent = await initialize_system(openai_key=settings.OPENAI_API_KEY)
+        if agent.checkpointer is not None:
+            await checkpoint_retention.start()
+    except Exception as e:
+        print(f"Warning - Agente: {e}")
+    if checkpoint_retention.running:
+        print(f"Retención de checkpoints cada {settings.CHECKPOINT_RETENTION_INTERVAL_S}s")
+
     print("=" * 60)
     print(f"API: http://{settings.API_HOST}:{settings.API_PORT}")
     print(f"Docs: http://{settings.API_HOST}:{settings.API_PORT}/docs")
@@ -112,6 +155,10 @@ async def lifespan(app: FastAPI):
     if cleanup_task:
         cleanup_task.cancel()
 
+    await message_embedding_queue.stop()
+    await checkpoint_retention.stop()
+    await http_client.aclose()
+
     try:
         from app.services.database import engine
 
@@ -269,9 +316,25 @@ async def metrics():
         },
         "limits": {
             "max_concurrent": settings.MAX_CONCURRENT_REQUESTS,
-            "embedding_cache": settings.EMBEDDING_CACHE_SIZE,
+            "embedding_cache_mb": MEMORY_LIMITS["embedding_cache_mb"],
+            "checkpoint_cache_mb": MEMORY_LIMITS["checkpoint_cache_mb"],
             "db_pool": settings.DB_POOL_SIZE,
         },
+        "runtime": runtime_metrics.snapshot(),
+        "embedding_queue": message_embedding_queue.stats(),
+        "embedding_cache": embedding_service.cache.stats(),
+        "openai_http": http_client.tracker.stats(),
+        "rag_index": knowledge_index.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "pre_extraction": pre_extraction.stats(),
+        "circuit_breakers": circuit_breaker.stats(),
+        "checkpoint_cache": checkpoint_hot_tier.stats(),
+        "checkpoint_retention": (
+            checkpoint_retention.stats() if checkpoint_retention.running else None
+        ),
+        "embedding_disk_cache": (
+            embedding_service.disk_cache.stats() if embedding_service.disk_cache else None
+        ),
     }
 
 
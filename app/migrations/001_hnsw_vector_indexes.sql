@@ -0,0 +1,15 @@
+-- Índices HNSW (distancia coseno) para búsquedas ANN de pgvector.
+-- CONCURRENTLY: no bloquea escrituras en tablas ya pobladas (mensajes).
+-- Ajuste en consulta: hnsw.ef_search (settings.PGVECTOR_EF_SEARCH).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_conocimiento_rag_embedding_hnsw
+    ON conocimiento_rag USING hnsw (embedding vector_cosine_ops)
+    WITH (m = 16, ef_construction = 64);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_mensajes_embedding_hnsw
+    ON mensajes USING hnsw (embedding vector_cosine_ops)
+    WITH (m = 16, ef_construction = 64);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_patrones_aprendidos_embedding_contexto_hnsw
+    ON patrones_aprendidos USING hnsw (embedding_contexto vector_cosine_ops)
+    WITH (m = 16, ef_construction = 64);
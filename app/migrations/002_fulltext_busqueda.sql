@@ -0,0 +1,23 @@
+-- Búsqueda léxica (configuración 'spanish') para la recuperación híbrida.
+-- Se quitan tildes en ambos lados (translate es IMMUTABLE, unaccent no) para
+-- que "facturacion" y "facturación" produzcan el mismo lexema.
+-- features/sectores de productos ya están en su guia_producto (conocimiento_rag).
+
+ALTER TABLE conocimiento_rag ADD COLUMN IF NOT EXISTS busqueda tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('spanish', translate(lower(titulo || ' ' || contenido), 'áéíóúü', 'aeiouu'))
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_conocimiento_rag_busqueda
+    ON conocimiento_rag USING gin (busqueda);
+
+ALTER TABLE productos ADD COLUMN IF NOT EXISTS busqueda tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('spanish', translate(
+            lower(nombre || ' ' || replace(slug, '-', ' ') || ' ' || descripcion_corta),
+            'áéíóúü', 'aeiouu'
+        ))
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_productos_busqueda
+    ON productos USING gin (busqueda);
@@ -0,0 +1,20 @@
+-- Checkpoints en modo delta (app/services/checkpoint_delta.py).
+-- es_snapshot marca las filas con el estado completo: la CTE recursiva de
+-- aget_tuple sube por parent_checkpoint_id hasta la primera. Las filas
+-- anteriores son todas completas (DEFAULT TRUE).
+
+CREATE TABLE IF NOT EXISTS graph_checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    checkpoint_data BYTEA NOT NULL,
+    metadata JSONB,
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+
+ALTER TABLE graph_checkpoints ADD COLUMN IF NOT EXISTS es_snapshot BOOLEAN NOT NULL DEFAULT TRUE;
+
+CREATE INDEX IF NOT EXISTS idx_graph_checkpoints_ultimo
+    ON graph_checkpoints (thread_id, checkpoint_ns, created_at DESC);
@@ -0,0 +1,143 @@
+"""
+app/services/checkpoint_cache.py - Nivel caliente de checkpoints en memoria
+Cada turno lee el último checkpoint del hilo (ORDER BY created_at DESC
+LIMIT 1 + cadena de deltas). Aquí se guarda, por thread_id, el último
+checkpoint ya reconstruido; PostgresCheckpointer escribe siempre en la BD
+(write-through) y solo lee de ella en un fallo de cache.
+- LRU acotado por bytes (tamaño estimado del estado, no serializado)
+- Las conversaciones finalizadas (should_close, estado='finalizada') se
+  desalojan antes que cualquier hilo activo
+Válido con un solo proceso (UVICORN_WORKERS=1): otro worker escribiendo el
+mismo hilo no invalida esta copia.
+"""
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional, Tuple
+
+from langchain_core.messages import BaseMessage
+from langgraph.checkpoint.base import CheckpointTuple
+
+from app.config import MEMORY_LIMITS
+from app.services.metrics import metrics
+
+# Nodo del OrderedDict + CheckpointTuple + configs (aprox.)
+ENTRY_OVERHEAD = 600
+
+
+def approx_bytes(obj: Any) -> int:
+    """Estimación barata del tamaño de un estado (sin serializar)"""
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(
+            approx_bytes(k) + approx_bytes(v) for k, v in obj.items()
+        )
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(approx_bytes(v) for v in obj)
+    if isinstance(obj, BaseMessage):
+        return sys.getsizeof(obj.__dict__) + sum(
+            approx_bytes(v) for v in obj.__dict__.values()
+        )
+    return sys.getsizeof(obj)
+
+
+def copy_checkpoint(checkpoint: dict) -> dict:
+    # Los nodos modifican listas/dicts del estado en el sitio: ni lo que se
+    # guarda ni lo que se entrega puede compartirlos
+    valores = {
+        k: list(v) if isinstance(v, list) else dict(v) if isinstance(v, dict) else v
+        for k, v in checkpoint["channel_values"].items()
+    }
+    return {**checkpoint, "channel_values": valores}
+
+
+@dataclass
+class _Entry:
+    value: CheckpointTuple
+    size: int
+    finished: bool
+
+
+class CheckpointHotTier:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        # Dos LRU: se vacía primero la de conversaciones finalizadas
+        self.active: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self.finished: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.finished_evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: Tuple[str, str], checkpoint_id: Optional[str] = None) -> Optional[CheckpointTuple]:
+        """Último checkpoint del hilo (o `checkpoint_id` si es ese mismo)"""
+        for lru in (self.active, self.finished):
+            entry = lru.get(key)
+            if entry is None:
+                continue
+            if checkpoint_id and entry.value.config["configurable"]["checkpoint_id"] != checkpoint_id:
+                break
+            lru.move_to_end(key)
+            self.hits += 1
+            metrics.inc("checkpoint_cache.hits")
+            return entry.value._replace(checkpoint=copy_checkpoint(entry.value.checkpoint))
+        self.misses += 1
+        metrics.inc("checkpoint_cache.misses")
+        return None
+
+    def put(self, key: Tuple[str, str], value: CheckpointTuple):
+        if not self.enabled:
+            return
+        self.discard(key)
+        value = value._replace(checkpoint=copy_checkpoint(value.checkpoint))
+        size = approx_bytes(value.checkpoint["channel_values"]) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        finished = bool(value.checkpoint["channel_values"].get("should_close"))
+
+        while self.bytes_used + size > self.max_bytes and (self.finished or self.active):
+            lru = self.finished or self.active
+            _, evicted = lru.popitem(last=False)
+            self.bytes_used -= evicted.size
+            self.evictions += 1
+            metrics.inc("checkpoint_cache.evictions")
+            if evicted.finished:
+                self.finished_evictions += 1
+
+        (self.finished if finished else self.active)[key] = _Entry(value, size, finished)
+        self.bytes_used += size
+        metrics.set_gauge("checkpoint_cache.bytes", self.bytes_used)
+
+    def discard(self, key: Tuple[str, str]):
+        entry = self.active.pop(key, None) or self.finished.pop(key, None)
+        if entry is not None:
+            self.bytes_used -= entry.size
+
+    def clear(self):
+        self.active.clear()
+        self.finished.clear()
+        self.bytes_used = 0
+        metrics.set_gauge("checkpoint_cache.bytes", 0)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.active) + len(self.finished),
+            "finished_entries": len(self.finished),
+            "bytes": self.bytes_used,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "finished_evictions": self.finished_evictions,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+checkpoint_hot_tier = CheckpointHotTier(
+    max_bytes=MEMORY_LIMITS["checkpoint_cache_mb"] * 1024 * 1024
+)
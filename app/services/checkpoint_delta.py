@@ -0,0 +1,116 @@
+"""
+app/services/checkpoint_delta.py - Checkpoints como delta del checkpoint padre
+Cada paso del grafo guardaba el estado completo: en un chat de 20 turnos los
+primeros mensajes se escribían decenas de veces. En modo delta se guardan:
+  - los campos propios del checkpoint (id, ts...)
+  - de channel_versions / versions_seen solo las entradas que cambiaron
+    (sin esto, las versiones eran ~90% de cada delta)
+  - los canales cuya versión cambió respecto al padre
+  - en canales lista (messages) solo los elementos añadidos
+y un snapshot completo cada N pasos, para acotar la cadena a reconstruir.
+Funciones puras: el SQL (CTE recursiva) está en checkpointer.py.
+"""
+from typing import Any, Dict, List, Optional
+
+
+class ThreadTip:
+    """Último checkpoint escrito de un hilo, lo necesario para el siguiente delta"""
+
+    __slots__ = ("checkpoint_id", "channels", "versions", "seen", "lists", "depth")
+
+    def __init__(self, checkpoint_id: str, checkpoint: dict, depth: int):
+        self.checkpoint_id = checkpoint_id
+        self.channels = set(checkpoint["channel_values"])
+        self.versions = dict(checkpoint.get("channel_versions", {}))
+        self.seen = {
+            nodo: dict(vistas) for nodo, vistas in checkpoint.get("versions_seen", {}).items()
+        }
+        # Copia superficial: los nodos hacen append sobre la lista del estado
+        self.lists = {
+            canal: list(valor)
+            for canal, valor in checkpoint["channel_values"].items()
+            if isinstance(valor, list)
+        }
+        self.depth = depth
+
+
+def _es_extension(previa: list, nueva: list) -> bool:
+    if len(nueva) < len(previa):
+        return False
+    # El reducer operator.add conserva los objetos: `is` resuelve casi siempre
+    return all(a is b or a == b for a, b in zip(previa, nueva))
+
+
+# Campos del checkpoint que se guardan como diferencia
+MAPAS = ("channel_values", "channel_versions", "versions_seen")
+
+
+def _diff(nuevo: dict, previo: dict) -> Dict[str, Any]:
+    return {
+        "set": {k: v for k, v in nuevo.items() if k not in previo or previo[k] != v},
+        "del": [k for k in previo if k not in nuevo],
+    }
+
+
+def _patch(previo: dict, diff: Dict[str, Any]) -> dict:
+    resultado = dict(previo)
+    for k in diff["del"]:
+        resultado.pop(k, None)
+    resultado.update(diff["set"])
+    return resultado
+
+
+def compute_delta(checkpoint: dict, parent: ThreadTip) -> Dict[str, Any]:
+    valores = checkpoint["channel_values"]
+    versiones = checkpoint.get("channel_versions", {})
+    changed: Dict[str, Any] = {}
+    appended: Dict[str, list] = {}
+
+    for canal, valor in valores.items():
+        version = versiones.get(canal)
+        if canal in parent.channels and version is not None and version == parent.versions.get(canal):
+            continue
+        previa = parent.lists.get(canal)
+        if previa is not None and isinstance(valor, list) and _es_extension(previa, valor):
+            if len(valor) > len(previa):
+                appended[canal] = valor[len(previa):]
+        else:
+            changed[canal] = valor
+
+    seen = checkpoint.get("versions_seen", {})
+    return {
+        "checkpoint": {k: v for k, v in checkpoint.items() if k not in MAPAS},
+        "versions": _diff(versiones, parent.versions),
+        "seen": _diff(seen, parent.seen),
+        "changed": changed,
+        "appended": appended,
+        "removed": [c for c in parent.channels if c not in valores],
+    }
+
+
+def apply_delta(base: dict, delta: Dict[str, Any]) -> dict:
+    valores = dict(base["channel_values"])
+    for canal in delta["removed"]:
+        valores.pop(canal, None)
+    for canal, nuevos in delta["appended"].items():
+        valores[canal] = list(valores.get(canal, [])) + list(nuevos)
+    valores.update(delta["changed"])
+    return {
+        **delta["checkpoint"],
+        "channel_values": valores,
+        "channel_versions": _patch(base.get("channel_versions", {}), delta["versions"]),
+        "versions_seen": _patch(base.get("versions_seen", {}), delta["seen"]),
+    }
+
+
+def rebuild(chain: List[Dict[str, Any]]) -> Optional[dict]:
+    """
+    `chain` = payloads del snapshot al checkpoint pedido (en ese orden).
+    None si la cadena no empieza por un snapshot (padre borrado).
+    """
+    if not chain or "checkpoint" not in chain[0] or "delta" in chain[0]:
+        return None
+    checkpoint = chain[0]["checkpoint"]
+    for payload in chain[1:]:
+        checkpoint = apply_delta(checkpoint, payload["delta"])
+    return checkpoint
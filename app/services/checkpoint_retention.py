@@ -0,0 +1,251 @@
+"""
+app/services/checkpoint_retention.py - Retención de graph_checkpoints
+Sin esto la tabla solo crece (5+ filas por turno). Un worker en background:
+- Hilos activos: conserva los últimos K checkpoints y, si el más antiguo de
+  esos es un delta, también su cadena hasta el snapshot (si no, dejaría de
+  poder reconstruirse)
+- Conversaciones finalizadas (conversaciones.estado = 'finalizada'): una sola
+  fila, el checkpoint final reescrito como snapshot completo
+Borra por lotes de N filas, cada uno en su propia transacción corta y con una
+pausa entre lotes: el pool de la app es de 1 + 1 conexiones.
+"""
+import asyncio
+import time
+from typing import Optional
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.services.checkpoint_delta import rebuild
+from app.services.checkpoint_serde import CheckpointSerializer, default_serializer
+from app.services.checkpointer import CHAIN_QUERY, LATEST_ID
+from app.services.database import AsyncSessionLocal
+from app.services.metrics import metrics
+
+# Por hilo, el snapshot más reciente de entre las filas no conservadas: todo
+# lo anterior sobra. Un solo recorrido de la tabla por pasada
+ACTIVE_CUTOFFS = """
+    WITH ranked AS (
+        SELECT thread_id, checkpoint_ns, created_at, es_snapshot,
+               ROW_NUMBER() OVER (
+                   PARTITION BY thread_id, checkpoint_ns ORDER BY created_at DESC
+               ) AS rn
+        FROM graph_checkpoints
+    )
+    SELECT thread_id, checkpoint_ns, MAX(created_at) AS desde
+    FROM ranked
+    WHERE rn >= :keep AND es_snapshot
+    GROUP BY thread_id, checkpoint_ns
+"""
+
+# Un lote de los hilos ya calculados: rango por índice (thread_id,
+# checkpoint_ns, created_at), sin volver a ordenar la tabla
+PRUNE_ACTIVE = """
+    DELETE FROM graph_checkpoints WHERE ctid IN (
+        SELECT g.ctid
+        FROM unnest(
+            CAST(:thread_ids AS text[]), CAST(:checkpoint_nss AS text[]),
+            CAST(:desdes AS timestamptz[])
+        ) AS c(thread_id, checkpoint_ns, desde)
+        JOIN graph_checkpoints g
+            ON g.thread_id = c.thread_id
+            AND g.checkpoint_ns = c.checkpoint_ns
+            AND g.created_at < c.desde
+        LIMIT :batch
+    )
+"""
+
+FINISHED_THREADS = """
+    SELECT g.thread_id, g.checkpoint_ns
+    FROM graph_checkpoints g
+    JOIN conversaciones c ON c.session_id = g.thread_id
+    WHERE c.estado = 'finalizada'
+    GROUP BY g.thread_id, g.checkpoint_ns
+    HAVING COUNT(*) > 1
+    LIMIT :limit
+"""
+
+DELETE_ALL_BUT = """
+    DELETE FROM graph_checkpoints WHERE ctid IN (
+        SELECT ctid FROM graph_checkpoints
+        WHERE thread_id = :thread_id
+            AND checkpoint_ns = :checkpoint_ns
+            AND checkpoint_id <> :checkpoint_id
+        LIMIT :batch
+    )
+"""
+
+
+class CheckpointRetention:
+    def __init__(
+        self,
+        keep: int = 20,
+        batch_size: int = 500,
+        max_batches: int = 20,
+        interval_s: float = 900,
+        pause_s: float = 0.2,
+        serializer: Optional[CheckpointSerializer] = None,
+        session_factory=None,
+    ):
+        self.keep = max(1, keep)
+        self.batch_size = max(1, batch_size)
+        self.max_batches = max(1, max_batches)
+        self.interval_s = interval_s
+        self.pause_s = pause_s
+        self.serializer = serializer or default_serializer()
+        self.session_factory = session_factory or AsyncSessionLocal
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.deleted = 0
+        self.compacted = 0
+        self.last_run_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        if self._task is None and self.interval_s > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_s)
+            try:
+                await self.run_once()
+            except Exception as e:
+                metrics.inc("checkpoint_retention.errors")
+                print(f"Error retención de checkpoints: {e}")
+
+    async def run_once(self) -> dict:
+        """Una pasada acotada a max_batches lotes; lo que quede, en la siguiente"""
+        start = time.perf_counter()
+        lotes = 0
+        borradas = 0
+        compactados = 0
+
+        async with self.session_factory() as db:
+            result = await db.execute(text(FINISHED_THREADS), {"limit": self.max_batches})
+            hilos = result.fetchall()
+
+        for thread_id, checkpoint_ns in hilos:
+            if lotes >= self.max_batches:
+                break
+            n, lotes_hilo = await self._compact(thread_id, checkpoint_ns, self.max_batches - lotes)
+            borradas += n
+            lotes += lotes_hilo
+            compactados += 1
+
+        if lotes < self.max_batches:
+            async with self.session_factory() as db:
+                result = await db.execute(text(ACTIVE_CUTOFFS), {"keep": self.keep})
+                cortes = result.fetchall()
+            # Grupos de batch_size hilos (cada uno tiene al menos una fila que
+            # sobra); un grupo se repite hasta vaciarse
+            inicio = 0
+            while inicio < len(cortes) and lotes < self.max_batches:
+                grupo = cortes[inicio:inicio + self.batch_size]
+                async with self.session_factory() as db:
+                    result = await db.execute(text(PRUNE_ACTIVE), {
+                        "thread_ids": [c[0] for c in grupo],
+                        "checkpoint_nss": [c[1] for c in grupo],
+                        "desdes": [c[2] for c in grupo],
+                        "batch": self.batch_size,
+                    })
+                    await db.commit()
+                lotes += 1
+                borradas += result.rowcount
+                if result.rowcount < self.batch_size:
+                    inicio += self.batch_size
+                await asyncio.sleep(self.pause_s)
+
+        self.runs += 1
+        self.deleted += borradas
+        self.compacted += compactados
+        self.last_run_ms = (time.perf_counter() - start) * 1000
+        metrics.inc("checkpoint_retention.deleted", borradas)
+        metrics.inc("checkpoint_retention.compacted", compactados)
+        metrics.observe("checkpoint_retention.run_ms", self.last_run_ms)
+        return {"deleted": borradas, "compacted": compactados, "batches": lotes}
+
+    async def _compact(self, thread_id: str, checkpoint_ns: str, max_batches: int):
+        """Deja solo el último checkpoint del hilo, como snapshot. (borradas, lotes)"""
+        params = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
+        async with self.session_factory() as db:
+            result = await db.execute(text(CHAIN_QUERY.format(objetivo=LATEST_ID)), params)
+            cadena = result.fetchall()
+            if not cadena:
+                return 0, 0
+            ultimo = cadena[-1]
+            # Si el último ya es snapshot no hay nada que reescribir
+            payloads = [] if ultimo[4] else [self.serializer.loads(row[0]) for row in cadena]
+            checkpoint = rebuild(payloads) if payloads else None
+            if payloads and checkpoint is None:
+                # Cadena rota: el estado no se puede reconstruir, pero el
+                # resto de filas sobra igualmente
+                metrics.inc("checkpoint_retention.broken_chains")
+            if checkpoint is not None:
+                final = payloads[-1]
+                await db.execute(
+                    text("""
+                        UPDATE graph_checkpoints
+                        SET checkpoint_data = :data, es_snapshot = TRUE
+                        WHERE thread_id = :thread_id
+                            AND checkpoint_ns = :checkpoint_ns
+                            AND checkpoint_id = :checkpoint_id
+                    """),
+                    {
+                        **params,
+                        "checkpoint_id": ultimo[2],
+                        "data": self.serializer.dumps({
+                            "checkpoint": checkpoint,
+                            "metadata": final.get("metadata", {}),
+                            "new_versions": final.get("new_versions", {}),
+                        }),
+                    },
+                )
+                await db.commit()
+
+        # El snapshot final ya está confirmado: el resto se puede borrar por lotes
+        borradas = 0
+        lotes = 0
+        while lotes < max_batches:
+            async with self.session_factory() as db:
+                result = await db.execute(
+                    text(DELETE_ALL_BUT),
+                    {**params, "checkpoint_id": ultimo[2], "batch": self.batch_size},
+                )
+                await db.commit()
+            lotes += 1
+            borradas += result.rowcount
+            if result.rowcount < self.batch_size:
+                break
+            await asyncio.sleep(self.pause_s)
+        return borradas, lotes
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "keep": self.keep,
+            "runs": self.runs,
+            "deleted": self.deleted,
+            "compacted": self.compacted,
+            "last_run_ms": round(self.last_run_ms, 1),
+        }
+
+
+checkpoint_retention = CheckpointRetention(
+    keep=settings.CHECKPOINT_RETENTION_KEEP,
+    batch_size=settings.CHECKPOINT_RETENTION_BATCH,
+    max_batches=settings.CHECKPOINT_RETENTION_MAX_BATCHES,
+    interval_s=settings.CHECKPOINT_RETENTION_INTERVAL_S,
+)
@@ -0,0 +1,245 @@
+"""
+app/services/checkpoint_serde.py - Serialización de checkpoints de LangGraph
+pickle del checkpoint completo (messages incluidos) era lento, grande y
+frágil entre versiones de langchain. Formatos:
+  msgpack (ormsgpack) - tipos con Ext: mensajes LangChain, datetime, UUID...
+  orjson              - los mismos tipos como dicts {"__t": tipo, "v": ...}
+                        (UUID, tuple y Enum salen como str/list/valor)
+Ambos opcionalmente comprimidos con zstd (si está instalado `zstandard`).
+
+Primer byte = cabecera de formato. pickle (protocolo >= 2) empieza por 0x80,
+así que las filas antiguas se siguen leyendo sin migración.
+"""
+import pickle
+from datetime import date, datetime, time as dt_time, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, Tuple
+from uuid import UUID
+
+import orjson
+import ormsgpack
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    ChatMessage,
+    FunctionMessage,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+    ToolMessage,
+)
+
+from app.config import settings
+from app.services.metrics import metrics
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+FORMAT_MSGPACK = 0x01
+FORMAT_ORJSON = 0x02
+FLAG_ZSTD = 0x10
+PICKLE_PROTO = 0x80
+# Por debajo de este tamaño zstd no compensa (cabecera + CPU)
+ZSTD_MIN_BYTES = 512
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# Mensajes LangChain: [clase, campos distintos del default]. message_to_dict
+# repite en cada mensaje todos los campos vacíos (tool_calls, usage_metadata...)
+MESSAGE_CLASSES = {
+    cls.__name__: cls
+    for cls in (
+        HumanMessage, AIMessage, SystemMessage, ToolMessage, FunctionMessage,
+        ChatMessage, AIMessageChunk, RemoveMessage,
+    )
+}
+MESSAGE_DEFAULTS = {
+    nombre: {
+        campo: info.get_default(call_default_factory=True)
+        for campo, info in cls.model_fields.items()
+        if not info.is_required()
+    }
+    for nombre, cls in MESSAGE_CLASSES.items()
+}
+# Defaults mutables ([] / {}) que cada mensaje reconstruido necesita propios
+MESSAGE_MUTABLE_DEFAULTS = {
+    nombre: [k for k, v in defaults.items() if isinstance(v, (list, dict))]
+    for nombre, defaults in MESSAGE_DEFAULTS.items()
+}
+# Plantilla con los defaults por clase: model_copy(update=...) no vuelve a
+# validar (el estado ya se validó al crear el mensaje, igual que con pickle)
+MESSAGE_TEMPLATES = {nombre: cls.model_construct() for nombre, cls in MESSAGE_CLASSES.items()}
+
+
+def _message_to_plain(msg: BaseMessage) -> list:
+    nombre = type(msg).__name__
+    defaults = MESSAGE_DEFAULTS[nombre]
+    return [
+        nombre,
+        {
+            k: v for k, v in msg.__dict__.items()
+            if k not in defaults or v != defaults[k]
+        },
+    ]
+
+
+def _message_from_plain(value: list) -> BaseMessage:
+    nombre, campos = value
+    propios = {k: type(MESSAGE_DEFAULTS[nombre][k])() for k in MESSAGE_MUTABLE_DEFAULTS[nombre]}
+    return MESSAGE_TEMPLATES[nombre].model_copy(update={**propios, **campos})
+
+
+# Tipos que msgpack/JSON no representan: (tipo, a_plano, desde_plano)
+TYPES: Dict[str, Tuple[type, Callable[[Any], Any], Callable[[Any], Any]]] = {
+    "msg": (BaseMessage, _message_to_plain, _message_from_plain),
+    "datetime": (datetime, datetime.isoformat, datetime.fromisoformat),
+    "date": (date, date.isoformat, date.fromisoformat),
+    "time": (dt_time, dt_time.isoformat, dt_time.fromisoformat),
+    "timedelta": (timedelta, timedelta.total_seconds, lambda v: timedelta(seconds=v)),
+    "uuid": (UUID, str, UUID),
+    "decimal": (Decimal, str, Decimal),
+    "set": (set, list, set),
+    "frozenset": (frozenset, list, frozenset),
+    "tuple": (tuple, list, tuple),
+    "bytes": (bytes, bytes.hex, bytes.fromhex),
+}
+# Cualquier otro objeto (p. ej. Send de langgraph) va como pickle embebido.
+# No debería pasar: se cuenta y se avisa una vez por tipo para añadirlo a TYPES
+PICKLE_TAG = "pickle"
+_pickled_types = set()
+TAGS = list(TYPES) + [PICKLE_TAG]
+EXT_CODES = {tag: i for i, tag in enumerate(TAGS, start=1)}
+MSG_EXT = EXT_CODES["msg"]
+
+
+def _to_plain(obj: Any) -> Tuple[str, Any]:
+    # Camino rápido: la mayoría de objetos de un checkpoint son mensajes
+    if MESSAGE_CLASSES.get(type(obj).__name__) is type(obj):
+        return "msg", _message_to_plain(obj)
+    for tag, (tipo, a_plano, _) in TYPES.items():
+        # datetime es subclase de date: TYPES está ordenado para que gane datetime
+        if tag != "msg" and isinstance(obj, tipo):
+            return tag, a_plano(obj)
+    tipo = f"{type(obj).__module__}.{type(obj).__qualname__}"
+    metrics.inc("checkpoint.pickle_fallbacks")
+    if tipo not in _pickled_types:
+        _pickled_types.add(tipo)
+        print(f"Warning - checkpoint: {tipo} serializado con pickle")
+    return PICKLE_TAG, pickle.dumps(obj).hex()
+
+
+def _from_plain(tag: str, value: Any) -> Any:
+    if tag == PICKLE_TAG:
+        return pickle.loads(bytes.fromhex(value))
+    return TYPES[tag][2](value)
+
+
+class CheckpointSerializer:
+    def __init__(self, fmt: str = "msgpack", zstd_level: int = 0):
+        if fmt not in ("msgpack", "orjson", "pickle"):
+            raise ValueError(f"Formato de checkpoint desconocido: {fmt}")
+        self.fmt = fmt
+        if zstd_level and not ZSTD_AVAILABLE and fmt != "pickle":
+            print(f"Warning - CHECKPOINT_ZSTD_LEVEL={zstd_level} sin `zstandard` instalado: checkpoints sin comprimir")
+        self.zstd_level = zstd_level if ZSTD_AVAILABLE else 0
+        self._compressor = (
+            zstandard.ZstdCompressor(level=self.zstd_level) if self.zstd_level else None
+        )
+        self._decompressor = zstandard.ZstdDecompressor() if ZSTD_AVAILABLE else None
+
+    # msgpack: Ext(código, payload msgpack) -> un solo paso de C en cada sentido
+
+    def _msgpack_default(self, obj: Any) -> ormsgpack.Ext:
+        tag, plano = _to_plain(obj)
+        return ormsgpack.Ext(EXT_CODES[tag], self._pack(plano))
+
+    def _msgpack_ext_hook(self, code: int, data: bytes) -> Any:
+        if code == MSG_EXT:
+            return _message_from_plain(self._unpack(data))
+        return _from_plain(TAGS[code - 1], self._unpack(data))
+
+    def _pack(self, obj: Any) -> bytes:
+        return ormsgpack.packb(
+            obj,
+            default=self._msgpack_default,
+            option=(
+                ormsgpack.OPT_NON_STR_KEYS
+                | ormsgpack.OPT_PASSTHROUGH_DATETIME
+                | ormsgpack.OPT_PASSTHROUGH_UUID
+                | ormsgpack.OPT_PASSTHROUGH_TUPLE
+                | ormsgpack.OPT_PASSTHROUGH_DATACLASS
+                | ormsgpack.OPT_PASSTHROUGH_ENUM
+            ),
+        )
+
+    def _unpack(self, data: bytes) -> Any:
+        return ormsgpack.unpackb(
+            data, ext_hook=self._msgpack_ext_hook, option=ormsgpack.OPT_NON_STR_KEYS
+        )
+
+    # orjson: dicts etiquetados y un recorrido al leer
+
+    @staticmethod
+    def _orjson_default(obj: Any) -> dict:
+        tag, plano = _to_plain(obj)
+        return {"__t": tag, "v": plano}
+
+    @classmethod
+    def _revive(cls, obj: Any) -> Any:
+        if isinstance(obj, dict):
+            if len(obj) == 2 and "__t" in obj and "v" in obj:
+                return _from_plain(obj["__t"], cls._revive(obj["v"]))
+            return {k: cls._revive(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [cls._revive(v) for v in obj]
+        return obj
+
+    def dumps(self, obj: Any) -> bytes:
+        if self.fmt == "pickle":
+            return pickle.dumps(obj)
+        if self.fmt == "msgpack":
+            cabecera, data = FORMAT_MSGPACK, self._pack(obj)
+        else:
+            cabecera = FORMAT_ORJSON
+            data = orjson.dumps(
+                obj,
+                default=self._orjson_default,
+                option=(
+                    orjson.OPT_NON_STR_KEYS
+                    | orjson.OPT_PASSTHROUGH_DATETIME
+                    | orjson.OPT_PASSTHROUGH_DATACLASS
+                ),
+            )
+        if self._compressor is not None and len(data) >= ZSTD_MIN_BYTES:
+            cabecera |= FLAG_ZSTD
+            data = self._compressor.compress(data)
+        metrics.observe("checkpoint.bytes", len(data) + 1, buckets=BYTES_BUCKETS)
+        return bytes((cabecera,)) + data
+
+    def loads(self, data: bytes) -> Any:
+        data = bytes(data)
+        cabecera = data[0]
+        if cabecera == PICKLE_PROTO:
+            metrics.inc("checkpoint.legacy_pickle_reads")
+            return pickle.loads(data)
+
+        payload = data[1:]
+        if cabecera & FLAG_ZSTD:
+            if self._decompressor is None:
+                raise RuntimeError("Checkpoint comprimido con zstd pero `zstandard` no está instalado")
+            payload = self._decompressor.decompress(payload)
+        formato = cabecera & ~FLAG_ZSTD
+        if formato == FORMAT_MSGPACK:
+            return self._unpack(payload)
+        if formato == FORMAT_ORJSON:
+            return self._revive(orjson.loads(payload))
+        raise ValueError(f"Cabecera de checkpoint desconocida: {cabecera:#x}")
+
+
+def default_serializer() -> CheckpointSerializer:
+    return CheckpointSerializer(
+        settings.CHECKPOINT_SERIALIZER, settings.CHECKPOINT_ZSTD_LEVEL
+    )
@@ -1,32 +1,127 @@
 """
 app/services/checkpointer.py - PostgreSQL Checkpointer para LangGraph
+Modo delta (CHECKPOINT_MODE=delta): cada fila guarda solo los cambios respecto
+a parent_checkpoint_id, con un snapshot completo cada CHECKPOINT_SNAPSHOT_EVERY
+pasos; aget_tuple reconstruye con una CTE recursiva (ver checkpoint_delta).
+Escritura diferida: los checkpoints de un turno se acumulan en memoria y
+flush() los escribe en un solo INSERT multi-fila al final del turno, con el
+pool de la app (AsyncSessionLocal). Con durable=True (o
+config["configurable"]["checkpoint_durable"]) cada aput escribe en el acto.
+Lecturas del último checkpoint: primero el nivel caliente en memoria
+(checkpoint_cache). Solo se actualiza cuando el flush llega a la BD; si el
+turno falla, discard() descarta sus filas, la base de deltas y esa entrada.
 """
-from typing import Optional, Dict, Any, Iterator
+from collections import OrderedDict
+from typing import Optional, Dict, Any, AsyncIterator, Iterator, List
 from langgraph.checkpoint.base import BaseCheckpointSaver, Checkpoint, CheckpointMetadata, CheckpointTuple
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy import text
 import json
-import pickle
 from datetime import datetime, timezone
 from contextlib import asynccontextmanager
+from app.config import settings, MEMORY_LIMITS
+from app.services.database import AsyncSessionLocal
+from app.services.checkpoint_serde import CheckpointSerializer, default_serializer
+from app.services.checkpoint_delta import ThreadTip, compute_delta, rebuild
+from app.services.checkpoint_cache import (
+    CheckpointHotTier, approx_bytes, checkpoint_hot_tier, copy_checkpoint,
+)
+from app.services.metrics import metrics, COUNT_BUCKETS
+
+COLUMNS = "checkpoint_data, metadata, checkpoint_id, parent_checkpoint_id, es_snapshot"
+
+# Desde el checkpoint pedido hacia atrás hasta el primer snapshot
+CHAIN_QUERY = f"""
+    WITH RECURSIVE cadena AS (
+        SELECT {COLUMNS}, 0 AS profundidad
+        FROM graph_checkpoints
+        WHERE thread_id = :thread_id
+            AND checkpoint_ns = :checkpoint_ns
+            AND checkpoint_id = {{objetivo}}
+        UNION ALL
+        SELECT {", ".join("g." + c.strip() for c in COLUMNS.split(","))}, c.profundidad + 1
+        FROM graph_checkpoints g
+        JOIN cadena c ON g.checkpoint_id = c.parent_checkpoint_id
+        WHERE g.thread_id = :thread_id
+            AND g.checkpoint_ns = :checkpoint_ns
+            AND NOT c.es_snapshot
+    )
+    SELECT {COLUMNS} FROM cadena ORDER BY profundidad DESC
+"""
+LATEST_ID = """(
+    SELECT checkpoint_id FROM graph_checkpoints
+    WHERE thread_id = :thread_id AND checkpoint_ns = :checkpoint_ns
+    ORDER BY created_at DESC
+    LIMIT 1
+)"""
+LIST_PAGE_SIZE = 50
+INSERT_COLUMNS = (
+    "thread_id", "checkpoint_ns", "checkpoint_id", "parent_id",
+    "checkpoint_data", "metadata", "es_snapshot", "created_at",
+)
+
+
+def _insert_query(filas: int) -> str:
+    valores = ",\n".join(
+        "(" + ", ".join(f":{c}_{i}" for c in INSERT_COLUMNS) + ")" for i in range(filas)
+    )
+    # created_at viene de cada aput: en un INSERT multi-fila CURRENT_TIMESTAMP
+    # sería el mismo para todo el turno y "el último" quedaría indefinido
+    return f"""
+        INSERT INTO graph_checkpoints 
+        (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, 
+         checkpoint_data, metadata, es_snapshot, created_at)
+        VALUES {valores}
+        ON CONFLICT (thread_id, checkpoint_ns, checkpoint_id) 
+        DO UPDATE SET 
+            checkpoint_data = EXCLUDED.checkpoint_data,
+            metadata = EXCLUDED.metadata,
+            es_snapshot = EXCLUDED.es_snapshot,
+            created_at = EXCLUDED.created_at
+    """
+
+
+def _as_row(fila: Dict[str, Any]) -> tuple:
+    """Fila del buffer con la forma de COLUMNS"""
+    return (
+        fila["checkpoint_data"], fila["metadata"], fila["checkpoint_id"],
+        fila["parent_id"], fila["es_snapshot"],
+    )
 
 
 class PostgresCheckpointer(BaseCheckpointSaver):
     
-    def __init__(self, connection_string: str):
+    def __init__(
+        self,
+        session_factory: Optional[async_sessionmaker] = None,
+        serializer: Optional[CheckpointSerializer] = None,
+        durable: Optional[bool] = None,
+        hot_tier: Optional[CheckpointHotTier] = None,
+    ):
         super().__init__()
-        self.engine = create_async_engine(
-            connection_string,
-            pool_size=1,
-            max_overflow=0,
-            pool_pre_ping=True,
-            pool_recycle=900
-        )
+        # Pool compartido con la app: sin engine ni sessionmaker propios
+        self.session_factory = session_factory or AsyncSessionLocal
+        # Filas antiguas en pickle se siguen leyendo (ver checkpoint_serde)
+        self.serializer = serializer or default_serializer()
+        self.delta_mode = settings.CHECKPOINT_MODE == "delta"
+        self.snapshot_every = max(1, settings.CHECKPOINT_SNAPSHOT_EVERY)
+        # Último checkpoint escrito por hilo (base del siguiente delta), LRU
+        # acotada por bytes: (tip, tamaño estimado)
+        self._tips: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._tips_bytes = 0
+        self.max_tips_bytes = MEMORY_LIMITS["checkpoint_tips_mb"] * 1024 * 1024
+        self.durable = settings.CHECKPOINT_DURABLE if durable is None else durable
+        self.max_buffered = max(1, settings.CHECKPOINT_BUFFER_MAX_ROWS)
+        # (thread_id, checkpoint_ns) -> filas pendientes de flush, en orden
+        self._buffer: Dict[tuple, List[Dict[str, Any]]] = {}
+        self.hot_tier = hot_tier or checkpoint_hot_tier
+        # Último checkpoint de cada hilo con filas en el buffer: pasa al nivel
+        # caliente cuando el flush confirma
+        self._pending_hot: Dict[tuple, CheckpointTuple] = {}
     
     @asynccontextmanager
     async def _get_session(self):
-        async_session = async_sessionmaker(self.engine, expire_on_commit=False)
-        async with async_session() as session:
+        async with self.session_factory() as session:
             yield session
     
     async def aput(
@@ -39,39 +134,50 @@ class PostgresCheckpointer(BaseCheckpointSaver):
         thread_id = config["configurable"]["thread_id"]
         checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
         
-        checkpoint_id = f"{checkpoint['id']}_{int(datetime.now(timezone.utc).timestamp() * 1000)}"
+        # Id de LangGraph tal cual: dentro del turno el grafo toma como padre
+        # checkpoint["id"], no el config que devuelve aput
+        checkpoint_id = checkpoint["id"]
         parent_id = config["configurable"].get("checkpoint_id")
         
-        checkpoint_data = pickle.dumps({
-            "checkpoint": checkpoint,
+        key = (thread_id, checkpoint_ns)
+        payload, es_snapshot, tip = self._payload(key, checkpoint_id, parent_id, checkpoint)
+        checkpoint_data = self.serializer.dumps({
+            **payload,
             "metadata": metadata,
             "new_versions": new_versions or {}
         })
-        # es correcto rremplzar datetime.utcnow().timestamp() por datetime.now(timezone.utc).timestamp()
-        async with self._get_session() as session:
-            await session.execute(
-                text("""
-                    INSERT INTO graph_checkpoints 
-                    (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, 
-                     checkpoint_data, metadata)
-                    VALUES (:thread_id, :checkpoint_ns, :checkpoint_id, :parent_id,
-                            :checkpoint_data, :metadata)
-                    ON CONFLICT (thread_id, checkpoint_ns, checkpoint_id) 
-                    DO UPDATE SET 
-                        checkpoint_data = EXCLUDED.checkpoint_data,
-                        metadata = EXCLUDED.metadata,
-                        created_at = CURRENT_TIMESTAMP
-                """),
-                {
-                    "thread_id": thread_id,
-                    "checkpoint_ns": checkpoint_ns,
-                    "checkpoint_id": checkpoint_id,
-                    "parent_id": parent_id,
-                    "checkpoint_data": checkpoint_data,
-                    "metadata": json.dumps(metadata or {})
-                }
-            )
-            await session.commit()
+        metrics.inc("checkpoint.snapshots" if es_snapshot else "checkpoint.deltas")
+        metrics.inc(
+            "checkpoint.snapshot_bytes" if es_snapshot else "checkpoint.delta_bytes",
+            len(checkpoint_data),
+        )
+        
+        pendientes = self._buffer.setdefault(key, [])
+        pendientes.append({
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint_id,
+            "parent_id": parent_id,
+            "checkpoint_data": checkpoint_data,
+            "metadata": json.dumps(metadata or {}),
+            "es_snapshot": es_snapshot,
+            "created_at": datetime.now(timezone.utc),
+        })
+        # El siguiente delta puede apoyarse en una fila aún en el buffer
+        self._remember(key, tip)
+        # Hasta el flush, la entrada del nivel caliente ya no es la última
+        self.hot_tier.discard(key)
+        self._pending_hot[key] = self._tuple(
+            thread_id, checkpoint_ns, (None, None, checkpoint_id, parent_id),
+            copy_checkpoint(checkpoint), metadata,
+        )
+        
+        if (
+            self.durable
+            or config["configurable"].get("checkpoint_durable")
+            or len(pendientes) >= self.max_buffered
+        ):
+            await self.flush(thread_id, checkpoint_ns, raise_errors=True)
         
         return {
             "configurable": {
@@ -96,49 +202,122 @@ class PostgresCheckpointer(BaseCheckpointSaver):
             asyncio.set_event_loop(loop)
         return loop.run_until_complete(self.aput(config, checkpoint, metadata, new_versions))
     
-    async def aget_tuple(self, config: Dict[str, Any]) -> Optional[CheckpointTuple]:
-        thread_id = config["configurable"]["thread_id"]
-        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
-        checkpoint_id = config["configurable"].get("checkpoint_id")
-        
-        if checkpoint_id:
-            query = """
-                SELECT checkpoint_data, metadata, checkpoint_id, parent_checkpoint_id
-                FROM graph_checkpoints
-                WHERE thread_id = :thread_id 
-                    AND checkpoint_ns = :checkpoint_ns
-                    AND checkpoint_id = :checkpoint_id
-            """
-            params = {
-                "thread_id": thread_id,
-                "checkpoint_ns": checkpoint_ns,
-                "checkpoint_id": checkpoint_id
-            }
+    def _payload(self, key: tuple, checkpoint_id: str, parent_id: Optional[str], checkpoint: Checkpoint):
+        """
+        (payload, es_snapshot, tip): delta si el padre es el último checkpoint
+        escrito del hilo (aunque siga en el buffer).
+        """
+        if not self.delta_mode:
+            return {"checkpoint": checkpoint}, True, None
+        tip = self._tips.get(key, (None, 0))[0]
+        if tip is not None and tip.checkpoint_id == parent_id and tip.depth + 1 < self.snapshot_every:
+            payload, es_snapshot, depth = {"delta": compute_delta(checkpoint, tip)}, False, tip.depth + 1
         else:
-            query = """
-                SELECT checkpoint_data, metadata, checkpoint_id, parent_checkpoint_id
-                FROM graph_checkpoints
-                WHERE thread_id = :thread_id 
-                    AND checkpoint_ns = :checkpoint_ns
-                ORDER BY created_at DESC
-                LIMIT 1
-            """
-            params = {
-                "thread_id": thread_id,
-                "checkpoint_ns": checkpoint_ns
-            }
-        
-        async with self._get_session() as session:
-            result = await session.execute(text(query), params)
-            row = result.fetchone()
-        
-        if not row:
-            return None
+            payload, es_snapshot, depth = {"checkpoint": checkpoint}, True, 0
+        # Se copia ya: el grafo sigue mutando el estado mientras se escribe
+        return payload, es_snapshot, ThreadTip(checkpoint_id, checkpoint, depth)
+    
+    async def flush(
+        self,
+        thread_id: Optional[str] = None,
+        checkpoint_ns: Optional[str] = None,
+        session: Optional[AsyncSession] = None,
+        raise_errors: bool = False,
+    ) -> int:
+        """
+        Escribe en un solo INSERT los checkpoints pendientes (de un hilo o de
+        todos). Si falla, los hilos afectados empiezan por un snapshot en el
+        siguiente aput para no referenciar filas que no llegaron a la BD.
+        """
+        keys = [
+            k for k in self._buffer
+            if (thread_id is None or k[0] == thread_id)
+            and (checkpoint_ns is None or k[1] == checkpoint_ns)
+        ]
+        filas = {}
+        for key in keys:
+            for fila in self._buffer.pop(key):
+                # Un mismo INSERT ... ON CONFLICT no puede tocar dos veces la fila
+                filas[(key, fila["checkpoint_id"])] = fila
+        if not filas:
+            return 0
         
-        data = pickle.loads(row[0])
-        checkpoint = data["checkpoint"]
-        metadata = data.get("metadata", {})
+        params = {
+            f"{c}_{i}": fila[c]
+            for i, fila in enumerate(filas.values())
+            for c in INSERT_COLUMNS
+        }
+        try:
+            with metrics.timer("checkpoint.flush_ms"):
+                if session is not None:
+                    await session.execute(text(_insert_query(len(filas))), params)
+                else:
+                    async with self._get_session() as own:
+                        await own.execute(text(_insert_query(len(filas))), params)
+                        await own.commit()
+        except Exception as e:
+            metrics.inc("checkpoint.flush_errors")
+            for key in keys:
+                self._forget(key)
+                self._pending_hot.pop(key, None)
+                self.hot_tier.discard(key)
+            if raise_errors:
+                raise
+            print(f"Error escribiendo checkpoints: {e}")
+            return 0
         
+        for key in keys:
+            ultimo = self._pending_hot.pop(key, None)
+            if ultimo is not None:
+                self.hot_tier.put(key, ultimo)
+        metrics.inc("checkpoint.flushes")
+        metrics.observe("checkpoint.flush_rows", len(filas), buckets=COUNT_BUCKETS)
+        return len(filas)
+    
+    def discard(self, thread_id: str, checkpoint_ns: Optional[str] = None):
+        """
+        Turno fallido (p. ej. rollback del UoW): sus checkpoints no se escriben
+        y el siguiente turno parte de lo que hay en la BD.
+        """
+        keys = {
+            k for k in list(self._buffer) + list(self._tips) + list(self._pending_hot)
+            if k[0] == thread_id and (checkpoint_ns is None or k[1] == checkpoint_ns)
+        }
+        for key in keys:
+            descartadas = self._buffer.pop(key, [])
+            metrics.inc("checkpoint.discarded_rows", len(descartadas))
+            self._forget(key)
+            self._pending_hot.pop(key, None)
+            self.hot_tier.discard(key)
+
+    async def aput_writes(self, config: Dict[str, Any], writes, task_id: str, task_path: str = "") -> None:
+        # Escrituras pendientes de una tarea: solo sirven para reanudar un paso
+        # interrumpido; aquí el turno se repite completo, no se persisten
+        return None
+    
+    def _remember(self, key: tuple, tip: Optional[ThreadTip]):
+        if tip is None:
+            return
+        self._forget(key)
+        # Las listas copiadas retienen los mensajes: son casi todo el tamaño
+        size = approx_bytes(tip.lists) + approx_bytes(tip.versions) + approx_bytes(tip.seen)
+        if size > self.max_tips_bytes:
+            return
+        while self._tips and self._tips_bytes + size > self.max_tips_bytes:
+            _, (_, evicted) = self._tips.popitem(last=False)
+            self._tips_bytes -= evicted
+            metrics.inc("checkpoint.tip_evictions")
+        self._tips[key] = (tip, size)
+        self._tips_bytes += size
+        metrics.set_gauge("checkpoint.tips_bytes", self._tips_bytes)
+    
+    def _forget(self, key: tuple):
+        entry = self._tips.pop(key, None)
+        if entry is not None:
+            self._tips_bytes -= entry[1]
+
+    @staticmethod
+    def _tuple(thread_id: str, checkpoint_ns: str, row, checkpoint: Checkpoint, metadata) -> CheckpointTuple:
         current_config = {
             "configurable": {
                 "thread_id": thread_id,
@@ -159,6 +338,74 @@ class PostgresCheckpointer(BaseCheckpointSaver):
         
         return CheckpointTuple(current_config, checkpoint, metadata, parent_config)
     
+    def _buffered_chain(self, key: tuple, checkpoint_id: Optional[str]) -> List[tuple]:
+        """Tramo de la cadena que aún está en el buffer (del más antiguo al pedido)"""
+        pendientes = {f["checkpoint_id"]: f for f in self._buffer.get(key, [])}
+        if not pendientes:
+            return []
+        actual = checkpoint_id or self._buffer[key][-1]["checkpoint_id"]
+        tramo = []
+        while actual in pendientes:
+            fila = pendientes[actual]
+            tramo.append(_as_row(fila))
+            if fila["es_snapshot"]:
+                break
+            actual = fila["parent_id"]
+        return tramo[::-1]
+    
+    async def _load_chain(self, session, thread_id: str, checkpoint_ns: str, checkpoint_id: Optional[str]) -> List:
+        """Filas del snapshot más cercano hasta checkpoint_id (o el último)"""
+        params = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
+        if checkpoint_id:
+            objetivo = ":checkpoint_id"
+            params["checkpoint_id"] = checkpoint_id
+        else:
+            objetivo = LATEST_ID
+        result = await session.execute(text(CHAIN_QUERY.format(objetivo=objetivo)), params)
+        return result.fetchall()
+    
+    @staticmethod
+    def _rebuild(payloads: List[dict], checkpoint_id: str) -> Optional[Checkpoint]:
+        metrics.observe("checkpoint.chain_length", len(payloads), buckets=COUNT_BUCKETS)
+        checkpoint = rebuild(payloads)
+        if checkpoint is None:
+            print(f"Error checkpoint: cadena sin snapshot para {checkpoint_id}")
+        return checkpoint
+    
+    async def aget_tuple(self, config: Dict[str, Any]) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"].get("checkpoint_id")
+        
+        cached = self.hot_tier.get((thread_id, checkpoint_ns), checkpoint_id)
+        if cached is not None:
+            return cached
+        
+        with metrics.timer("checkpoint.get_ms"):
+            rows = self._buffered_chain((thread_id, checkpoint_ns), checkpoint_id)
+            if rows:
+                metrics.inc("checkpoint.buffer_reads")
+            if not rows or not rows[0][4]:
+                # Sin buffer, o la cadena del buffer sigue en la BD
+                desde = rows[0][3] if rows else checkpoint_id
+                async with self._get_session() as session:
+                    rows = await self._load_chain(session, thread_id, checkpoint_ns, desde) + rows
+            
+            if not rows:
+                return None
+            
+            payloads = [self.serializer.loads(row[0]) for row in rows]
+            checkpoint = self._rebuild(payloads, rows[-1][2])
+            if checkpoint is None:
+                return None
+        
+        metadata = payloads[-1].get("metadata", {})
+        resultado = self._tuple(thread_id, checkpoint_ns, rows[-1], checkpoint, metadata)
+        # Lo que sigue en el buffer entra al nivel caliente con su flush
+        if checkpoint_id is None and (thread_id, checkpoint_ns) not in self._buffer:
+            self.hot_tier.put((thread_id, checkpoint_ns), resultado)
+        return resultado
+    
     def get_tuple(self, config: Dict[str, Any]) -> Optional[CheckpointTuple]:
         import asyncio
         try:
@@ -175,52 +422,79 @@ class PostgresCheckpointer(BaseCheckpointSaver):
         filter: Optional[Dict[str, Any]] = None,
         before: Optional[Dict[str, Any]] = None,
         limit: Optional[int] = None,
-    ) -> Iterator[CheckpointTuple]:
+    ) -> AsyncIterator[CheckpointTuple]:
+        """
+        Del más reciente al más antiguo, por páginas de LIST_PAGE_SIZE filas
+        (keyset sobre created_at): memoria acotada y ninguna conexión del pool
+        retenida mientras el llamador consume.
+        `filter` = subconjunto de la metadata (metadata @> filter);
+        `before` = solo checkpoints anteriores al de ese config.
+        """
         thread_id = config["configurable"]["thread_id"]
         checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        # El historial completo sale de la BD: primero se vuelca el buffer
+        await self.flush(thread_id, checkpoint_ns)
         
-        query = """
-            SELECT checkpoint_data, metadata, checkpoint_id, parent_checkpoint_id
-            FROM graph_checkpoints
-            WHERE thread_id = :thread_id AND checkpoint_ns = :checkpoint_ns
-            ORDER BY created_at DESC
-        """
-        params = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
-        
-        if limit:
-            query += f" LIMIT {limit}"
-        
-        async with self._get_session() as session:
-            result = await session.execute(text(query), params)
-            rows = result.fetchall()
+        condiciones = ["thread_id = :thread_id", "checkpoint_ns = :checkpoint_ns"]
+        params: Dict[str, Any] = {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}
+        if filter:
+            condiciones.append("metadata @> CAST(:filter AS jsonb)")
+            params["filter"] = json.dumps(filter)
+        if before:
+            condiciones.append(
+                "(created_at, checkpoint_id) < (SELECT created_at, checkpoint_id FROM graph_checkpoints"
+                " WHERE thread_id = :thread_id AND checkpoint_ns = :checkpoint_ns"
+                " AND checkpoint_id = :before_id)"
+            )
+            params["before_id"] = before["configurable"]["checkpoint_id"]
         
-        tuples = []
-        for row in rows:
-            data = pickle.loads(row[0])
-            checkpoint = data["checkpoint"]
-            metadata = data.get("metadata", {})
-            
-            current_config = {
-                "configurable": {
-                    "thread_id": thread_id,
-                    "checkpoint_ns": checkpoint_ns,
-                    "checkpoint_id": row[2]
-                }
-            }
+        pendientes = limit if limit else None
+        cursor = None
+        while pendientes is None or pendientes > 0:
+            pagina = LIST_PAGE_SIZE if pendientes is None else min(LIST_PAGE_SIZE, pendientes)
+            where = list(condiciones)
+            if cursor is not None:
+                where.append("(created_at, checkpoint_id) < (:cursor_at, :cursor_id)")
+                params["cursor_at"], params["cursor_id"] = cursor
+            query = f"""
+                SELECT {COLUMNS}, created_at
+                FROM graph_checkpoints
+                WHERE {" AND ".join(where)}
+                ORDER BY created_at DESC, checkpoint_id DESC
+                LIMIT {pagina}
+            """
+            async with self._get_session() as session:
+                rows = (await session.execute(text(query), params)).fetchall()
+                reconstruidos = await self._rebuild_page(session, thread_id, checkpoint_ns, rows)
             
-            parent_config = None
-            if row[3]:
-                parent_config = {
-                    "configurable": {
-                        "thread_id": thread_id,
-                        "checkpoint_ns": checkpoint_ns,
-                        "checkpoint_id": row[3]
-                    }
-                }
+            for row in rows:
+                checkpoint, metadata = reconstruidos[row[2]]
+                if checkpoint is not None:
+                    yield self._tuple(thread_id, checkpoint_ns, row, checkpoint, metadata)
             
-            tuples.append(CheckpointTuple(current_config, checkpoint, metadata, parent_config))
-        
-        return iter(tuples)
+            if len(rows) < pagina:
+                return
+            if pendientes is not None:
+                pendientes -= len(rows)
+            cursor = (rows[-1][5], rows[-1][2])
+    
+    async def _rebuild_page(self, session, thread_id: str, checkpoint_ns: str, rows) -> Dict[str, tuple]:
+        # Del más antiguo al más reciente: cada delta se aplica sobre su padre
+        # ya reconstruido; solo se consulta la cadena si el padre quedó fuera
+        reconstruidos = {}
+        for row in reversed(rows):
+            data = self.serializer.loads(row[0])
+            if row[4]:
+                checkpoint = data["checkpoint"]
+            elif row[3] in reconstruidos and reconstruidos[row[3]][0] is not None:
+                checkpoint = rebuild([{"checkpoint": reconstruidos[row[3]][0]}, data])
+            else:
+                cadena = await self._load_chain(session, thread_id, checkpoint_ns, row[2])
+                checkpoint = self._rebuild(
+                    [self.serializer.loads(r[0]) for r in cadena], row[2]
+                )
+            reconstruidos[row[2]] = (checkpoint, data.get("metadata", {}))
+        return reconstruidos
     
     def list(
         self,
@@ -236,8 +510,33 @@ class PostgresCheckpointer(BaseCheckpointSaver):
         except RuntimeError:
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
-        return loop.run_until_complete(self.alist(config, filter=filter, before=before, limit=limit))
+        
+        async def collect():
+            return [t async for t in self.alist(config, filter=filter, before=before, limit=limit)]
+        
+        return iter(loop.run_until_complete(collect()))
+
+
+async def create_checkpointer(
+    serializer: Optional[CheckpointSerializer] = None, durable: Optional[bool] = None
+) -> PostgresCheckpointer:
+    return PostgresCheckpointer(serializer=serializer, durable=durable)
+
+
+async def checkpoint_table_exists(session_factory: Optional[async_sessionmaker] = None) -> bool:
+    async with (session_factory or AsyncSessionLocal)() as session:
+        result = await session.execute(text("SELECT to_regclass('graph_checkpoints') IS NOT NULL"))
+        return bool(result.scalar())
 
 
-async def create_checkpointer(connection_string: str) -> PostgresCheckpointer:
-    return PostgresCheckpointer(connection_string)
\ No newline at end of file
+async def default_checkpointer() -> Optional[PostgresCheckpointer]:
+    """Checkpointer de la app si está activado y existe la tabla (migración 003)"""
+    if not settings.CHECKPOINTER_ENABLED:
+        return None
+    try:
+        if await checkpoint_table_exists():
+            return await create_checkpointer()
+        print("Checkpointer desactivado: falta graph_checkpoints (migración 003)")
+    except Exception as e:
+        print(f"Error checkpointer: {e}")
+    return None
\ No newline at end of file
@@ -0,0 +1,193 @@
+"""
+app/services/circuit_breaker.py - Circuit breaker para LLM y embeddings
+Si OpenAI se degrada, cada turno esperaba el timeout completo (25 s) antes
+de fallar. El breaker observa una ventana de llamadas recientes y se abre por
+tasa de error o por tasa de llamadas lentas; abierto, rechaza al instante y
+el agente responde en modo degradado (plantillas + extracción por reglas).
+
+  closed --(errores/lentas >= umbral)--> open --(open_s)--> half_open
+  half_open --(sonda ok)--> closed    half_open --(sonda falla)--> open
+
+Estado y transiciones en /metrics (circuit.<nombre>.*).
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from app.config import settings
+from app.services.metrics import metrics
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Llamada rechazada sin tocar la red: el circuito está abierto"""
+
+    def __init__(self, name: str):
+        super().__init__(f"Circuito {name} abierto")
+        self.name = name
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        slow_rate: float = 0.5,
+        slow_ms: float = 8000,
+        min_calls: int = 5,
+        window: int = 20,
+        open_s: float = 30,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.min_calls = max(1, min_calls)
+        self.open_s = open_s
+        self.clock = clock
+        # (fallo, lenta) de las últimas `window` llamadas
+        self._calls: deque = deque(maxlen=max(self.min_calls, window))
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.last_reason: Optional[str] = None
+        metrics.set_gauge(f"circuit.{name}.state", STATE_GAUGE[CLOSED])
+
+    def _transition(self, state: str, reason: Optional[str] = None):
+        if state == self.state:
+            return
+        metrics.inc(f"circuit.{self.name}.transition.{self.state}_to_{state}")
+        metrics.set_gauge(f"circuit.{self.name}.state", STATE_GAUGE[state])
+        print(f"Circuito {self.name}: {self.state} -> {state}" + (f" ({reason})" if reason else ""))
+        self.state = state
+        if state == OPEN:
+            self._opened_at = self.clock()
+            self.last_reason = reason
+        elif state == CLOSED:
+            self._calls.clear()
+        self._probe_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        """Abierto y sin permitir todavía la sonda de half_open"""
+        return self.state == OPEN and self.clock() - self._opened_at < self.open_s
+
+    def allow(self) -> bool:
+        if self.state == OPEN:
+            if self.clock() - self._opened_at < self.open_s:
+                return False
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            # Una sola sonda a la vez; el resto sigue en modo degradado
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+        return True
+
+    def release(self):
+        """Libera la sonda de half_open sin contar éxito ni fallo (cancelación, error ajeno)"""
+        self._probe_in_flight = False
+
+    def record_success(self, latency_ms: float):
+        lenta = latency_ms >= self.slow_ms
+        if lenta:
+            metrics.inc(f"circuit.{self.name}.slow")
+        if self.state == HALF_OPEN:
+            if lenta:
+                self._transition(OPEN, "sonda lenta")
+            else:
+                self._transition(CLOSED)
+            return
+        self._calls.append((False, lenta))
+        self._evaluate()
+
+    def record_failure(self):
+        metrics.inc(f"circuit.{self.name}.failures")
+        if self.state == HALF_OPEN:
+            self._transition(OPEN, "sonda fallida")
+            return
+        self._calls.append((True, False))
+        self._evaluate()
+
+    def _evaluate(self):
+        total = len(self._calls)
+        if self.state != CLOSED or total < self.min_calls:
+            return
+        fallos = sum(1 for fallo, _ in self._calls if fallo)
+        lentas = sum(1 for _, lenta in self._calls if lenta)
+        if fallos / total >= self.failure_rate:
+            self._transition(OPEN, f"errores {fallos}/{total}")
+        elif lentas / total >= self.slow_rate:
+            self._transition(OPEN, f"lentas {lentas}/{total}")
+
+    async def call(
+        self, fn: Callable[[], Awaitable[T]], timeout_s: Optional[float] = None
+    ) -> T:
+        """
+        Ejecuta `fn()` bajo el breaker. Rechaza con CircuitOpenError si está
+        abierto; un timeout cuenta como fallo. La cancelación no cuenta.
+        """
+        if not self.allow():
+            metrics.inc(f"circuit.{self.name}.rejected")
+            raise CircuitOpenError(self.name)
+
+        start = time.perf_counter()
+        try:
+            if timeout_s:
+                resultado = await asyncio.wait_for(fn(), timeout_s)
+            else:
+                resultado = await fn()
+        except asyncio.CancelledError:
+            self.release()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success((time.perf_counter() - start) * 1000)
+        return resultado
+
+    def stats(self) -> dict:
+        c = metrics.counters
+        prefijo = f"circuit.{self.name}.transition."
+        total = len(self._calls)
+        return {
+            "state": self.state,
+            "window_calls": total,
+            "window_failures": sum(1 for fallo, _ in self._calls if fallo),
+            "window_slow": sum(1 for _, lenta in self._calls if lenta),
+            "rejected": c.get(f"circuit.{self.name}.rejected", 0),
+            "last_reason": self.last_reason,
+            "transitions": {
+                nombre[len(prefijo):]: valor
+                for nombre, valor in c.items()
+                if nombre.startswith(prefijo)
+            },
+        }
+
+
+def _breaker(name: str, slow_ms: float) -> CircuitBreaker:
+    return CircuitBreaker(
+        name,
+        failure_rate=settings.CIRCUIT_FAILURE_RATE,
+        slow_rate=settings.CIRCUIT_SLOW_RATE,
+        slow_ms=slow_ms,
+        min_calls=settings.CIRCUIT_MIN_CALLS,
+        window=settings.CIRCUIT_WINDOW,
+        open_s=settings.CIRCUIT_OPEN_S,
+    )
+
+
+llm_breaker = _breaker("llm", settings.CIRCUIT_LLM_SLOW_MS)
+embeddings_breaker = _breaker("embeddings", settings.CIRCUIT_EMBEDDINGS_SLOW_MS)
+
+
+def stats() -> dict:
+    return {b.name: b.stats() for b in (llm_breaker, embeddings_breaker)}
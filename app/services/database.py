@@ -4,6 +4,7 @@ app/services/database.py - Pool mínimo para 512MB
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from app.config import settings
+from app.services.metrics import track_db_statements
 
 engine = create_async_engine(
     settings.DATABASE_URL,
@@ -12,9 +13,14 @@ engine = create_async_engine(
     pool_size=1,
     max_overflow=1,
     pool_recycle=900,
-    pool_timeout=20
+    pool_timeout=20,
+    connect_args={
+        "server_settings": {"hnsw.ef_search": str(settings.PGVECTOR_EF_SEARCH)}
+    },
 )
 
+track_db_statements(engine)
+
 AsyncSessionLocal = async_sessionmaker(
     engine,
     class_=AsyncSession,
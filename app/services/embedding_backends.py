@@ -0,0 +1,122 @@
+"""
+app/services/embedding_backends.py - Backends de embeddings intercambiables
+- openai: API remota (por defecto)
+- local: sentence-transformers en CPU, lotes repartidos en un thread pool
+
+OJO: cada backend genera su propio espacio vectorial. Se elige uno por
+configuración (EMBEDDING_BACKEND); cambiarlo exige re-generar los embeddings
+guardados (/sync-knowledge, mensajes, patrones). No es un fallback automático.
+"""
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import numpy as np
+from openai import AsyncOpenAI, OpenAI
+
+
+class EmbeddingBackend(ABC):
+    """Interfaz: textos -> vectores de `dimensions` floats, en el mismo orden"""
+
+    name: str = "base"
+    dimensions: int = 0
+
+    @abstractmethod
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        ...
+
+    @abstractmethod
+    def embed_sync(self, texts: List[str]) -> List[List[float]]:
+        ...
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    def __init__(self, async_client: AsyncOpenAI, sync_client: OpenAI,
+                 model: str, dimensions: int):
+        self.async_client = async_client
+        self.sync_client = sync_client
+        self.model = model
+        self.dimensions = dimensions
+        self.name = model
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        response = await self.async_client.embeddings.create(
+            model=self.model,
+            input=texts,
+            dimensions=self.dimensions
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+    def embed_sync(self, texts: List[str]) -> List[List[float]]:
+        response = self.sync_client.embeddings.create(
+            model=self.model,
+            input=texts,
+            dimensions=self.dimensions
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """
+    Modelo sentence-transformers en CPU (requiere `pip install sentence-transformers`).
+    El modelo se carga al primer uso; los lotes grandes se parten en trozos de
+    batch_size que se codifican en paralelo en el thread pool (fuera del event loop).
+    """
+
+    def __init__(self, model_name: str, dimensions: int, batch_size: int = 32,
+                 workers: int = 2, model=None):
+        self.model_name = model_name
+        self.dimensions = dimensions
+        self.batch_size = max(1, batch_size)
+        self.name = f"local-{model_name}"
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="embeddings-local"
+        )
+        self._model = model
+        self._load_lock = threading.Lock()
+
+    def _get_model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    try:
+                        from sentence_transformers import SentenceTransformer
+                    except ImportError as e:
+                        raise RuntimeError(
+                            "EMBEDDING_BACKEND=local requiere sentence-transformers"
+                        ) from e
+
+                    model = SentenceTransformer(self.model_name, device="cpu")
+                    nativas = model.get_sentence_embedding_dimension()
+                    if nativas != self.dimensions:
+                        raise ValueError(
+                            f"{self.model_name} genera {nativas} dims; "
+                            f"EMBEDDING_DIMENSIONS={self.dimensions}"
+                        )
+                    self._model = model
+        return self._model
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        vectores = self._get_model().encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+        )
+        return np.asarray(vectores, dtype=np.float32).tolist()
+
+    def _chunks(self, texts: List[str]) -> List[List[str]]:
+        return [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        partes = await asyncio.gather(*(
+            loop.run_in_executor(self.executor, self._encode, chunk)
+            for chunk in self._chunks(texts)
+        ))
+        return [vector for parte in partes for vector in parte]
+
+    def embed_sync(self, texts: List[str]) -> List[List[float]]:
+        return [vector for chunk in self._chunks(texts) for vector in self._encode(chunk)]
@@ -0,0 +1,151 @@
+"""
+app/services/embedding_disk_cache.py - Segundo nivel de cache de embeddings en disco
+Sobrevive a deploys y al reciclado de workers (limit_max_requests).
+- vectors.f32: matriz float32 append-only (una fila por texto), leída con mmap
+- index.bin: md5 de cada fila en el mismo orden (16 bytes por entrada)
+Solo el índice (dict md5 -> fila) vive en el heap; los vectores los sirve
+el page cache del sistema operativo.
+Las escrituras (flock + write) van a un único hilo propio: set_background
+no bloquea el event loop y las filas se añaden en orden.
+"""
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.services.metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin lock entre procesos
+    fcntl = None
+
+KEY_BYTES = 16
+# Escrituras en cola como máximo; por encima se descartan (solo es cache)
+MAX_PENDING_WRITES = 256
+
+
+class DiskEmbeddingCache:
+    def __init__(self, directory: str, model: str, dimensions: int, max_mb: int = 256):
+        # Un par de ficheros por modelo/dimensión: nunca se mezclan espacios vectoriales
+        slug = re.sub(r"[^a-zA-Z0-9_.-]", "_", f"{model}_{dimensions}")
+        base = Path(directory)
+        base.mkdir(parents=True, exist_ok=True)
+
+        self.dimensions = dimensions
+        self.row_bytes = dimensions * 4
+        self.max_rows = max(0, max_mb * 1024 * 1024 // self.row_bytes)
+        self.vectors_path = base / f"{slug}.vectors.f32"
+        self.index_path = base / f"{slug}.index.bin"
+        self.lock_path = base / f"{slug}.lock"
+
+        self.index: Dict[bytes, int] = {}
+        self._mmap: Optional[np.memmap] = None
+        self._mapped_rows = 0
+        self._full_logged = False
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-disk")
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._load_index()
+
+    @staticmethod
+    def make_key(text: str) -> bytes:
+        return hashlib.md5(text.encode('utf-8')).digest()
+
+    def _load_index(self):
+        self.vectors_path.touch(exist_ok=True)
+        self.index_path.touch(exist_ok=True)
+
+        raw = self.index_path.read_bytes()
+        # Si un proceso murió a mitad de escritura, solo cuentan las filas completas
+        rows = min(len(raw) // KEY_BYTES, self.vectors_path.stat().st_size // self.row_bytes)
+        for row in range(rows):
+            self.index[raw[row * KEY_BYTES:(row + 1) * KEY_BYTES]] = row
+
+        metrics.set_gauge("embedding_disk_cache.rows", len(self.index))
+
+    def _remap(self):
+        rows = self.vectors_path.stat().st_size // self.row_bytes
+        self._mmap = (
+            np.memmap(self.vectors_path, dtype=np.float32, mode="r",
+                      shape=(rows, self.dimensions))
+            if rows else None
+        )
+        self._mapped_rows = rows
+
+    def get(self, text: str) -> Optional[List[float]]:
+        row = self.index.get(self.make_key(text))
+        if row is None:
+            metrics.inc("embedding_disk_cache.misses")
+            return None
+
+        if row >= self._mapped_rows:
+            self._remap()
+        metrics.inc("embedding_disk_cache.hits")
+        return self._mmap[row].tolist()
+
+    def set(self, text: str, embedding: List[float]):
+        key = self.make_key(text)
+        if key in self.index:
+            return
+        if len(self.index) >= self.max_rows:
+            if not self._full_logged:
+                print(f"Cache de embeddings en disco llena ({len(self.index)} filas)")
+                self._full_logged = True
+            return
+
+        vector = np.asarray(embedding, dtype=np.float32)
+        if vector.shape != (self.dimensions,):
+            return
+
+        with open(self.lock_path, "a") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            # Fila = tamaño actual del fichero (otro proceso pudo haber añadido);
+            # una fila a medias de un crash se sobrescribe
+            with open(self.vectors_path, "r+b") as f:
+                row = os.fstat(f.fileno()).st_size // self.row_bytes
+                f.seek(row * self.row_bytes)
+                f.write(vector.tobytes())
+                f.truncate()
+            with open(self.index_path, "r+b") as f:
+                f.seek(row * KEY_BYTES)
+                f.write(key)
+
+        self.index[key] = row
+        metrics.inc("embedding_disk_cache.writes")
+        metrics.set_gauge("embedding_disk_cache.rows", len(self.index))
+
+    def set_background(self, text: str, embedding: List[float]):
+        """set() en el hilo escritor, sin esperar al disco"""
+        if self.make_key(text) in self.index:
+            return
+        with self._pending_lock:
+            if self._pending >= MAX_PENDING_WRITES:
+                metrics.inc("embedding_disk_cache.dropped_writes")
+                return
+            self._pending += 1
+        self._writer.submit(self.set, text, embedding).add_done_callback(self._write_done)
+
+    def _write_done(self, future: Future):
+        with self._pending_lock:
+            self._pending -= 1
+        if future.exception() is not None:
+            print(f"Error cache disco: {future.exception()}")
+
+    def flush(self):
+        """Espera a que se escriba lo que está en cola"""
+        self._writer.submit(lambda: None).result()
+
+    def stats(self) -> dict:
+        return {
+            "rows": len(self.index),
+            "pending_writes": self._pending,
+            "max_rows": self.max_rows,
+            "file_mb": round(self.vectors_path.stat().st_size / 1024 / 1024, 2),
+        }
@@ -0,0 +1,207 @@
+"""
+app/services/embedding_queue.py - Write-behind de embeddings de mensajes
+Los Mensajes se insertan con embedding NULL; un worker en background los
+rellena por lotes con UPDATE ... FROM (VALUES ...).
+- Cola acotada (si se llena, el escaneo de recuperación los recoge luego)
+- Reintentos con backoff exponencial
+- Al arrancar y cada recovery_interval_s (con o sin tráfico) escanea
+  mensajes con embedding NULL
+"""
+import asyncio
+import time
+from typing import List, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.services.database import AsyncSessionLocal
+from app.services.embeddings import embedding_service
+from app.services.metrics import metrics, COUNT_BUCKETS
+
+
+class MessageEmbeddingQueue:
+    def __init__(
+        self,
+        maxsize: int = 500,
+        batch_size: int = 32,
+        max_retries: int = 3,
+        retry_base_s: float = 2.0,
+        recovery_interval_s: float = 300,
+    ):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_base_s = retry_base_s
+        self.recovery_interval_s = recovery_interval_s
+        self._inflight: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._retry_tasks: Set[asyncio.Task] = set()
+        self._last_recovery = 0.0
+
+    def enqueue(self, mensaje_id: str, contenido: str, attempts: int = 0) -> bool:
+        mensaje_id = str(mensaje_id)
+        if attempts == 0 and mensaje_id in self._inflight:
+            return True
+        try:
+            self.queue.put_nowait((mensaje_id, contenido, attempts))
+        except asyncio.QueueFull:
+            self._inflight.discard(mensaje_id)
+            metrics.inc("embedding_queue.dropped")
+            self._update_gauges()
+            return False
+
+        self._inflight.add(mensaje_id)
+        metrics.inc("embedding_queue.enqueued")
+        self._update_gauges()
+        return True
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        for task in list(self._retry_tasks):
+            task.cancel()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def recover(self) -> int:
+        """Encola mensajes que quedaron sin embedding (reinicios, cola llena, fallos)"""
+        libres = self.queue.maxsize - self.queue.qsize()
+        if libres <= 0:
+            return 0
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                text("""
+                    SELECT id::text, contenido
+                    FROM mensajes
+                    WHERE embedding IS NULL
+                    ORDER BY created_at
+                    LIMIT :limit
+                """),
+                {"limit": libres},
+            )
+            rows = result.fetchall()
+
+        encolados = 0
+        for mensaje_id, contenido in rows:
+            if mensaje_id not in self._inflight and self.enqueue(mensaje_id, contenido):
+                encolados += 1
+
+        metrics.inc("embedding_queue.recovered", encolados)
+        return encolados
+
+    async def _recover_safe(self):
+        self._last_recovery = time.monotonic()
+        try:
+            await self.recover()
+        except Exception as e:
+            print(f"Error recuperando embeddings pendientes: {e}")
+
+    async def _run(self):
+        await self._recover_safe()
+
+        while True:
+            # Plazo fijo: con tráfico continuo la cola nunca queda en reposo y
+            # lo descartado (cola llena, reintentos agotados) no se recuperaría
+            espera = self._last_recovery + self.recovery_interval_s - time.monotonic()
+            if espera <= 0:
+                await self._recover_safe()
+                continue
+            try:
+                first = await asyncio.wait_for(self.queue.get(), timeout=espera)
+            except asyncio.TimeoutError:
+                continue
+
+            batch = [first]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            await self._process(batch)
+
+    async def _process(self, batch: List[Tuple[str, str, int]]):
+        self._update_gauges()
+        metrics.observe("embedding_queue.batch_size", len(batch), buckets=COUNT_BUCKETS)
+
+        try:
+            with metrics.timer("embedding_queue.batch_ms"):
+                vectores = await embedding_service.embed_batch(
+                    [contenido for _, contenido, _ in batch], strict=True
+                )
+                await self._write(batch, vectores)
+        except Exception as e:
+            metrics.inc("embedding_queue.failures")
+            print(f"Error write-behind embeddings: {e}")
+            self._retry(batch)
+            return
+
+        for mensaje_id, _, _ in batch:
+            self._inflight.discard(mensaje_id)
+        metrics.inc("embedding_queue.processed", len(batch))
+        self._update_gauges()
+
+    async def _write(self, batch: List[Tuple[str, str, int]], vectores: List[List[float]]):
+        params = {}
+        values = []
+        for i, ((mensaje_id, _, _), vector) in enumerate(zip(batch, vectores)):
+            params[f"id{i}"] = mensaje_id
+            params[f"e{i}"] = str(vector)
+            values.append(f"(CAST(:id{i} AS uuid), CAST(:e{i} AS vector))")
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                text(f"""
+                    UPDATE mensajes AS m
+                    SET embedding = v.embedding
+                    FROM (VALUES {", ".join(values)}) AS v(id, embedding)
+                    WHERE m.id = v.id AND m.embedding IS NULL
+                """),
+                params,
+            )
+            await db.commit()
+
+    def _retry(self, batch: List[Tuple[str, str, int]]):
+        for mensaje_id, contenido, attempts in batch:
+            if attempts + 1 >= self.max_retries:
+                # Se abandona; el escaneo de recuperación lo volverá a intentar
+                self._inflight.discard(mensaje_id)
+                metrics.inc("embedding_queue.abandoned")
+                continue
+
+            task = asyncio.create_task(
+                self._requeue_later(mensaje_id, contenido, attempts + 1)
+            )
+            self._retry_tasks.add(task)
+            task.add_done_callback(self._retry_tasks.discard)
+            metrics.inc("embedding_queue.retries")
+        self._update_gauges()
+
+    async def _requeue_later(self, mensaje_id: str, contenido: str, attempts: int):
+        await asyncio.sleep(self.retry_base_s * (2 ** (attempts - 1)))
+        self.enqueue(mensaje_id, contenido, attempts)
+
+    def _update_gauges(self):
+        metrics.set_gauge("embedding_queue.backlog", self.queue.qsize())
+        metrics.set_gauge("embedding_queue.inflight", len(self._inflight))
+        metrics.set_gauge("embedding_queue.retrying", len(self._retry_tasks))
+
+    def stats(self) -> dict:
+        return {
+            "backlog": self.queue.qsize(),
+            "inflight": len(self._inflight),
+            "retrying": len(self._retry_tasks),
+            "maxsize": self.queue.maxsize,
+        }
+
+
+message_embedding_queue = MessageEmbeddingQueue(
+    maxsize=settings.EMBEDDING_QUEUE_MAXSIZE,
+    max_retries=settings.EMBEDDING_QUEUE_MAX_RETRIES,
+    recovery_interval_s=settings.EMBEDDING_RECOVERY_INTERVAL_S,
+)
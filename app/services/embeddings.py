@@ -3,48 +3,172 @@ app/services/embeddings.py
 Servicio de embeddings ultra-optimizado con cache LRU reducido
 """
 import hashlib
-from typing import List, Optional
+import sys
+from collections import OrderedDict
+from typing import List, Optional, Tuple
 from openai import AsyncOpenAI, OpenAI
 import numpy as np
-from app.config import settings
+from app.config import settings, MEMORY_LIMITS
+from app.services.metrics import metrics, COUNT_BUCKETS
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError, embeddings_breaker
+from app.services.embedding_disk_cache import DiskEmbeddingCache
+from app.services.http_client import get_async_http_client, get_sync_http_client
+from app.services.embedding_backends import (
+    EmbeddingBackend,
+    OpenAIEmbeddingBackend,
+    LocalEmbeddingBackend,
+)
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
 
 
 class EmbeddingCache:
-    
-    def __init__(self, max_size: int = 10):
-        self.cache = {}
-        self.max_size = max_size
-        self.access_order = []
-    
-    def _make_key(self, text: str) -> str:
-        return hashlib.md5(text.encode('utf-8')).hexdigest()
-    
+    """
+    LRU O(1) (OrderedDict) acotado por bytes, no por número de entradas.
+    Guarda float32 contiguos: 384 dims = 1.5 KB frente a ~9 KB de list[float].
+    """
+
+    # Cabecera del ndarray + clave md5 + nodo del OrderedDict (aprox.)
+    ENTRY_OVERHEAD = sys.getsizeof(np.empty(0, dtype=np.float32)) + 16 + 100
+
+    def __init__(self, max_bytes: int):
+        self.cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self.max_bytes = max_bytes
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _make_key(self, text: str) -> bytes:
+        return hashlib.md5(text.encode('utf-8')).digest()
+
+    def _entry_size(self, vector: np.ndarray) -> int:
+        return vector.nbytes + self.ENTRY_OVERHEAD
+
     def get(self, text: str) -> Optional[List[float]]:
         key = self._make_key(text)
-        if key in self.cache:
-            if key in self.access_order:
-                self.access_order.remove(key)
-            self.access_order.append(key)
-            return self.cache[key]
-        return None
-    
+        vector = self.cache.get(key)
+        if vector is None:
+            self.misses += 1
+            metrics.inc("embedding_cache.misses")
+            return None
+
+        self.cache.move_to_end(key)
+        self.hits += 1
+        metrics.inc("embedding_cache.hits")
+        return vector.tolist()
+
     def set(self, text: str, embedding: List[float]):
         key = self._make_key(text)
-        
-        if len(self.cache) >= self.max_size and key not in self.cache:
-            oldest = self.access_order.pop(0)
-            del self.cache[oldest]
-        
-        self.cache[key] = embedding
-        if key in self.access_order:
-            self.access_order.remove(key)
-        self.access_order.append(key)
-    
+        vector = np.asarray(embedding, dtype=np.float32)
+        size = self._entry_size(vector)
+        if size > self.max_bytes:
+            return
+
+        previous = self.cache.pop(key, None)
+        if previous is not None:
+            self.bytes_used -= self._entry_size(previous)
+
+        while self.cache and self.bytes_used + size > self.max_bytes:
+            _, evicted = self.cache.popitem(last=False)
+            self.bytes_used -= self._entry_size(evicted)
+            self.evictions += 1
+            metrics.inc("embedding_cache.evictions")
+
+        self.cache[key] = vector
+        self.bytes_used += size
+        metrics.set_gauge("embedding_cache.bytes", self.bytes_used)
+
     def clear(self):
         self.cache.clear()
-        self.access_order.clear()
+        self.bytes_used = 0
+        metrics.set_gauge("embedding_cache.bytes", 0)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.cache),
+            "bytes": self.bytes_used,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batching: agrupa llamadas concurrentes durante unos ms (o hasta
+    max_batch textos) y las envía al backend en una sola llamada.
+    Cada llamador recibe su propio future.
+    Con `breaker`, cada llamada al backend pasa por el circuit breaker.
+    """
+
+    def __init__(
+        self,
+        backend: EmbeddingBackend,
+        max_batch: int,
+        window_ms: int,
+        breaker: Optional[CircuitBreaker] = None,
+        timeout_s: Optional[float] = None,
+    ):
+        self.backend = backend
+        self.breaker = breaker
+        self.timeout_s = timeout_s
+        self.max_batch = max(1, max_batch)
+        self.window_s = max(0, window_ms) / 1000
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+    async def submit(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_s, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._pending:
+            batch = self._pending[:self.max_batch]
+            self._pending = self._pending[self.max_batch:]
+            task = asyncio.create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]):
+        textos = list(dict.fromkeys(text for text, _ in batch))
+        metrics.inc("embeddings.requests")
+        metrics.observe("embeddings.batch_size", len(textos), buckets=COUNT_BUCKETS)
+
+        try:
+            with metrics.timer("embeddings.request_ms"):
+                if self.breaker is not None:
+                    resultado = await self.breaker.call(
+                        lambda: self.backend.embed(textos), self.timeout_s
+                    )
+                else:
+                    resultado = await self.backend.embed(textos)
+            vectores = dict(zip(textos, resultado))
+
+            for text, future in batch:
+                if not future.done():
+                    future.set_result(vectores[text])
+
+        except Exception as e:
+            metrics.inc("embeddings.errors")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
 
 
 class EmbeddingService:
@@ -52,20 +176,75 @@ class EmbeddingService:
     _instance = None
     
     def __init__(self):
+        self._build_clients()
+        self.cache = EmbeddingCache(
+            max_bytes=MEMORY_LIMITS["embedding_cache_mb"] * 1024 * 1024
+        )
+        self.model = settings.EMBEDDING_MODEL
+        self.dimensions = settings.EMBEDDING_DIMENSIONS
+        self.backend = self._build_backend()
+        self.disk_cache: Optional[DiskEmbeddingCache] = None
+        if settings.EMBEDDING_DISK_CACHE_DIR:
+            try:
+                self.disk_cache = DiskEmbeddingCache(
+                    settings.EMBEDDING_DISK_CACHE_DIR,
+                    self.backend.name,
+                    self.dimensions,
+                    max_mb=settings.EMBEDDING_DISK_CACHE_MAX_MB,
+                )
+            except Exception as e:
+                print(f"Warning - Cache de embeddings en disco: {e}")
+        local = isinstance(self.backend, LocalEmbeddingBackend)
+        # El backend local no depende de la red: sin breaker
+        self.batcher = EmbeddingBatcher(
+            self.backend,
+            max_batch=(
+                settings.EMBEDDING_LOCAL_BATCH_SIZE if local else settings.EMBEDDING_BATCH_SIZE
+            ),
+            window_ms=settings.EMBEDDING_BATCH_WINDOW_MS,
+            breaker=None if local else embeddings_breaker,
+            timeout_s=None if local else settings.EMBEDDING_TIMEOUT_S,
+        )
+    
+    def _build_clients(self):
+        # Pools compartidos con el chat (ver http_client)
+        self._async_http = get_async_http_client()
+        self._sync_http = get_sync_http_client()
         self.async_client = AsyncOpenAI(
             api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
             timeout=20.0,
-            max_retries=2
+            max_retries=2,
+            http_client=self._async_http,
         )
         self.sync_client = OpenAI(
             api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
             timeout=20.0,
-            max_retries=2
+            max_retries=2,
+            http_client=self._sync_http,
+        )
+
+    def _reopen_if_closed(self):
+        """Tras http_client.aclose() los clientes OpenAI apuntarían a pools cerrados"""
+        if not (self._async_http.is_closed or self._sync_http.is_closed):
+            return
+        self._build_clients()
+        if isinstance(self.backend, OpenAIEmbeddingBackend):
+            self.backend.async_client = self.async_client
+            self.backend.sync_client = self.sync_client
+    
+    def _build_backend(self) -> EmbeddingBackend:
+        if settings.EMBEDDING_BACKEND == "local":
+            return LocalEmbeddingBackend(
+                settings.EMBEDDING_LOCAL_MODEL,
+                self.dimensions,
+                batch_size=settings.EMBEDDING_LOCAL_BATCH_SIZE,
+                workers=settings.EMBEDDING_LOCAL_WORKERS,
+            )
+        return OpenAIEmbeddingBackend(
+            self.async_client, self.sync_client, self.model, self.dimensions
         )
-        self.cache = EmbeddingCache(max_size=settings.EMBEDDING_CACHE_SIZE)
-        self.model = settings.EMBEDDING_MODEL
-        self.dimensions = settings.EMBEDDING_DIMENSIONS
-        self.executor = ThreadPoolExecutor(max_workers=2)
     
     @classmethod
     def get_instance(cls) -> "EmbeddingService":
@@ -73,50 +252,79 @@ class EmbeddingService:
             cls._instance = cls()
         return cls._instance
     
-    async def embed_text(self, text: str) -> List[float]:
+    def _cached(self, text: str) -> Optional[List[float]]:
+        """Memoria (LRU) y después disco; un acierto en disco se promociona"""
+        cached = self.cache.get(text)
+        if cached is None and self.disk_cache is not None:
+            try:
+                cached = self.disk_cache.get(text)
+            except Exception as e:
+                print(f"Error cache disco: {e}")
+                cached = None
+            if cached is not None:
+                self.cache.set(text, cached)
+        return cached
+    
+    def _store(self, text: str, embedding: List[float]):
+        self.cache.set(text, embedding)
+        if self.disk_cache is not None:
+            self.disk_cache.set_background(text, embedding)
+    
+    async def embed_text_strict(self, text: str) -> List[float]:
+        """Como embed_text pero propaga errores (para reintentos)"""
         if not text or not text.strip():
             return [0.0] * self.dimensions
         
         text = text.strip()[:8000]
         
-        cached = self.cache.get(text)
+        cached = self._cached(text)
         if cached is not None:
             return cached
         
+        breaker = self.batcher.breaker
+        if breaker is not None and breaker.is_open:
+            # Sin esperar la ventana del batcher
+            metrics.inc(f"circuit.{breaker.name}.rejected")
+            raise CircuitOpenError(breaker.name)
+        
+        self._reopen_if_closed()
+        embedding = await self.batcher.submit(text)
+        self._store(text, embedding)
+        return embedding
+    
+    async def embed_text(self, text: str) -> List[float]:
         try:
-            response = await self.async_client.embeddings.create(
-                model=self.model,
-                input=text,
-                dimensions=self.dimensions
-            )
-            
-            embedding = response.data[0].embedding
-            self.cache.set(text, embedding)
-            return embedding
-            
+            return await self.embed_text_strict(text)
+        except CircuitOpenError:
+            return [0.0] * self.dimensions
         except Exception as e:
             print(f"Error embedding: {e}")
             return [0.0] * self.dimensions
     
+    async def embed_batch(
+        self, texts: List[str], strict: bool = False, return_exceptions: bool = False
+    ) -> List[List[float]]:
+        """Embeddings de varios textos compartiendo el dispatcher (reindexados, turnos).
+        Con return_exceptions (y strict) cada fallo queda en su posición"""
+        embed = self.embed_text_strict if strict else self.embed_text
+        return list(await asyncio.gather(
+            *(embed(t) for t in texts), return_exceptions=return_exceptions
+        ))
+    
     def _sync_embed(self, text: str) -> List[float]:
         if not text or not text.strip():
             return [0.0] * self.dimensions
         
         text = text.strip()[:8000]
         
-        cached = self.cache.get(text)
+        cached = self._cached(text)
         if cached is not None:
             return cached
         
         try:
-            response = self.sync_client.embeddings.create(
-                model=self.model,
-                input=text,
-                dimensions=self.dimensions
-            )
-            
-            embedding = response.data[0].embedding
-            self.cache.set(text, embedding)
+            self._reopen_if_closed()
+            embedding = self.backend.embed_sync([text])[0]
+            self._store(text, embedding)
             return embedding
             
         except Exception as e:
@@ -124,14 +332,17 @@ class EmbeddingService:
             return [0.0] * self.dimensions
     
     def encode_single(self, text: str) -> List[float]:
+        """
+        Versión síncrona SOLO para scripts (sin event loop).
+        Dentro de la app usar siempre: await embedding_service.embed_text(...)
+        """
         try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                return self._sync_embed(text)
-            else:
-                return loop.run_until_complete(self.embed_text(text))
+            asyncio.get_running_loop()
         except RuntimeError:
             return self._sync_embed(text)
+        raise RuntimeError(
+            "encode_single() bloquea el event loop; usa await embed_text()"
+        )
     
     def cosine_similarity(self, embedding1: List[float], embedding2: List[float]) -> float:
         vec1 = np.array(embedding1)
@@ -0,0 +1,127 @@
+"""
+app/services/http_client.py - Transporte HTTP compartido para OpenAI
+Chat, extracción y embeddings usaban cada uno su propio pool (un handshake
+TLS por cliente y por conexión expirada). Un solo AsyncClient keep-alive por
+proceso, con HTTP/2 si está instalado `h2` (multiplexa peticiones sobre una
+conexión), y un Client síncrono para el fallback síncrono de embeddings.
+Métricas: conexiones nuevas (handshakes) vs reutilizadas, vía
+response.extensions["network_stream"].
+"""
+import weakref
+from collections import OrderedDict
+from typing import Optional
+
+import httpx
+
+from app.config import settings
+from app.services.metrics import metrics
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Streams sin weakref recordados por id(): los más recientes, no todos
+MAX_TRACKED_IDS = 256
+
+
+class ConnectionTracker:
+    """Distingue peticiones sobre conexión nueva (handshake) o reutilizada"""
+
+    def __init__(self, prefix: str = "openai_http"):
+        self.prefix = prefix
+        self._streams = weakref.WeakSet()
+        self._ids: "OrderedDict[int, None]" = OrderedDict()
+
+    def observe(self, response: httpx.Response):
+        metrics.inc(f"{self.prefix}.requests")
+        metrics.inc(f"{self.prefix}.{response.http_version.replace('/', '').lower()}")
+
+        stream = response.extensions.get("network_stream")
+        if stream is None:
+            return
+        try:
+            nueva = stream not in self._streams
+            self._streams.add(stream)
+        except TypeError:
+            # Streams sin soporte de weakref: se identifica por id()
+            nueva = id(stream) not in self._ids
+            self._ids[id(stream)] = None
+            self._ids.move_to_end(id(stream))
+            if len(self._ids) > MAX_TRACKED_IDS:
+                self._ids.popitem(last=False)
+        metrics.inc(f"{self.prefix}.new_connections" if nueva else f"{self.prefix}.reused_connections")
+
+    async def aobserve(self, response: httpx.Response):
+        self.observe(response)
+
+    def stats(self) -> dict:
+        c = metrics.counters
+        nuevas = c.get(f"{self.prefix}.new_connections", 0)
+        reusadas = c.get(f"{self.prefix}.reused_connections", 0)
+        return {
+            "http2": HTTP2_AVAILABLE and settings.OPENAI_HTTP2,
+            "requests": c.get(f"{self.prefix}.requests", 0),
+            "handshakes": nuevas,
+            "reused": reusadas,
+            "reuse_ratio": round(reusadas / (nuevas + reusadas), 3) if nuevas + reusadas else 0.0,
+        }
+
+
+tracker = ConnectionTracker()
+_async_client: Optional[httpx.AsyncClient] = None
+_sync_client: Optional[httpx.Client] = None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.OPENAI_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.OPENAI_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=settings.OPENAI_HTTP_KEEPALIVE_EXPIRY_S,
+    )
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE and settings.OPENAI_HTTP2,
+            limits=_limits(),
+            timeout=httpx.Timeout(settings.OPENAI_TIMEOUT, connect=5.0),
+            event_hooks={"response": [tracker.aobserve]},
+        )
+    return _async_client
+
+
+def get_sync_http_client() -> httpx.Client:
+    global _sync_client
+    if _sync_client is None or _sync_client.is_closed:
+        # httpx.Client no comparte conexiones con el AsyncClient: pool propio
+        _sync_client = httpx.Client(
+            http2=HTTP2_AVAILABLE and settings.OPENAI_HTTP2,
+            limits=_limits(),
+            timeout=httpx.Timeout(settings.OPENAI_TIMEOUT, connect=5.0),
+            event_hooks={"response": [tracker.observe]},
+        )
+    return _sync_client
+
+
+async def warm_up() -> bool:
+    """Abre la conexión (DNS + TLS) antes del primer turno"""
+    with metrics.timer("openai_http.warm_up_ms"):
+        response = await get_async_http_client().get(
+            f"{settings.OPENAI_BASE_URL.rstrip('/')}/models",
+            headers={"Authorization": f"Bearer {settings.OPENAI_API_KEY}"},
+        )
+    return response.status_code < 500
+
+
+async def aclose():
+    global _async_client, _sync_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    if _sync_client is not None:
+        _sync_client.close()
+        _sync_client = None
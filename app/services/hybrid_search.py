@@ -0,0 +1,155 @@
+"""
+app/services/hybrid_search.py - Recuperación híbrida léxica + vectorial (RRF)
+Términos exactos ("facturación SUNAT", "boleta electrónica") los resuelve mejor
+el full-text de PostgreSQL (config 'spanish'); las paráfrasis, los embeddings.
+Cada fuente produce un ranking y se fusionan con reciprocal-rank fusion:
+    score(d) = Σ 1 / (k + rank_i(d))
+Rankings para detectar producto:
+- vectorial sobre las guia_producto (índice en memoria o ANN en pgvector)
+- léxico sobre las guia_producto (conocimiento_rag.busqueda)
+- léxico sobre productos (productos.busqueda)
+"""
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.database import AsyncSessionLocal
+from app.services.metrics import metrics
+from app.services.vector_index import knowledge_index
+from app.services.vector_search import build_ann_query, ann_params
+
+RRF_K = 60
+VECTOR_CANDIDATES = 5
+VECTOR_THRESHOLD = 0.5
+
+
+def reciprocal_rank_fusion(
+    rankings: Iterable[Sequence[str]], k: int = RRF_K
+) -> List[Tuple[str, float]]:
+    """Fusiona rankings (ids ordenados de mejor a peor) en uno solo"""
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+# Consulta OR de los lexemas del mensaje (plainto_tsquery hace AND) y, en la
+# misma sentencia, el mapa id -> slug de productos activos con ambos rankings
+LEXICAL_PRODUCTS = text("""
+    WITH consulta AS (
+        SELECT NULLIF(
+            replace(
+                plainto_tsquery(
+                    'spanish', translate(lower(:texto), 'áéíóúü', 'aeiouu')
+                )::text,
+                ' & ', ' | '
+            ),
+            ''
+        )::tsquery AS q
+    ),
+    guias AS (
+        SELECT producto_id, MIN(rank) AS rank
+        FROM (
+            SELECT c.metadata->>'producto_id' AS producto_id,
+                   row_number() OVER (ORDER BY ts_rank_cd(c.busqueda, consulta.q) DESC) AS rank
+            FROM conocimiento_rag c, consulta
+            WHERE c.tipo = 'guia_producto'
+              AND c.activo = TRUE
+              AND c.busqueda @@ consulta.q
+        ) AS r
+        GROUP BY producto_id
+    ),
+    prods AS (
+        SELECT p.id,
+               row_number() OVER (ORDER BY ts_rank_cd(p.busqueda, consulta.q) DESC) AS rank
+        FROM productos p, consulta
+        WHERE p.activo = TRUE AND p.busqueda @@ consulta.q
+    )
+    SELECT p.id::text, p.slug, g.rank AS rank_guia, pr.rank AS rank_producto
+    FROM productos p
+    LEFT JOIN guias g ON g.producto_id = p.id::text
+    LEFT JOIN prods pr ON pr.id = p.id
+    WHERE p.activo = TRUE
+""")
+
+PRODUCT_SLUGS = text("SELECT id::text, slug FROM productos WHERE activo = TRUE")
+
+
+class HybridProductSearch:
+    def __init__(self):
+        # Se activa si la migración 002 (columnas busqueda) está aplicada
+        self.lexical_available = False
+
+    async def check_lexical(self) -> bool:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(text("""
+                SELECT COUNT(*) FROM information_schema.columns
+                WHERE column_name = 'busqueda'
+                  AND table_name IN ('productos', 'conocimiento_rag')
+            """))
+            self.lexical_available = result.scalar() == 2
+        return self.lexical_available
+
+    async def _vector_ranking(
+        self, db: AsyncSession, query_embedding: List[float]
+    ) -> List[str]:
+        if knowledge_index.ready:
+            hits = knowledge_index.search(
+                query_embedding, k=VECTOR_CANDIDATES, threshold=VECTOR_THRESHOLD,
+                tipo="guia_producto",
+            )
+            ids = [e.metadata.get("producto_id") for e, _ in hits]
+        else:
+            result = await db.execute(
+                build_ann_query(
+                    "conocimiento_rag",
+                    ("metadata->>'producto_id' AS producto_id",),
+                    filters=("tipo = 'guia_producto'", "activo = TRUE"),
+                ),
+                ann_params(query_embedding, k=VECTOR_CANDIDATES, threshold=VECTOR_THRESHOLD),
+            )
+            ids = [row[0] for row in result.fetchall()]
+        return list(dict.fromkeys(i for i in ids if i))
+
+    async def rank_products(
+        self, db: AsyncSession, texto: str, query_embedding: Optional[List[float]]
+    ) -> List[Tuple[str, float]]:
+        """[(slug, score RRF)] de mejor a peor; vacío si ninguna fuente coincide"""
+        start = time.perf_counter()
+        rankings = []
+
+        if self.lexical_available:
+            result = await db.execute(LEXICAL_PRODUCTS, {"texto": texto})
+            filas = result.fetchall()
+            rankings.append([f[0] for f in sorted(filas, key=lambda f: f[2] or 0) if f[2]])
+            rankings.append([f[0] for f in sorted(filas, key=lambda f: f[3] or 0) if f[3]])
+        else:
+            result = await db.execute(PRODUCT_SLUGS)
+            filas = result.fetchall()
+        slugs = {f[0]: f[1] for f in filas}
+
+        if query_embedding is not None:
+            rankings.append(await self._vector_ranking(db, query_embedding))
+
+        fusion = [
+            (slugs[producto_id], score)
+            for producto_id, score in reciprocal_rank_fusion(rankings)
+            if producto_id in slugs
+        ]
+
+        metrics.observe("hybrid.rank_products_ms", (time.perf_counter() - start) * 1000)
+        metrics.inc("hybrid.product_hits" if fusion else "hybrid.product_misses")
+        return fusion
+
+    async def detect_product(
+        self, db: AsyncSession, texto: str, query_embedding: Optional[List[float]]
+    ) -> Optional[str]:
+        fusion = await self.rank_products(db, texto, query_embedding)
+        return fusion[0][0] if fusion else None
+
+
+hybrid_product_search = HybridProductSearch()
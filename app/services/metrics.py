@@ -0,0 +1,117 @@
+"""
+app/services/metrics.py - Métricas en memoria para /metrics
+Contadores, gauges e histogramas por buckets (memoria constante)
+"""
+import bisect
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence
+
+from sqlalchemy import event
+
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+# Para medir también el fast-path (plantillas, microsegundos)
+FINE_LATENCY_BUCKETS_MS = (0.01, 0.05, 0.1, 0.5) + LATENCY_BUCKETS_MS
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        acumulado = 0
+        for i, c in enumerate(self.counts):
+            acumulado += c
+            if acumulado >= target:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "max": round(self.max, 3),
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.counters: Dict[str, float] = defaultdict(int)
+        self.gauges: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    def inc(self, name: str, value: float = 1):
+        self.counters[name] += value
+
+    def set_gauge(self, name: str, value: float):
+        self.gauges[name] = value
+
+    def observe(self, name: str, value: float, buckets: Optional[Sequence[float]] = None):
+        hist = self.histograms.get(name)
+        if hist is None:
+            hist = self.histograms[name] = Histogram(buckets or LATENCY_BUCKETS_MS)
+        hist.observe(value)
+
+    @contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000)
+
+    def snapshot(self) -> dict:
+        return {
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "histograms": {k: h.snapshot() for k, h in self.histograms.items()},
+        }
+
+    def reset(self):
+        self.counters.clear()
+        self.gauges.clear()
+        self.histograms.clear()
+
+
+metrics = MetricsRegistry()
+
+
+# Conteo de round-trips a la BD por ámbito (nodo, turno...).
+# Los ámbitos se anidan: cada sentencia suma en todos los contadores activos.
+_db_counters: ContextVar[tuple] = ContextVar("db_counters", default=())
+
+
+def track_db_statements(engine):
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _count_statement(*args):
+        for counter in _db_counters.get():
+            counter[0] += 1
+
+
+@contextmanager
+def count_db_statements():
+    counter = [0]
+    token = _db_counters.set(_db_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _db_counters.reset(token)
@@ -0,0 +1,63 @@
+"""
+app/services/migrations.py - Migraciones SQL versionadas (app/migrations/*.sql)
+Se aplican en orden y se registran en schema_migrations. Cada sentencia va en
+AUTOCOMMIT para permitir CREATE INDEX CONCURRENTLY.
+
+Uso: python -m app.services.migrations
+"""
+import asyncio
+from pathlib import Path
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+
+
+def _sentencias(sql: str) -> List[str]:
+    lineas = [l for l in sql.splitlines() if not l.strip().startswith("--")]
+    return [s.strip() for s in "\n".join(lineas).split(";") if s.strip()]
+
+
+async def aplicar_migraciones(engine: AsyncEngine) -> List[str]:
+    aplicadas = []
+
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version TEXT PRIMARY KEY,
+                applied_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+        result = await conn.execute(text("SELECT version FROM schema_migrations"))
+        hechas = {row[0] for row in result.fetchall()}
+
+        for fichero in sorted(MIGRATIONS_DIR.glob("*.sql")):
+            if fichero.stem in hechas:
+                continue
+
+            print(f"🔄 Migración {fichero.name}")
+            for sentencia in _sentencias(fichero.read_text(encoding="utf-8")):
+                await conn.execute(text(sentencia))
+
+            await conn.execute(
+                text("INSERT INTO schema_migrations (version) VALUES (:version)"),
+                {"version": fichero.stem},
+            )
+            aplicadas.append(fichero.stem)
+
+    return aplicadas
+
+
+async def main():
+    from app.services.database import engine
+
+    aplicadas = await aplicar_migraciones(engine)
+    print(f"✅ {len(aplicadas)} migraciones aplicadas")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
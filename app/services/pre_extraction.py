@@ -0,0 +1,239 @@
+"""
+app/services/pre_extraction.py - Extracción determinista antes del LLM
+Niveles:
+  1) regex/keywords precompilados (qualification_tools + reglas propias)
+  2) extractor_llm SOLO si el mensaje tiene indicios de un dato faltante que
+     las reglas no resolvieron ("ok", "sí", "gracias" no llegan al LLM)
+Contadores en /metrics: extraction.llm_calls / extraction.llm_skipped y los
+campos resueltos por reglas (extraction.rule.<campo>).
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from app.services.metrics import metrics
+from app.tools.qualification_tools import (
+    EMAIL_RE,
+    NOMBRE_PATTERNS,
+    NOMBRES_INVALIDOS,
+    PHONE_PATTERNS,
+    PHONE_SEPARATORS_RE,
+    PRESUPUESTO_PATTERNS,
+    SECTORES_KEYWORDS,
+    URGENCIA_KEYWORDS,
+)
+
+# Solo el patrón con frase explícita ("soy", "me llamo") y el de línea de
+# contacto ("Valerio, 987..."): "Quiero un..." no debe pasar por nombre
+NOMBRE_REGLAS = NOMBRE_PATTERNS[:2]
+PALABRAS_NO_NOMBRE = set(NOMBRES_INVALIDOS) | {
+    "quiero", "necesito", "tengo", "busco", "estoy", "trabajo", "vendo",
+    "somos", "tenemos", "estamos",
+    "el", "la", "los", "las", "un", "una", "de", "del", "en", "mi", "su",
+    "si", "sí", "no", "ok", "gracias", "precio", "para", "con", "por",
+    "unos", "unas", "como", "solo", "son", "hasta", "más", "mas", "entre",
+    "dueño", "dueña", "gerente", "administrador", "encargado", "jefe",
+}
+
+# Orden: las frases más largas primero ("tienda online" antes que "tienda")
+SECTORES = {
+    **SECTORES_KEYWORDS,
+    "ecommerce": "ecommerce",
+    "e-commerce": "ecommerce",
+    "tienda online": "ecommerce",
+    "tienda virtual": "ecommerce",
+    "venta online": "ecommerce",
+    "minimarket": "retail",
+    "distribuidora": "retail",
+    "restaurant": "gastronomia",
+    "cevichería": "gastronomia",
+    "cafetería": "gastronomia",
+    "pollería": "gastronomia",
+    "clínica": "salud",
+    "consultorio": "salud",
+    "botica": "salud",
+    "consultora": "servicios",
+    "consultoría": "servicios",
+    "call center": "telecomunicaciones",
+    "telemarketing": "telecomunicaciones",
+}
+SECTOR_RE = re.compile(
+    r"\b(" + "|".join(re.escape(k) for k in sorted(SECTORES, key=len, reverse=True)) + r")\b"
+)
+URGENCIAS = {
+    **URGENCIA_KEYWORDS,
+    "para ayer": 1,
+    "ya mismo": 1,
+}
+URGENCIA_RE = re.compile(
+    r"\b(" + "|".join(re.escape(k) for k in sorted(URGENCIAS, key=len, reverse=True)) + r")\b"
+)
+URGENCIA_PLAZO_RE = re.compile(r"\b(\d{1,2}|una?)\s*(d[ií]as?|semanas?|mes(?:es)?)\b")
+DECISOR_NO_RE = re.compile(
+    r"\b(no (?:soy (?:quien|el que|la que) decide|decido)|tengo que consultar\w*"
+    r"|consultar(?:lo)? con|lo decide|decide mi|aprueba mi|mi jefe)\b"
+)
+DECISOR_SI_RE = re.compile(
+    r"\b(yo decido|decido yo|puedo decidir|tomo (?:las )?decisiones"
+    r"|soy (?:el|la) (?:dueñ[oa]|propietari[oa]|gerente general))\b"
+)
+ACUSE_RE = re.compile(
+    r"^(?:ok(?:ey)?|okay|vale|sí|si|no|claro|listo|perfecto|genial|bueno|gracias"
+    r"|muchas gracias|de acuerdo|entiendo|ya|aja|ajá|hola|buenas|buenos días"
+    r"|buenas tardes|buenas noches)[\s!.,¡¿?]*$"
+)
+
+# Indicios de que el mensaje trae un dato que las reglas no resolvieron
+INDICIOS = {
+    "nombre": re.compile(r"\b(soy|me llamo|mi nombre|llámame|habla)\b"),
+    "email": re.compile(r"@|\b(correo|email|e-mail|mail|gmail|hotmail|outlook)\b"),
+    "telefono": re.compile(r"\d{6,}|\b(celular|cel|tel[eé]fono|whatsapp|n[uú]mero)\b"),
+    "sector": re.compile(
+        r"\b(negocio|empresa|rubro|sector|vend\w*|dedic\w*|trabajo en|somos"
+        r"|local|cadena|distribu\w*|comercio|industria|f[aá]brica)\b"
+    ),
+    "urgencia_dias": re.compile(
+        r"\b(urgen\w*|semana|mes|d[ií]as?|hoy|mañana|ayer|ya mismo|inmediat\w*|cuanto antes|plazo|fecha)\b"
+    ),
+    "presupuesto_declarado": re.compile(
+        r"\b(presupuesto|soles|invertir|inversi[oó]n|pagar|gastar|mensual)\b|s/|\d{3,}"
+    ),
+    "es_decisor": re.compile(
+        r"\b(decid\w*|decisi[oó]n\w*|dueñ[oa]|jefe|gerente|socio|aprueb\w*|autoriz\w*)\b"
+    ),
+}
+RESPUESTA_CORTA_RE = re.compile(r"^[a-záéíóúñ]+(?:\s+[a-záéíóúñ]+){0,2}[\s!.]*$")
+
+
+@dataclass
+class PreExtraction:
+    data: Dict[str, Any] = field(default_factory=dict)
+    needs_llm: bool = False
+    motivo: Optional[str] = None
+
+
+def _nombre(message: str) -> Optional[str]:
+    for pattern in NOMBRE_REGLAS:
+        match = pattern.search(message)
+        if match:
+            nombre = match.group(1).strip()
+            palabras = nombre.lower().split()
+            if len(nombre) >= 3 and not PALABRAS_NO_NOMBRE.intersection(palabras):
+                return nombre.title()
+    return None
+
+
+def _telefono(message: str) -> Optional[str]:
+    for pattern in PHONE_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return PHONE_SEPARATORS_RE.sub("", match.group(0))
+    return None
+
+
+def _presupuesto(msg_lower: str) -> Optional[int]:
+    for pattern in PRESUPUESTO_PATTERNS:
+        match = pattern.search(msg_lower)
+        if match and 100 <= int(match.group(1)) <= 100000:
+            return int(match.group(1))
+    return None
+
+
+def _urgencia(msg_lower: str) -> Optional[int]:
+    match = URGENCIA_RE.search(msg_lower)
+    if match:
+        return URGENCIAS[match.group(1)]
+    match = URGENCIA_PLAZO_RE.search(msg_lower)
+    if match:
+        cantidad = 1 if match.group(1) in ("un", "una") else int(match.group(1))
+        unidad = match.group(2)
+        dias = cantidad * (30 if unidad.startswith("mes") else 7 if unidad.startswith("semana") else 1)
+        return min(max(dias, 1), 90)
+    return None
+
+
+def _es_decisor(msg_lower: str) -> Optional[bool]:
+    if DECISOR_NO_RE.search(msg_lower):
+        return False
+    if DECISOR_SI_RE.search(msg_lower):
+        return True
+    return None
+
+
+def pre_extract(
+    message: str, missing_fields: List[str], ultima_pregunta: str = ""
+) -> PreExtraction:
+    """
+    Resuelve con reglas los campos de `missing_fields` y decide si hace falta
+    el LLM para el resto. `ultima_pregunta` es el último mensaje del agente
+    (una respuesta de 1-3 palabras a "¿cómo te llamas?" va al LLM).
+    """
+    msg_lower = message.lower().strip()
+    resultado = PreExtraction()
+    if not msg_lower:
+        return resultado
+
+    reglas = {
+        "nombre": lambda: _nombre(message),
+        "email": lambda: (m.group(0).lower() if (m := EMAIL_RE.search(message)) else None),
+        "telefono": lambda: _telefono(message),
+        "sector": lambda: (SECTORES[m.group(1)] if (m := SECTOR_RE.search(msg_lower)) else None),
+        "urgencia_dias": lambda: _urgencia(msg_lower),
+        "presupuesto_declarado": lambda: _presupuesto(msg_lower),
+        "es_decisor": lambda: _es_decisor(msg_lower),
+    }
+    for campo in missing_fields:
+        regla = reglas.get(campo)
+        valor = regla() if regla else None
+        if valor is not None:
+            resultado.data[campo] = valor
+
+    if ACUSE_RE.match(msg_lower):
+        return resultado
+
+    # Los dígitos de un teléfono o correo no son indicio de presupuesto/plazo
+    residuo = EMAIL_RE.sub(" ", msg_lower)
+    for pattern in PHONE_PATTERNS:
+        residuo = pattern.sub(" ", residuo)
+
+    for campo in missing_fields:
+        if campo in resultado.data:
+            continue
+        indicio = INDICIOS.get(campo)
+        if indicio and indicio.search(residuo):
+            resultado.needs_llm, resultado.motivo = True, campo
+            break
+        if (
+            campo == "nombre"
+            and "nombre" in ultima_pregunta.lower()
+            and RESPUESTA_CORTA_RE.match(msg_lower)
+        ):
+            resultado.needs_llm, resultado.motivo = True, "nombre"
+            break
+
+    return resultado
+
+
+def record(pre: PreExtraction):
+    metrics.inc("extraction.llm_calls" if pre.needs_llm else "extraction.llm_skipped")
+    if pre.motivo:
+        metrics.inc(f"extraction.llm_motivo.{pre.motivo}")
+    for campo in pre.data:
+        metrics.inc(f"extraction.rule.{campo}")
+
+
+def stats() -> dict:
+    llm = metrics.counters.get("extraction.llm_calls", 0)
+    saltadas = metrics.counters.get("extraction.llm_skipped", 0)
+    total = llm + saltadas
+    return {
+        "turnos": total,
+        "llm_calls": llm,
+        "llm_skipped": saltadas,
+        "reduccion_llm": round(saltadas / total, 3) if total else 0.0,
+        "campos_por_reglas": {
+            nombre.rsplit(".", 1)[1]: valor
+            for nombre, valor in metrics.counters.items()
+            if nombre.startswith("extraction.rule.")
+        },
+    }
@@ -6,57 +6,56 @@ Sin schedulers, sin colas en memoria, sin triggers pesados
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from app.services.embeddings import embedding_service
+from app.services.vector_index import knowledge_index
 import json
 import traceback
-from typing import Optional
+from typing import Optional, List, Tuple
 
 
-async def generar_embedding_producto(db: AsyncSession, producto_id: str) -> bool:
-    """
-    Genera embedding inmediatamente después de crear/actualizar producto
-    Ejecuta en la misma transacción del endpoint
-    """
-    try:
-        result = await db.execute(
-            text("""
-                SELECT 
-                    p.id,
-                    p.nombre,
-                    p.descripcion_corta,
-                    p.precio_base,
-                    p.sectores,
-                    p.features,
-                    COALESCE(
-                        json_agg(
-                            json_build_object(
-                                'nombre', pk.nombre,
-                                'precio_mensual', pk.precio_mensual,
-                                'ideal_para', pk.ideal_para
-                            ) ORDER BY pk.precio_mensual
-                        ) FILTER (WHERE pk.id IS NOT NULL),
-                        '[]'::json
-                    ) as paquetes
-                FROM productos p
-                LEFT JOIN paquetes pk ON pk.producto_id = p.id AND pk.activo = TRUE
-                WHERE p.id = :producto_id AND p.activo = TRUE
-                GROUP BY p.id
-            """),
-            {"producto_id": producto_id}
-        )
-        
-        row = result.fetchone()
-        if not row:
-            return False
-        
-        producto_id_db = str(row[0])
-        nombre = row[1]
-        desc = row[2]
-        precio = float(row[3])
-        sectores = row[4] or []
-        features = row[5] or []
-        paquetes = row[6] or []
-        
-        texto_completo = f"""PRODUCTO: {nombre}
+async def _cargar_texto_producto(
+    db: AsyncSession, producto_id: str
+) -> Optional[Tuple[str, str, str]]:
+    """Devuelve (producto_id, nombre, texto a embeber) o None si no está activo"""
+    result = await db.execute(
+        text("""
+            SELECT
+                p.id,
+                p.nombre,
+                p.descripcion_corta,
+                p.precio_base,
+                p.sectores,
+                p.features,
+                COALESCE(
+                    json_agg(
+                        json_build_object(
+                            'nombre', pk.nombre,
+                            'precio_mensual', pk.precio_mensual,
+                            'ideal_para', pk.ideal_para
+                        ) ORDER BY pk.precio_mensual
+                    ) FILTER (WHERE pk.id IS NOT NULL),
+                    '[]'::json
+                ) as paquetes
+            FROM productos p
+            LEFT JOIN paquetes pk ON pk.producto_id = p.id AND pk.activo = TRUE
+            WHERE p.id = :producto_id AND p.activo = TRUE
+            GROUP BY p.id
+        """),
+        {"producto_id": producto_id}
+    )
+
+    row = result.fetchone()
+    if not row:
+        return None
+
+    producto_id_db = str(row[0])
+    nombre = row[1]
+    desc = row[2]
+    precio = float(row[3])
+    sectores = row[4] or []
+    features = row[5] or []
+    paquetes = row[6] or []
+
+    texto_completo = f"""PRODUCTO: {nombre}
 
 DESCRIPCIÓN: {desc}
 
@@ -69,68 +68,138 @@ CARACTERÍSTICAS:
 
 PAQUETES DISPONIBLES:
 """
-        
-        if paquetes:
-            for paq in paquetes:
-                texto_completo += f"\n- {paq['nombre']}: S/{paq['precio_mensual']}/mes"
-                if paq.get('ideal_para'):
-                    texto_completo += f" (Ideal: {', '.join(paq['ideal_para'])})"
-        
-        embedding = embedding_service.encode_single(texto_completo)
-        
-        await db.execute(
-            text("""
-                DELETE FROM conocimiento_rag 
-                WHERE tipo = 'guia_producto' 
-                AND metadata->>'producto_id' = :producto_id
-            """),
-            {"producto_id": producto_id_db}
-        )
-        
-        metadata_dict = {
-            "origen": "sistema",
-            "categoria": "producto",
-            "producto_id": producto_id_db
+
+    if paquetes:
+        for paq in paquetes:
+            texto_completo += f"\n- {paq['nombre']}: S/{paq['precio_mensual']}/mes"
+            if paq.get('ideal_para'):
+                texto_completo += f" (Ideal: {', '.join(paq['ideal_para'])})"
+
+    return producto_id_db, nombre, texto_completo
+
+
+async def _guardar_embedding_producto(
+    db: AsyncSession,
+    producto_id_db: str,
+    nombre: str,
+    texto_completo: str,
+    embedding: List[float],
+):
+    # Un vector nulo (texto vacío, fallo silenciado) no reemplaza al bueno
+    if not any(embedding):
+        raise ValueError(f"Embedding vacío para {nombre}")
+
+    await db.execute(
+        text("""
+            DELETE FROM conocimiento_rag
+            WHERE tipo = 'guia_producto'
+            AND metadata->>'producto_id' = :producto_id
+        """),
+        {"producto_id": producto_id_db}
+    )
+
+    metadata_dict = {
+        "origen": "sistema",
+        "categoria": "producto",
+        "producto_id": producto_id_db
+    }
+
+    await db.execute(
+        text("""
+            INSERT INTO conocimiento_rag
+            (tipo, titulo, contenido, embedding, activo, metadata)
+            VALUES
+            (:tipo, :titulo, :contenido, CAST(:embedding AS vector), :activo, :metadata)
+        """),
+        {
+            "tipo": "guia_producto",
+            "titulo": f"Producto: {nombre}",
+            "contenido": texto_completo,
+            "embedding": str(embedding),
+            "activo": True,
+            "metadata": json.dumps(metadata_dict)
         }
-        
-        await db.execute(
-            text("""
-                INSERT INTO conocimiento_rag 
-                (tipo, titulo, contenido, embedding, activo, metadata)
-                VALUES 
-                (:tipo, :titulo, :contenido, CAST(:embedding AS vector), :activo, :metadata)
-            """),
-            {
-                "tipo": "guia_producto",
-                "titulo": f"Producto: {nombre}",
-                "contenido": texto_completo,
-                "embedding": str(embedding),
-                "activo": True,
-                "metadata": json.dumps(metadata_dict)
-            }
+    )
+
+    knowledge_index.refresh_after_commit(db)
+    print(f"✅ Embedding generado: {nombre}", flush=True)
+
+
+async def generar_embedding_producto(db: AsyncSession, producto_id: str) -> bool:
+    """
+    Genera embedding inmediatamente después de crear/actualizar producto
+    Ejecuta en la misma transacción del endpoint
+    """
+    try:
+        cargado = await _cargar_texto_producto(db, producto_id)
+        if not cargado:
+            return False
+
+        producto_id_db, nombre, texto_completo = cargado
+        # Estricto: si OpenAI falla, el endpoint hace rollback y se conserva
+        # el embedding anterior (embed_text devolvería un vector de ceros)
+        embedding = await embedding_service.embed_text_strict(texto_completo)
+        await _guardar_embedding_producto(
+            db, producto_id_db, nombre, texto_completo, embedding
         )
-        
-        print(f"✅ Embedding generado: {nombre}", flush=True)
         return True
-        
+
     except Exception as e:
         error_detail = traceback.format_exc()
         print(f"❌ Error generando embedding: {e}\n{error_detail}", flush=True)
         raise
 
 
+async def generar_embeddings_productos(
+    db: AsyncSession, producto_ids: List[str]
+) -> Tuple[int, List[str]]:
+    """
+    Reindexado masivo: lee todos los productos, pide los embeddings en lotes
+    (dispatcher compartido) y luego escribe. Devuelve (sincronizados, errores)
+    """
+    cargados = []
+    errores = []
+
+    for producto_id in producto_ids:
+        try:
+            cargado = await _cargar_texto_producto(db, producto_id)
+            if cargado:
+                cargados.append(cargado)
+        except Exception as e:
+            errores.append(f"Producto {producto_id}: {str(e)}")
+
+    embeddings = await embedding_service.embed_batch(
+        [texto for _, _, texto in cargados], strict=True, return_exceptions=True
+    )
+
+    sincronizados = 0
+    for (producto_id_db, nombre, texto), embedding in zip(cargados, embeddings):
+        if isinstance(embedding, BaseException):
+            # Se salta: su fila en conocimiento_rag sigue con el vector anterior
+            errores.append(f"Producto {producto_id_db}: embedding falló ({embedding})")
+            continue
+        try:
+            await _guardar_embedding_producto(db, producto_id_db, nombre, texto, embedding)
+            sincronizados += 1
+        except Exception as e:
+            errores.append(f"Producto {producto_id_db}: {str(e)}")
+
+    return sincronizados, errores
+
+
 async def eliminar_embedding_producto(db: AsyncSession, producto_id: str) -> bool:
     """Elimina embedding cuando se borra un producto"""
     try:
         await db.execute(
             text("""
-                DELETE FROM conocimiento_rag 
-                WHERE tipo = 'guia_producto' 
+                DELETE FROM conocimiento_rag
+                WHERE tipo = 'guia_producto'
                 AND metadata->>'producto_id' = :producto_id
             """),
             {"producto_id": producto_id}
         )
+        knowledge_index.refresh_after_commit(db)
         return True
     except Exception as e:
         print(f"❌ Error eliminando embedding: {e}", flush=True)
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,249 @@
+"""
+app/services/rag_retrieval.py - Recuperación RAG en un solo round-trip
+Mensajes previos, conocimiento, patrones y productos salen de UNA sentencia
+(CTEs agregadas a JSON) en lugar de cuatro consultas secuenciales.
+El conocimiento se sirve del índice en memoria cuando está cargado y se
+re-rankea con MMR (RAG_MMR_CANDIDATES candidatos -> RAG_TOP_K) para no
+devolver chunks casi duplicados de la misma guía. Los hits de conocimiento
+se reutilizan entre consultas casi idénticas (semantic_cache).
+"""
+import json
+from dataclasses import dataclass, field
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.elements import TextClause
+
+from app.config import settings
+from app.services.metrics import metrics
+from app.services.semantic_cache import semantic_cache
+from app.services.vector_index import knowledge_index, mmr, normalize_rows
+from app.services.vector_search import build_ann_query, ann_params
+
+PATTERNS_K = 2
+PATTERNS_THRESHOLD = 0.75
+
+
+@dataclass
+class RAGMessage:
+    rol: str
+    contenido: str
+
+
+@dataclass
+class RAGKnowledge:
+    tipo: str
+    titulo: str
+    contenido: str
+    similitud: float
+
+
+@dataclass
+class RAGPattern:
+    tipo_patron: str
+    respuesta_agente: str
+    tasa_exito: Decimal
+    similitud: float
+
+
+@dataclass
+class RAGProduct:
+    nombre: str
+    descripcion: str
+    precio: Decimal
+    paquetes: List[Dict[str, Any]] = field(default_factory=list)
+
+
+@dataclass
+class RAGContext:
+    mensajes: List[RAGMessage] = field(default_factory=list)
+    conocimiento: List[RAGKnowledge] = field(default_factory=list)
+    patrones: List[RAGPattern] = field(default_factory=list)
+    productos: List[RAGProduct] = field(default_factory=list)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.mensajes or self.conocimiento or self.patrones or self.productos)
+
+    def to_prompt(self) -> str:
+        parts = []
+
+        if self.mensajes:
+            parts.append("CONTEXTO PREVIO:")
+            for m in self.mensajes:
+                parts.append(f"[{m.rol}] {m.contenido[:100]}")
+
+        if self.conocimiento:
+            parts.append("\nCONOCIMIENTO:")
+            for k in self.conocimiento:
+                parts.append(f"[{k.tipo}] {k.titulo}: {k.contenido[:200]}")
+
+        if self.patrones:
+            parts.append("\nPATRONES EXITOSOS:")
+            for p in self.patrones:
+                parts.append(f"[{p.tipo_patron}] {p.tasa_exito}% éxito: {p.respuesta_agente[:150]}")
+
+        if self.productos:
+            parts.append("\nPRODUCTOS RECOMENDADOS:")
+            for p in self.productos:
+                parts.append(f"- {p.nombre} (S/ {p.precio}): {p.descripcion}")
+                for paq in p.paquetes[:2]:
+                    parts.append(f"  · {paq['nombre']}: S/ {paq['precio']}/mes")
+
+        return "\n".join(parts)
+
+
+@lru_cache(maxsize=2)
+def _retrieval_query(include_knowledge: bool) -> TextClause:
+    conocimiento = build_ann_query(
+        "conocimiento_rag",
+        ("tipo", "titulo", "contenido", "embedding"),
+        filters=("activo = TRUE",),
+        prefix="c_",
+    ).text
+    patrones = build_ann_query(
+        "patrones_aprendidos",
+        ("tipo_patron", "respuesta_agente", "tasa_exito"),
+        vector_column="embedding_contexto",
+        filters=("aprobado_para_uso = TRUE", "tasa_exito >= 70"),
+        order_by="tasa_exito DESC",
+        prefix="p_",
+    ).text
+
+    conocimiento_cte = f"conocimiento AS ({conocimiento})," if include_knowledge else ""
+    conocimiento_col = (
+        "(SELECT COALESCE(json_agg(c ORDER BY c.sim DESC), '[]'::json) FROM conocimiento c)"
+        if include_knowledge
+        else "'[]'::json"
+    )
+
+    # Sin sector: paquetes destacados de cualquier producto (como antes)
+    return text(f"""
+        WITH mensajes_previos AS (
+            SELECT contenido, rol, created_at
+            FROM mensajes
+            WHERE conversacion_id = :conv_id
+              AND embedding IS NOT NULL
+            ORDER BY created_at DESC
+            LIMIT 3
+        ),
+        {conocimiento_cte}
+        patrones AS ({patrones}),
+        productos AS (
+            SELECT p.nombre, p.descripcion_corta, p.precio_base,
+                   json_agg(
+                       json_build_object(
+                           'nombre', pk.nombre,
+                           'precio', pk.precio_mensual
+                       )
+                   ) FILTER (WHERE pk.id IS NOT NULL) AS paquetes
+            FROM productos p
+            LEFT JOIN paquetes pk ON pk.producto_id = p.id
+                AND (CASE WHEN CAST(:sector AS text) IS NULL
+                          THEN pk.destacado ELSE pk.activo END) = TRUE
+            WHERE p.activo = TRUE
+              AND (CAST(:sector AS text) IS NULL OR CAST(:sector AS text) = ANY(p.sectores))
+            GROUP BY p.id
+            LIMIT 2
+        )
+        SELECT
+            (SELECT COALESCE(json_agg(m ORDER BY m.created_at DESC), '[]'::json)
+             FROM mensajes_previos m) AS mensajes,
+            {conocimiento_col} AS conocimiento,
+            (SELECT COALESCE(json_agg(pa ORDER BY pa.tasa_exito DESC), '[]'::json)
+             FROM patrones pa) AS patrones,
+            (SELECT COALESCE(json_agg(pr), '[]'::json) FROM productos pr) AS productos
+    """)
+
+
+def _json(value) -> list:
+    if value is None:
+        return []
+    # Decimal: los precios se muestran igual que con la columna NUMERIC original
+    return json.loads(value, parse_float=Decimal) if isinstance(value, str) else value
+
+
+def _rerank(query_embedding: List[float], candidatos: List[dict], k: int) -> List[dict]:
+    """MMR sobre los candidatos de la sentencia (embedding en texto '[...]')"""
+    if len(candidatos) <= k:
+        return candidatos
+    matrix = normalize_rows(np.array(
+        [json.loads(c["embedding"]) for c in candidatos], dtype=np.float32
+    ))
+    query = normalize_rows(np.asarray([query_embedding], dtype=np.float32))[0]
+    return [candidatos[i] for i in mmr(query, matrix, k, settings.RAG_MMR_LAMBDA)]
+
+
+class RAGRetriever:
+    async def retrieve(
+        self,
+        db: AsyncSession,
+        query_embedding: List[float],
+        conversacion_id: str,
+        sector: Optional[str] = None,
+    ) -> RAGContext:
+        with metrics.timer("rag.retrieve_ms"):
+            cached = semantic_cache.get("conocimiento", query_embedding)
+            use_index = knowledge_index.ready
+            top_k = settings.RAG_TOP_K
+            candidatos = max(top_k, settings.RAG_MMR_CANDIDATES)
+            params = {
+                **ann_params(
+                    query_embedding, k=candidatos,
+                    threshold=settings.RAG_SIMILARITY_THRESHOLD, prefix="c_",
+                ),
+                **ann_params(
+                    query_embedding, k=PATTERNS_K, threshold=PATTERNS_THRESHOLD,
+                    candidates=settings.PGVECTOR_ANN_CANDIDATES, prefix="p_",
+                ),
+                "conv_id": conversacion_id,
+                "sector": sector or None,
+            }
+            result = await db.execute(
+                _retrieval_query(cached is None and not use_index), params
+            )
+            row = result.fetchone()
+
+            if cached is not None:
+                conocimiento = cached
+            elif use_index:
+                conocimiento = [
+                    RAGKnowledge(e.tipo, e.titulo, e.contenido, sim)
+                    for e, sim in knowledge_index.search_mmr(
+                        query_embedding, k=top_k,
+                        threshold=settings.RAG_SIMILARITY_THRESHOLD,
+                        candidates=candidatos, lambda_=settings.RAG_MMR_LAMBDA,
+                    )
+                ]
+            else:
+                conocimiento = [
+                    RAGKnowledge(c["tipo"], c["titulo"], c["contenido"], float(c["sim"]))
+                    for c in _rerank(query_embedding, _json(row[1]), top_k)
+                ]
+            if cached is None:
+                semantic_cache.set("conocimiento", query_embedding, conocimiento)
+
+            return RAGContext(
+                mensajes=[RAGMessage(m["rol"], m["contenido"]) for m in _json(row[0])],
+                conocimiento=conocimiento,
+                patrones=[
+                    RAGPattern(
+                        p["tipo_patron"], p["respuesta_agente"], p["tasa_exito"], float(p["sim"])
+                    )
+                    for p in _json(row[2])
+                ],
+                productos=[
+                    RAGProduct(
+                        p["nombre"], p["descripcion_corta"], p["precio_base"],
+                        p["paquetes"] or [],
+                    )
+                    for p in _json(row[3])
+                ],
+            )
+
+
+rag_retriever = RAGRetriever()
@@ -0,0 +1,197 @@
+"""
+app/services/semantic_cache.py - Cache semántica de resultados RAG
+Muchos visitantes abren con casi la misma pregunta ("quiero un dashboard",
+"precio del CRM"). La clave es un LSH del embedding (signos de proyecciones
+aleatorias): consultas casi idénticas caen en el mismo bucket y reutilizan el
+slug de producto y los hits de conocimiento sin ir a PostgreSQL.
+- Multi-probe: también se miran los buckets con los bits menos seguros
+  invertidos (proyección cercana a 0)
+- Dentro del bucket se verifica coseno >= min_similarity (sin falsos positivos)
+- TTL y versión de catálogo (knowledge_index.version): una recarga del índice
+  invalida todas las entradas
+- Clave léxica opcional (lexical_key): "plan 2" y "plan 3" tienen embeddings
+  casi iguales; con cifras o códigos distintos no se comparte entrada
+"""
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.services.metrics import metrics
+from app.services.vector_index import knowledge_index
+
+# Tokens con algún dígito: cifras, planes y SKUs ("crm-500", "x2", "1200")
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+MILES_RE = re.compile(r"(?<=\d)[.,](?=\d{3}\b)")
+
+
+def lexical_key(text: str) -> str:
+    """Cifras y códigos del texto, normalizados ("1,200" = "1200") y sin orden"""
+    texto = MILES_RE.sub("", text.lower())
+    return " ".join(sorted({t for t in TOKEN_RE.findall(texto) if any(c.isdigit() for c in t)}))
+
+
+@dataclass
+class _Entry:
+    bucket: Tuple[str, bytes]
+    vector: np.ndarray
+    value: Any
+    expires_at: float
+    version: int
+    lexical: str = ""
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        dimensions: int,
+        bits: int = 8,
+        probes: int = 8,
+        min_similarity: float = 0.95,
+        ttl_s: float = 600,
+        max_entries: int = 2000,
+        catalog_version: Callable[[], int] = lambda: 0,
+        seed: int = 0,
+    ):
+        rng = np.random.default_rng(seed)
+        self.planes = rng.standard_normal((bits, dimensions)).astype(np.float32)
+        self.probes = min(probes, bits)
+        self.min_similarity = min_similarity
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.catalog_version = catalog_version
+        self.entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self.buckets: Dict[Tuple[str, bytes], List[int]] = {}
+        self.namespaces = set()
+        self._next_id = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_s > 0 and self.max_entries > 0
+
+    def _codes(self, vector: np.ndarray) -> List[bytes]:
+        """Bucket exacto + buckets con los `probes` bits de menor margen invertidos"""
+        proyecciones = self.planes @ vector
+        bits = proyecciones > 0
+        codes = [np.packbits(bits).tobytes()]
+        for i in np.argsort(np.abs(proyecciones))[: self.probes]:
+            vecino = bits.copy()
+            vecino[i] = not vecino[i]
+            codes.append(np.packbits(vecino).tobytes())
+        return codes
+
+    @staticmethod
+    def _normalize(embedding) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _find(
+        self, namespace: str, vector: np.ndarray, codes: List[bytes], lexical: str = ""
+    ) -> Optional[int]:
+        ahora, version = time.time(), self.catalog_version()
+        mejor, mejor_sim = None, self.min_similarity
+        for code in codes:
+            for entry_id in list(self.buckets.get((namespace, code), ())):
+                entry = self.entries[entry_id]
+                if entry.expires_at < ahora or entry.version != version:
+                    metrics.inc(
+                        "semantic_cache.expired" if entry.expires_at < ahora
+                        else "semantic_cache.invalidated"
+                    )
+                    self._remove(entry_id)
+                    continue
+                if entry.lexical != lexical:
+                    continue
+                sim = float(entry.vector @ vector)
+                if sim >= mejor_sim:
+                    mejor, mejor_sim = entry_id, sim
+        return mejor
+
+    def get(self, namespace: str, embedding, lexical: str = "") -> Optional[Any]:
+        """Valor guardado para una consulta casi idéntica (y misma clave léxica), o None"""
+        if not self.enabled:
+            return None
+        self.namespaces.add(namespace)
+        vector = self._normalize(embedding)
+        entry_id = None
+        if vector is not None:
+            entry_id = self._find(namespace, vector, self._codes(vector), lexical)
+
+        if entry_id is None:
+            metrics.inc("semantic_cache.misses")
+            metrics.inc(f"semantic_cache.{namespace}.misses")
+            return None
+
+        self.entries.move_to_end(entry_id)
+        metrics.inc("semantic_cache.hits")
+        metrics.inc(f"semantic_cache.{namespace}.hits")
+        return self.entries[entry_id].value
+
+    def set(self, namespace: str, embedding, value: Any, lexical: str = ""):
+        if not self.enabled or value is None:
+            return
+        vector = self._normalize(embedding)
+        if vector is None:
+            return
+
+        codes = self._codes(vector)
+        existente = self._find(namespace, vector, codes, lexical)
+        if existente is not None:
+            self._remove(existente)
+
+        bucket = (namespace, codes[0])
+        entry_id = self._next_id
+        self._next_id += 1
+        self.entries[entry_id] = _Entry(
+            bucket, vector, value, time.time() + self.ttl_s, self.catalog_version(), lexical
+        )
+        self.buckets.setdefault(bucket, []).append(entry_id)
+
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+            metrics.inc("semantic_cache.evictions")
+        metrics.set_gauge("semantic_cache.entries", len(self.entries))
+
+    def _remove(self, entry_id: int):
+        entry = self.entries.pop(entry_id)
+        bucket = self.buckets[entry.bucket]
+        bucket.remove(entry_id)
+        if not bucket:
+            del self.buckets[entry.bucket]
+
+    def clear(self):
+        self.entries.clear()
+        self.buckets.clear()
+
+    def stats(self) -> dict:
+        def hit_rate(prefix: str) -> float:
+            hits = metrics.counters.get(f"{prefix}.hits", 0)
+            total = hits + metrics.counters.get(f"{prefix}.misses", 0)
+            return round(hits / total, 3) if total else 0.0
+
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.entries),
+            "buckets": len(self.buckets),
+            "catalog_version": self.catalog_version(),
+            "hit_rate": hit_rate("semantic_cache"),
+            "hit_rate_por_tipo": {
+                ns: hit_rate(f"semantic_cache.{ns}") for ns in sorted(self.namespaces)
+            },
+        }
+
+
+semantic_cache = SemanticCache(
+    settings.EMBEDDING_DIMENSIONS,
+    bits=settings.RAG_CACHE_LSH_BITS,
+    probes=settings.RAG_CACHE_PROBES,
+    min_similarity=settings.RAG_CACHE_MIN_SIMILARITY,
+    ttl_s=settings.RAG_CACHE_TTL_S,
+    max_entries=settings.RAG_CACHE_MAX_ENTRIES,
+    catalog_version=lambda: knowledge_index.version,
+)
@@ -0,0 +1,80 @@
+"""
+app/services/unit_of_work.py - Unidad de trabajo por turno de chat
+Los nodos del agente registran altas y updates; todo se aplica en UNA
+transacción al final del turno (un solo UPDATE por fila afectada)
+"""
+import time
+from typing import Any, Callable, Dict, List
+from uuid import UUID
+
+from sqlalchemy import update as sql_update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Lead, Conversacion
+from app.services.metrics import metrics, count_db_statements, COUNT_BUCKETS
+
+
+class TurnUnitOfWork:
+    def __init__(self):
+        self.new_objects: List[Any] = []
+        self.lead_updates: Dict[str, Dict[str, Any]] = {}
+        self.conversation_updates: Dict[str, Dict[str, Any]] = {}
+        self.after_commit_hooks: List[Callable[[], None]] = []
+
+    def add(self, obj: Any):
+        self.new_objects.append(obj)
+
+    def after_commit(self, hook: Callable[[], None]):
+        """Callback síncrono que se ejecuta solo si la transacción confirma"""
+        self.after_commit_hooks.append(hook)
+
+    def update_lead(self, lead_id: str, **values):
+        self.lead_updates.setdefault(str(lead_id), {}).update(values)
+
+    def update_conversation(self, conversacion_id: str, **values):
+        self.conversation_updates.setdefault(str(conversacion_id), {}).update(values)
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.new_objects or self.lead_updates or self.conversation_updates)
+
+    async def commit(self, db: AsyncSession) -> None:
+        if not self.has_changes:
+            return
+
+        start = time.perf_counter()
+        try:
+            with count_db_statements() as statements:
+                if self.new_objects:
+                    db.add_all(self.new_objects)
+                    await db.flush()
+
+                for lead_id, values in self.lead_updates.items():
+                    await db.execute(
+                        sql_update(Lead).where(Lead.id == UUID(lead_id)).values(**values)
+                    )
+
+                for conversacion_id, values in self.conversation_updates.items():
+                    await db.execute(
+                        sql_update(Conversacion)
+                        .where(Conversacion.id == UUID(conversacion_id))
+                        .values(**values)
+                    )
+
+                await db.commit()
+        except Exception:
+            await db.rollback()
+            metrics.inc("uow.rollbacks")
+            raise
+        finally:
+            self.new_objects.clear()
+            self.lead_updates.clear()
+            self.conversation_updates.clear()
+            hooks, self.after_commit_hooks = self.after_commit_hooks, []
+
+        for hook in hooks:
+            hook()
+
+        metrics.inc("uow.commits")
+        metrics.observe("uow.write_tx_ms", (time.perf_counter() - start) * 1000)
+        metrics.observe("uow.db_roundtrips", statements[0], buckets=COUNT_BUCKETS)
@@ -0,0 +1,260 @@
+"""
+app/services/vector_index.py - Índice vectorial en memoria de conocimiento_rag
+La tabla tiene decenas/cientos de filas que cambian poco: se carga entera al
+arrancar como matriz float32 normalizada y cada búsqueda es un producto
+matriz-vector + top-k, sin round-trip a la BD.
+- HNSW opcional (hnswlib) a partir de RAG_INDEX_HNSW_MIN_ROWS filas
+- Re-ranking MMR opcional para no devolver chunks casi duplicados
+- Se recarga tras el COMMIT de la sesión que modificó conocimiento_rag
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import ConocimientoRAG
+from app.services.database import AsyncSessionLocal
+from app.services.metrics import metrics
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+
+@dataclass
+class KnowledgeEntry:
+    id: str
+    tipo: str
+    titulo: str
+    contenido: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Normaliza filas a norma 1; las filas a cero (embeddings fallidos) quedan a cero"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Índices de los k mayores scores, ordenados de mayor a menor"""
+    if k >= len(scores):
+        return np.argsort(-scores)
+    candidatos = np.argpartition(-scores, k)[:k]
+    return candidatos[np.argsort(-scores[candidatos])]
+
+
+def mmr(
+    query: np.ndarray, candidates: np.ndarray, k: int, lambda_: float = 0.7
+) -> List[int]:
+    """
+    Maximal Marginal Relevance sobre vectores normalizados. Las similitudes
+    candidato-candidato salen de UN producto matricial; el bucle greedy solo
+    recorre k pasos vectorizados.
+    Devuelve índices de `candidates` en orden de selección.
+    """
+    n = len(candidates)
+    if n == 0 or k <= 0:
+        return []
+
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    max_sim = similarity[selected[0]].copy()
+    disponible = np.ones(n, dtype=bool)
+    disponible[selected[0]] = False
+
+    for _ in range(min(k, n) - 1):
+        scores = lambda_ * relevance - (1 - lambda_) * max_sim
+        scores[~disponible] = -np.inf
+        j = int(np.argmax(scores))
+        selected.append(j)
+        disponible[j] = False
+        np.maximum(max_sim, similarity[j], out=max_sim)
+
+    return selected
+
+
+class KnowledgeVectorIndex:
+    def __init__(self, dimensions: int, hnsw_min_rows: int = 2000):
+        self.dimensions = dimensions
+        self.hnsw_min_rows = hnsw_min_rows
+        self.entries: List[KnowledgeEntry] = []
+        self.matrix = np.zeros((0, dimensions), dtype=np.float32)
+        self.tipos = np.array([], dtype=object)
+        self.hnsw = None
+        self.ready = False
+        self.loaded_at: Optional[float] = None
+        # Versión del catálogo: sube en cada recarga (invalida caches derivadas)
+        self.version = 0
+        self._lock = asyncio.Lock()
+        self._tasks = set()
+
+    def build(self, entries: List[KnowledgeEntry], vectors: np.ndarray):
+        matrix = normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimensions))
+
+        hnsw = None
+        if hnswlib is not None and len(entries) >= self.hnsw_min_rows:
+            hnsw = hnswlib.Index(space="ip", dim=self.dimensions)
+            hnsw.init_index(max_elements=len(entries), ef_construction=200, M=16)
+            hnsw.add_items(matrix, np.arange(len(entries)))
+            hnsw.set_ef(64)
+
+        # Swap atómico: las búsquedas en curso siguen con la versión anterior
+        self.entries, self.matrix, self.hnsw = entries, matrix, hnsw
+        self.tipos = np.array([e.tipo for e in entries], dtype=object)
+        self.ready = True
+        self.loaded_at = time.time()
+        self.version += 1
+        metrics.set_gauge("rag_index.rows", len(entries))
+
+    async def load(self):
+        async with self._lock:
+            with metrics.timer("rag_index.load_ms"):
+                async with AsyncSessionLocal() as db:
+                    result = await db.execute(
+                        select(ConocimientoRAG).where(ConocimientoRAG.activo == True)
+                    )
+                    filas = result.scalars().all()
+
+                entries = [
+                    KnowledgeEntry(
+                        id=str(fila.id),
+                        tipo=fila.tipo,
+                        titulo=fila.titulo,
+                        contenido=fila.contenido,
+                        metadata=fila.metadatos or {},
+                    )
+                    for fila in filas
+                ]
+                vectors = (
+                    np.stack([np.asarray(fila.embedding, dtype=np.float32) for fila in filas])
+                    if filas
+                    else np.zeros((0, self.dimensions), dtype=np.float32)
+                )
+                self.build(entries, vectors)
+            metrics.inc("rag_index.loads")
+
+    def search(
+        self,
+        query_embedding: List[float],
+        k: int,
+        threshold: float,
+        tipo: Optional[str] = None,
+    ) -> List[Tuple[KnowledgeEntry, float]]:
+        """Mismo contrato que `1 - (embedding <=> q) >= threshold ORDER BY ... LIMIT k`"""
+        start = time.perf_counter()
+        entries = self.entries
+        resultados = [
+            (entries[i], sim)
+            for i, sim in self._candidates(query_embedding, k, threshold, tipo)[1]
+        ]
+        metrics.observe("rag_index.search_ms", (time.perf_counter() - start) * 1000)
+        return resultados
+
+    def search_mmr(
+        self,
+        query_embedding: List[float],
+        k: int,
+        threshold: float,
+        candidates: int,
+        lambda_: float = 0.7,
+        tipo: Optional[str] = None,
+    ) -> List[Tuple[KnowledgeEntry, float]]:
+        """Sobre-recupera `candidates` filas sobre el umbral y elige k con MMR"""
+        start = time.perf_counter()
+        entries, matrix = self.entries, self.matrix
+        query, hits = self._candidates(query_embedding, max(k, candidates), threshold, tipo)
+        if not hits:
+            return []
+
+        indices = [i for i, _ in hits]
+        orden = mmr(query, matrix[indices], k, lambda_)
+        resultados = [(entries[indices[j]], hits[j][1]) for j in orden]
+        metrics.observe("rag_index.search_mmr_ms", (time.perf_counter() - start) * 1000)
+        return resultados
+
+    def _candidates(
+        self,
+        query_embedding: List[float],
+        k: int,
+        threshold: float,
+        tipo: Optional[str],
+    ) -> Tuple[Optional[np.ndarray], List[Tuple[int, float]]]:
+        entries, matrix, tipos, hnsw = self.entries, self.matrix, self.tipos, self.hnsw
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if not len(entries) or norm == 0:
+            return None, []
+        query = query / norm
+
+        if hnsw is not None:
+            # Se piden más candidatos para poder filtrar por tipo
+            labels, distances = hnsw.knn_query(query, k=min(len(entries), k * 4 if tipo else k))
+            candidatos = [(int(i), 1.0 - float(d)) for i, d in zip(labels[0], distances[0])]
+        else:
+            scores = matrix @ query
+            if tipo is not None:
+                scores = np.where(tipos == tipo, scores, -np.inf)
+            candidatos = [(int(i), float(scores[i])) for i in top_k(scores, k)]
+
+        return query, [
+            (i, sim)
+            for i, sim in candidatos
+            if sim >= threshold and (tipo is None or entries[i].tipo == tipo)
+        ][:k]
+
+    def refresh_after_commit(self, db: AsyncSession):
+        """Programa una recarga cuando (y solo si) la sesión confirme sus cambios"""
+        sync_session = db.sync_session
+        sync_session.info["rag_index_refresh"] = True
+        if sync_session.info.get("rag_index_listeners"):
+            return
+        sync_session.info["rag_index_listeners"] = True
+
+        loop = asyncio.get_running_loop()
+
+        # Los listeners quedan en la sesión (vive lo que la request); el flag
+        # hace que solo disparen si hubo cambios en conocimiento_rag
+        def _after_commit(session):
+            if session.info.pop("rag_index_refresh", False):
+                task = loop.create_task(self._safe_refresh())
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+        def _after_rollback(session):
+            session.info.pop("rag_index_refresh", None)
+
+        event.listen(sync_session, "after_commit", _after_commit)
+        event.listen(sync_session, "after_rollback", _after_rollback)
+
+    async def _safe_refresh(self):
+        try:
+            await self.load()
+            metrics.inc("rag_index.refreshes")
+        except Exception as e:
+            print(f"Error recargando índice RAG: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "rows": len(self.entries),
+            "hnsw": self.hnsw is not None,
+            "loaded_at": self.loaded_at,
+            "version": self.version,
+        }
+
+
+knowledge_index = KnowledgeVectorIndex(
+    settings.EMBEDDING_DIMENSIONS,
+    hnsw_min_rows=settings.RAG_INDEX_HNSW_MIN_ROWS,
+)
@@ -0,0 +1,64 @@
+"""
+app/services/vector_search.py - Consultas ANN de pgvector que usan el índice HNSW
+Un filtro `1 - (embedding <=> q) >= umbral` en el WHERE impide que Postgres
+use el índice (no es un ORDER BY distancia LIMIT). El builder genera:
+  1) escaneo ordenado por distancia con LIMIT (index scan HNSW)
+  2) umbral aplicado después, sobre los candidatos
+Con candidates == k el resultado es idéntico al de la consulta original: si
+el candidato i no llega al umbral, los siguientes (más lejanos) tampoco.
+"""
+from functools import lru_cache
+from typing import Any, Dict, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
+
+
+@lru_cache(maxsize=64)
+def build_ann_query(
+    table: str,
+    columns: Sequence[str],
+    vector_column: str = "embedding",
+    filters: Sequence[str] = (),
+    order_by: Optional[str] = None,
+    prefix: str = "",
+) -> TextClause:
+    """
+    Parámetros de la consulta: :embedding, :candidates, :threshold, :k
+    (usar ann_params) más los que necesiten los filtros.
+    order_by permite reordenar los candidatos (p.ej. "tasa_exito DESC").
+    prefix distingue k/threshold/candidates cuando se combinan varias
+    búsquedas en una misma sentencia (el :embedding se comparte).
+    """
+    distancia = f"{vector_column} <=> CAST(:embedding AS vector)"
+    where = f"WHERE {' AND '.join(filters)}" if filters else ""
+
+    return text(f"""
+        SELECT * FROM (
+            SELECT {", ".join(columns)}, 1 - ({distancia}) AS sim
+            FROM {table}
+            {where}
+            ORDER BY {distancia}
+            LIMIT :{prefix}candidates
+        ) AS ann
+        WHERE sim >= :{prefix}threshold
+        ORDER BY {order_by or "sim DESC"}
+        LIMIT :{prefix}k
+    """)
+
+
+def ann_params(
+    embedding,
+    k: int,
+    threshold: float,
+    candidates: Optional[int] = None,
+    prefix: str = "",
+    **extra: Any,
+) -> Dict[str, Any]:
+    return {
+        "embedding": str([float(x) for x in embedding]),
+        f"{prefix}k": k,
+        f"{prefix}threshold": threshold,
+        f"{prefix}candidates": max(k, candidates or k),
+        **extra,
+    }
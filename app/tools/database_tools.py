@@ -6,6 +6,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, text
 from app.models import Lead, Conversacion, Mensaje
 from app.services.embeddings import embedding_service
+from app.services.embedding_queue import message_embedding_queue
 from typing import Dict, Any, Optional, List
 from uuid import UUID
 from datetime import datetime
@@ -79,21 +80,20 @@ async def save_message(
     contenido: str,
     intenciones: Optional[Dict] = None
 ) -> bool:
-    """Guarda un mensaje en la base de datos con embedding"""
+    """Guarda un mensaje; el embedding se rellena en background (write-behind)"""
     try:
-        embedding = embedding_service.encode_single(contenido)
-        
         mensaje = Mensaje(
             conversacion_id=UUID(conversacion_id),
             lead_id=UUID(lead_id),
             rol=rol,
             contenido=contenido,
-            embedding=embedding,
+            embedding=None,
             intenciones=intenciones
         )
         db.add(mensaje)
         await db.flush()
         await db.commit()
+        message_embedding_queue.enqueue(mensaje.id, contenido)
         return True
     except Exception as e:
         print(f"Error guardando mensaje: {e}")
@@ -205,7 +205,7 @@ async def search_similar_context(
     limit: int = 5
 ) -> List[Dict[str, Any]]:
     """Busca mensajes similares en la conversación usando embeddings"""
-    query_embedding = embedding_service.encode_single(query)
+    query_embedding = await embedding_service.embed_text(query)
     
     result = await db.execute(
         text("""
@@ -7,6 +7,58 @@ from typing import Dict, List, Optional, Any
 import re
 from datetime import datetime
 
+# Patrones precompilados (los reutiliza app/services/pre_extraction.py)
+NOMBRE_PATTERNS = [
+    re.compile(p, re.IGNORECASE)
+    for p in (
+        r"(?:soy|me llamo|mi nombre es|mi nombre:)\s+([a-záéíóúñ]+(?:\s+[a-záéíóúñ]+)?)",
+        r"^([A-ZÁÉÍÓÚÑ][a-záéíóúñ]+(?:\s+[A-ZÁÉÍÓÚÑ][a-záéíóúñ]+)?)\s*[,\s]+(?:\d|[a-z0-9._%+-]+@)",
+        r"^([A-ZÁÉÍÓÚÑ][a-záéíóúñ]+(?:\s+[A-ZÁÉÍÓÚÑ][a-záéíóúñ]+)?)\s*[,\s!]",
+    )
+]
+EMAIL_RE = re.compile(r'\b[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\b')
+PHONE_PATTERNS = [
+    re.compile(p)
+    for p in (
+        r'\b(\+?51\s?)?9\d{8}\b',
+        r'\b\d{3}[-.\s]?\d{3}[-.\s]?\d{3}\b',
+        r'\b9\d{8}\b',
+    )
+]
+PHONE_SEPARATORS_RE = re.compile(r'[-.\s+]')
+EMPRESA_PATTERNS = [
+    re.compile(p)
+    for p in (
+        r"(?:de la empresa|trabajo en|mi empresa es|negocio de)\s+([a-záéíóúñ\s]+)",
+        r"(?:soy|tengo)\s+(?:una?|un)\s+(bodega|restaurante|taller|tienda|farmacia)",
+    )
+]
+PRESUPUESTO_PATTERNS = [
+    re.compile(p)
+    for p in (
+        r"(?:tengo|cuento con|presupuesto de?|dispongo de?)\s+(?:un\s+)?s/?\.?\s?(\d{2,5})",
+        r"(?:hasta|máximo|puedo pagar)\s+s/?\.?\s?(\d{2,5})",
+        r"(\d{2,5})\s+soles",
+    )
+]
+URGENCIA_KEYWORDS = {
+    "urgente": 3,
+    "rápido": 7,
+    "pronto": 14,
+    "esta semana": 7,
+    "este mes": 30,
+}
+SECTORES_KEYWORDS = {
+    "bodega": "retail",
+    "restaurante": "gastronomia",
+    "taller": "servicios",
+    "farmacia": "salud",
+    "tienda": "retail",
+    "ecommerce": "retail",
+}
+NOMBRES_INVALIDOS = ['hola', 'buenos', 'buenas']
+
+
 @tool
 def extract_lead_info(message: str, context: Dict[str, Any]) -> Dict[str, Optional[str]]:
     """Extrae información del lead del mensaje del usuario"""
@@ -14,85 +66,51 @@ def extract_lead_info(message: str, context: Dict[str, Any]) -> Dict[str, Option
     extracted = {}
     
     if not context.get("nombre"):
-        nombre_patterns = [
-            r"(?:soy|me llamo|mi nombre es|mi nombre:)\s+([a-záéíóúñ]+(?:\s+[a-záéíóúñ]+)?)",
-            r"^([A-ZÁÉÍÓÚÑ][a-záéíóúñ]+(?:\s+[A-ZÁÉÍÓÚÑ][a-záéíóúñ]+)?)\s*[,\s]+(?:\d|[a-z0-9._%+-]+@)",
-            r"^([A-ZÁÉÍÓÚÑ][a-záéíóúñ]+(?:\s+[A-ZÁÉÍÓÚÑ][a-záéíóúñ]+)?)\s*[,\s!]",
-        ]
-        for pattern in nombre_patterns:
-            match = re.search(pattern, message, re.IGNORECASE)
+        for pattern in NOMBRE_PATTERNS:
+            match = pattern.search(message)
             if match:
                 nombre_raw = match.group(1).strip()
-                if len(nombre_raw) >= 3 and nombre_raw.lower() not in ['hola', 'buenos', 'buenas']:
+                if len(nombre_raw) >= 3 and nombre_raw.lower() not in NOMBRES_INVALIDOS:
                     extracted["nombre"] = nombre_raw.title()
                     break
     
     if not context.get("email"):
-        email_match = re.search(r'\b[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\b', message)
+        email_match = EMAIL_RE.search(message)
         if email_match:
             extracted["email"] = email_match.group(0).lower()
     
     if not context.get("telefono"):
-        phone_patterns = [
-            r'\b(\+?51\s?)?9\d{8}\b',
-            r'\b\d{3}[-.\s]?\d{3}[-.\s]?\d{3}\b',
-            r'\b9\d{8}\b',
-        ]
-        for pattern in phone_patterns:
-            match = re.search(pattern, message)
+        for pattern in PHONE_PATTERNS:
+            match = pattern.search(message)
             if match:
-                phone = re.sub(r'[-.\s+]', '', match.group(0))
+                phone = PHONE_SEPARATORS_RE.sub('', match.group(0))
                 extracted["telefono"] = phone
                 break
     
     if not context.get("empresa"):
-        empresa_patterns = [
-            r"(?:de la empresa|trabajo en|mi empresa es|negocio de)\s+([a-záéíóúñ\s]+)",
-            r"(?:soy|tengo)\s+(?:una?|un)\s+(bodega|restaurante|taller|tienda|farmacia)",
-        ]
-        for pattern in empresa_patterns:
-            match = re.search(pattern, msg_lower)
+        for pattern in EMPRESA_PATTERNS:
+            match = pattern.search(msg_lower)
             if match:
                 extracted["empresa"] = match.group(1).strip().title()
                 break
     
     if not context.get("presupuesto"):
-        presupuesto_patterns = [
-            r"(?:tengo|cuento con|presupuesto de?|dispongo de?)\s+(?:un\s+)?s/?\.?\s?(\d{2,5})",
-            r"(?:hasta|máximo|puedo pagar)\s+s/?\.?\s?(\d{2,5})",
-            r"(\d{2,5})\s+soles",
-        ]
-        for pattern in presupuesto_patterns:
-            match = re.search(pattern, msg_lower)
+        for pattern in PRESUPUESTO_PATTERNS:
+            match = pattern.search(msg_lower)
             if match:
                 presupuesto_num = match.group(1)
                 if 100 <= int(presupuesto_num) <= 100000:
                     extracted["presupuesto"] = presupuesto_num
                     break
     
-    urgencia_keywords = {
-        "urgente": 3,
-        "rápido": 7,
-        "pronto": 14,
-        "esta semana": 7,
-        "este mes": 30,
-    }
     if not context.get("urgencia_dias"):
-        for keyword, dias in urgencia_keywords.items():
+        for keyword, dias in URGENCIA_KEYWORDS.items():
             if keyword in msg_lower:
                 extracted["urgencia_dias"] = dias
                 break
     
-    sectores_keywords = {
-        "bodega": "retail",
-        "restaurante": "gastronomia",
-        "taller": "servicios",
-        "farmacia": "salud",
-        "tienda": "retail",
-        "ecommerce": "retail",
-    }
     if not context.get("sector"):
-        for keyword, sector in sectores_keywords.items():
+        for keyword, sector in SECTORES_KEYWORDS.items():
             if keyword in msg_lower:
                 extracted["sector"] = sector
                 break
@@ -135,7 +153,7 @@ def detect_interest_signals(message: str) -> List[Dict[str, Any]]:
             "timestamp": datetime.utcnow().isoformat()
         })
     
-    if re.search(r'\b[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\b', message):
+    if EMAIL_RE.search(message):
         signals.append({
             "tipo": "da_email",
             "contenido": "email",
@@ -0,0 +1,143 @@
+"""
+Benchmark: latencia por turno en modo sequential (extracción -> qualify ->
+respond) vs parallel (respuesta especulativa durante la extracción).
+LLMs simulados con latencia fija y BD falsa: mide el solapamiento, no a OpenAI.
+Los turnos mezclan aciertos (la extracción no cambia la estrategia) y fallos
+(cambia y se regenera).
+
+Uso: python test/bench_agent_modes.py
+"""
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+from langchain_core.language_models import FakeListChatModel
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.agents.graph_system import SalesAgent
+from app.config import settings
+from app.services import embeddings
+from app.services.metrics import metrics
+
+EXTRACTOR_MS = 300
+RESPONDER_MS = 500
+REPETICIONES = 5
+
+PRODUCTO = {"nombre": "Dashboard Analítico", "descripcion": "KPIs", "precio_base": 99.0,
+            "slug": "dashboard", "paquetes": []}
+
+# (mensaje, datos previos, lo que devuelve el extractor) -> estrategia esperada
+TURNOS = [
+    # ask_sector -> ask_sector (acierto)
+    ("me interesa saber cómo funciona el producto de mi negocio", {"nombre": "Ana"}, "{}"),
+    # ask_sector -> present_ask_contact (fallo: la extracción trae el sector)
+    ("nos dedicamos a la distribución de repuestos", {"nombre": "Ana"}, '{"sector": "retail"}'),
+    # present_ask_contact -> present_ask_contact (acierto)
+    ("y cuánto tiempo toma implementarlo en mi empresa?",
+     {"nombre": "Ana", "sector": "retail"}, "{}"),
+    # present_ask_contact -> ask_missing_teléfono (plantilla tras fallo)
+    ("mi correo es ana@tienda.pe, el plazo es de dos semanas",
+     {"nombre": "Ana", "sector": "retail"}, '{"urgencia_dias": 14}'),
+]
+
+
+class SlowFake(FakeListChatModel):
+    latency_ms: float = 0
+
+    async def ainvoke(self, *args, **kwargs):
+        await asyncio.sleep(self.latency_ms / 1000)
+        return await super().ainvoke(*args, **kwargs)
+
+
+class R:
+    def __init__(self, scalar=None):
+        self._scalar = scalar
+
+    def scalar(self):
+        return self._scalar
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+
+class FakeDB:
+    def __init__(self, db_state: dict):
+        self.db_state = db_state
+
+    async def execute(self, stmt, params=None):
+        if "get_conversation_state" in str(stmt):
+            return R(self.db_state)
+        return R()
+
+    def add_all(self, objs):
+        pass
+
+    async def flush(self):
+        pass
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+def crear_agente(modo: str, respuesta_extractor: str) -> SalesAgent:
+    settings.AGENT_EXECUTION_MODE = modo
+    agent = SalesAgent("sk-benchmark")
+    agent.llm = SlowFake(responses=["Respuesta del asesor."], latency_ms=RESPONDER_MS)
+    agent.extractor_llm = SlowFake(responses=[respuesta_extractor], latency_ms=EXTRACTOR_MS)
+    agent.graph = agent._build_graph()
+    return agent
+
+
+async def turno(agent: SalesAgent, mensaje: str, datos: dict) -> float:
+    db = FakeDB({
+        "lead_id": str(uuid.uuid4()),
+        "conversacion_id": str(uuid.uuid4()),
+        "total_mensajes": 3,
+        "estado_agente": {
+            "extracted_data": dict(datos),
+            "productos_recomendados": [PRODUCTO],
+        },
+    })
+    start = time.perf_counter()
+    await agent.process_message(db=db, session_id="bench", message=mensaje,
+                                initial_state={"messages": [], "session_id": "bench"})
+    return (time.perf_counter() - start) * 1000
+
+
+async def main():
+    async def fake_embed(text, *args, **kwargs):
+        return [0.1] * settings.EMBEDDING_DIMENSIONS
+
+    embeddings.embedding_service.embed_text = fake_embed
+
+    print("=" * 60)
+    print(f"  MODOS DE EJECUCIÓN (extractor {EXTRACTOR_MS} ms, respuesta {RESPONDER_MS} ms)")
+    print("=" * 60)
+
+    for modo in ("sequential", "parallel"):
+        latencias = []
+        for mensaje, datos, extraido in TURNOS:
+            agent = crear_agente(modo, extraido)
+            for _ in range(REPETICIONES):
+                latencias.append(await turno(agent, mensaje, datos))
+        print(f"  {modo:<11} p50 {statistics.median(latencias):7.1f} ms  "
+              f"max {max(latencias):7.1f} ms")
+
+    c = metrics.counters
+    print(f"\n  Especulación: {c.get('agent.speculation.hits', 0)} aciertos, "
+          f"{c.get('agent.speculation.misses', 0)} regeneradas, "
+          f"{c.get('agent.speculation.discarded', 0)} descartadas (plantilla)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
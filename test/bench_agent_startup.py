@@ -0,0 +1,70 @@
+"""
+Benchmark: latencia de apertura de conexión y RSS por conexión
+Compara un SalesAgent nuevo por WebSocket (antes) vs runtime compartido (después)
+
+Uso: python test/bench_agent_startup.py
+No hace llamadas a OpenAI ni a la base de datos.
+"""
+import asyncio
+import gc
+import os
+import sys
+import time
+from pathlib import Path
+
+import psutil
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.agents.graph_system import SalesAgent, initialize_system
+
+CONNECTIONS = 50
+
+
+def rss_mb() -> float:
+    return psutil.Process(os.getpid()).memory_info().rss / 1024 / 1024
+
+
+async def bench(label: str, open_connection) -> None:
+    gc.collect()
+    rss_before = rss_mb()
+    agents = []
+    latencies = []
+
+    for _ in range(CONNECTIONS):
+        start = time.perf_counter()
+        agents.append(await open_connection())
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    gc.collect()
+    rss_after = rss_mb()
+    latencies.sort()
+
+    print(f"\n{label}")
+    print("-" * 60)
+    print(f"  Conexiones:        {CONNECTIONS}")
+    print(f"  Apertura p50:      {latencies[len(latencies) // 2]:.3f} ms")
+    print(f"  Apertura p95:      {latencies[int(len(latencies) * 0.95)]:.3f} ms")
+    print(f"  RSS total:         {rss_after - rss_before:.2f} MB")
+    print(f"  RSS por conexión:  {(rss_after - rss_before) * 1024 / CONNECTIONS:.1f} KB")
+
+
+async def main():
+    key = os.getenv("OPENAI_API_KEY", "sk-benchmark")
+
+    print("=" * 60)
+    print("  BENCHMARK APERTURA DE CONEXIÓN DEL AGENTE")
+    print("=" * 60)
+
+    async def per_connection():
+        return SalesAgent(key)
+
+    async def shared():
+        return await initialize_system(openai_key=key)
+
+    await bench("ANTES: SalesAgent + grafo por conexión", per_connection)
+    await bench("DESPUÉS: runtime compartido", shared)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
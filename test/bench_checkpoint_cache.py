@@ -0,0 +1,42 @@
+"""
+Benchmark: leer el último checkpoint de un hilo desde el nivel caliente en
+memoria vs reconstruirlo de la BD (decode de la cadena + deltas), en el chat
+de 20 turnos de bench_checkpoint_delta. Sin la ida y vuelta a PostgreSQL,
+que en un fallo de cache se suma a la columna "BD".
+También estima cuántos hilos activos caben en el presupuesto por defecto.
+
+Uso: python test/bench_checkpoint_cache.py
+"""
+import sys
+from langgraph.checkpoint.base import CheckpointTuple
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.config import MEMORY_LIMITS
+from app.services.checkpoint_cache import CheckpointHotTier
+from app.services.checkpoint_serde import CheckpointSerializer
+from bench_checkpoint_delta import TURNOS, checkpoints, filas, leer_ultimo, medir
+
+
+def main():
+    serie = checkpoints()
+    serde = CheckpointSerializer("msgpack", zstd_level=3)
+    hot = CheckpointHotTier(MEMORY_LIMITS["checkpoint_cache_mb"] * 1024 * 1024)
+    config = {"configurable": {"thread_id": "bench", "checkpoint_ns": "", "checkpoint_id": "ultimo"}}
+    hot.put(("bench", ""), CheckpointTuple(config, serie[-1], {}, None))
+    por_hilo = hot.stats()["bytes"]
+
+    print(f"{TURNOS} turnos, último checkpoint ~{por_hilo / 1024:.1f} KB en memoria")
+    print(f"{'modo':<24}{'leer último µs':>16}")
+    for n in (1, 10):
+        serie_filas = filas(serie, serde, n)
+        nombre = "BD, completo" if n == 1 else f"BD, delta c/{n}"
+        print(f"{nombre:<24}{medir(leer_ultimo, serde, serie_filas):>16.1f}")
+    assert hot.get(("bench", "")).checkpoint == serie[-1]
+    print(f"{'nivel caliente':<24}{medir(hot.get, ('bench', '')):>16.1f}")
+    print(f"\nhilos de {TURNOS} turnos en {MEMORY_LIMITS['checkpoint_cache_mb']} MB: ~{hot.max_bytes // por_hilo}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark: checkpoints completos vs delta + snapshot cada N pasos, en un chat
+de 20 turnos con la forma del grafo del agente (5 nodos por turno).
+Mide bytes acumulados en graph_checkpoints y el coste de reconstruir el
+último checkpoint (decode de la cadena + aplicar deltas). La latencia de red
+de la CTE no se mide aquí: devuelve como mucho N filas en una consulta.
+
+Uso: python test/bench_checkpoint_delta.py
+"""
+import operator
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Annotated, Sequence, TypedDict
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import END, StateGraph
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.checkpoint_delta import ThreadTip, compute_delta, rebuild
+from app.services.checkpoint_serde import CheckpointSerializer
+
+TURNOS = 20
+REPETICIONES = 200
+
+
+class Estado(TypedDict):
+    messages: Annotated[Sequence[BaseMessage], operator.add]
+    extracted_data: dict
+    productos_recomendados: list
+    probability: int
+    mensaje_count: int
+
+
+def grafo():
+    def initialize(state):
+        return {"probability": min(95, 10 + 4 * state["mensaje_count"])}
+
+    def extract(state):
+        return {"extracted_data": {**state["extracted_data"], f"dato_{state['mensaje_count']}": "valor"}}
+
+    def qualify(state):
+        return {"productos_recomendados": [
+            {"nombre": "Dashboard Analítico", "descripcion": "Ventas, stock y márgenes en tiempo real",
+             "paquetes": [{"nombre": "Pyme", "precio_mensual": 299.0}]},
+        ]}
+
+    def respond(state):
+        return {
+            "messages": [AIMessage(content=(
+                f"Perfecto, nuestro Dashboard Analítico te muestra ventas y stock al día "
+                f"desde el celular. ¿Me compartes tu correo? ({state['mensaje_count']})"
+            ))],
+            "mensaje_count": state["mensaje_count"] + 1,
+        }
+
+    def finalize(state):
+        return {}
+
+    g = StateGraph(Estado)
+    for nombre, nodo in [("initialize", initialize), ("extract", extract), ("qualify", qualify),
+                         ("respond", respond), ("finalize", finalize)]:
+        g.add_node(nombre, nodo)
+    g.set_entry_point("initialize")
+    g.add_edge("initialize", "extract")
+    g.add_edge("extract", "qualify")
+    g.add_edge("qualify", "respond")
+    g.add_edge("respond", "finalize")
+    g.add_edge("finalize", END)
+    return g
+
+
+def checkpoints() -> list:
+    saver = InMemorySaver()
+    app = grafo().compile(checkpointer=saver)
+    config = {"configurable": {"thread_id": "bench"}}
+    for i in range(TURNOS):
+        app.invoke(
+            {"messages": [HumanMessage(content=f"Tengo una bodega y quiero ver mis ventas por día ({i})")],
+             **({} if i else {"extracted_data": {}, "productos_recomendados": [],
+                              "probability": 0, "mensaje_count": 0})},
+            config,
+        )
+    return [t.checkpoint for t in reversed(list(saver.list(config)))]
+
+
+def filas(serie: list, serde: CheckpointSerializer, snapshot_every: int) -> list:
+    """(blob, es_snapshot) por checkpoint, como los escribe PostgresCheckpointer"""
+    resultado, tip = [], None
+    for i, checkpoint in enumerate(serie):
+        if tip is not None and tip.depth + 1 < snapshot_every:
+            payload, depth = {"delta": compute_delta(checkpoint, tip)}, tip.depth + 1
+        else:
+            payload, depth = {"checkpoint": checkpoint}, 0
+        resultado.append((serde.dumps(payload), depth == 0))
+        tip = ThreadTip(f"c{i}", checkpoint, depth)
+    return resultado
+
+
+def leer_ultimo(serde: CheckpointSerializer, filas_serie: list):
+    inicio = max(i for i, (_, snap) in enumerate(filas_serie) if snap)
+    return rebuild([serde.loads(blob) for blob, _ in filas_serie[inicio:]])
+
+
+def medir(fn, *args) -> float:
+    latencias = []
+    for _ in range(REPETICIONES):
+        start = time.perf_counter()
+        fn(*args)
+        latencias.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(latencias)
+
+
+def main():
+    serie = checkpoints()
+    serde = CheckpointSerializer("msgpack", zstd_level=3)
+    print(f"{TURNOS} turnos, {len(serie)} checkpoints, msgpack + zstd\n")
+    print(f"{'modo':<22}{'bytes totales':>14}{'vs completo':>13}{'filas a leer':>14}{'leer último µs':>16}")
+
+    completo = None
+    for nombre, n in [("completo", 1), ("delta, snapshot c/5", 5),
+                      ("delta, snapshot c/10", 10), ("delta, snapshot c/20", 20)]:
+        serie_filas = filas(serie, serde, n)
+        total = sum(len(blob) for blob, _ in serie_filas)
+        completo = completo or total
+        assert leer_ultimo(serde, serie_filas) == serie[-1]
+        ultimo_snapshot = max(i for i, (_, snap) in enumerate(serie_filas) if snap)
+        print(
+            f"{nombre:<22}{total:>14}{total / completo:>12.0%} "
+            f"{len(serie_filas) - ultimo_snapshot:>13}{medir(leer_ultimo, serde, serie_filas):>16.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
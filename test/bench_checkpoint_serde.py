@@ -0,0 +1,114 @@
+"""
+Benchmark: serialización de un checkpoint de LangGraph con una conversación
+de 40 mensajes. pickle (actual) vs msgpack / orjson, con y sin zstd.
+Mide bytes por checkpoint y tiempo de encode/decode. No necesita BD ni API.
+Referencia (p50): msgpack decodifica en ~2x el tiempo de pickle (~155 vs
+~80 µs); la ganancia es de tamaño (msgpack + zstd ~6x menos bytes) y un
+formato que no depende de los internos de pickle/pydantic.
+
+Uso: python test/bench_checkpoint_serde.py
+"""
+import pickle
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.checkpoint_serde import CheckpointSerializer, ZSTD_AVAILABLE
+
+MENSAJES = 40
+REPETICIONES = 300
+
+USUARIO = [
+    "Hola, tengo una bodega en Surco y quiero vender más por internet",
+    "Me interesa el dashboard para ver mis ventas por día y por producto",
+    "Soy Valerio, el dueño, y decido yo. Mi correo es valerio@bodega.pe",
+    "¿Cuánto cuesta el plan mensual? Tengo unos 800 soles de presupuesto",
+]
+AGENTE = [
+    "¡Hola! Soy Artur, asistente de NexWebs. ¿Cómo puedo ayudarte hoy?",
+    "Perfecto, nuestro Dashboard Analítico es ideal para ti: ves ventas, stock y "
+    "márgenes en tiempo real desde el celular. ¿Cuál es tu nombre?",
+    "Gracias, Valerio. Solo me falta tu teléfono para que un asesor se contacte contigo.",
+    "El plan Pyme cuesta S/299 al mes e incluye reportes diarios y alertas de stock.",
+]
+
+
+def checkpoint() -> dict:
+    mensajes = []
+    for i in range(MENSAJES // 2):
+        # Sin repetir textos: pickle memoriza cadenas repetidas
+        mensajes.append(HumanMessage(content=f"{USUARIO[i % len(USUARIO)]} ({i})"))
+        mensajes.append(AIMessage(
+            content=f"{AGENTE[i % len(AGENTE)]} ({i})",
+            response_metadata={"model_name": "gpt-4o-mini", "finish_reason": "stop"},
+        ))
+    version = "00000000000000000000000000000041.0.3321254227101844"
+    return {
+        "checkpoint": {
+            "v": 4,
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "id": "1f1c9df8-4e4a-603b-8001-b10f6dadf8b6",
+            "channel_versions": {c: version for c in ("messages", "extracted_data", "probability")},
+            "versions_seen": {"respond": {"branch:to:respond": version}},
+            "updated_channels": ["messages", "extracted_data"],
+            "channel_values": {
+                "messages": mensajes,
+                "lead_id": "6f0b6a52-6a55-4e0f-9d55-2a4b0f1f1c11",
+                "conversacion_id": "0e6c3c8a-56b3-4a39-8e5e-3f3a7b3a0d22",
+                "extracted_data": {
+                    "nombre": "Valerio", "email": "valerio@bodega.pe", "sector": "retail",
+                    "presupuesto_declarado": 800, "es_decisor": True,
+                },
+                "productos_recomendados": [{
+                    "nombre": "Dashboard Analítico",
+                    "descripcion": "Ventas, stock y márgenes en tiempo real",
+                    "paquetes": [{"nombre": "Pyme", "precio_mensual": 299.0}],
+                }],
+                "probability": 72,
+                "mensaje_count": MENSAJES // 2,
+                "actualizado": datetime.now(timezone.utc),
+            },
+        },
+        "metadata": {"source": "loop", "step": MENSAJES, "parents": {}},
+        "new_versions": {"messages": version},
+    }
+
+
+def medir(fn, *args) -> float:
+    latencias = []
+    for _ in range(REPETICIONES):
+        start = time.perf_counter()
+        fn(*args)
+        latencias.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(latencias)
+
+
+def main():
+    data = checkpoint()
+    variantes = [("pickle (actual)", CheckpointSerializer("pickle"))]
+    for fmt in ("msgpack", "orjson"):
+        variantes.append((fmt, CheckpointSerializer(fmt)))
+        if ZSTD_AVAILABLE:
+            variantes.append((f"{fmt} + zstd", CheckpointSerializer(fmt, zstd_level=3)))
+
+    base = len(pickle.dumps(data))
+    print(f"Checkpoint con {MENSAJES} mensajes (p50 de {REPETICIONES} repeticiones)\n")
+    print(f"{'formato':<18}{'bytes':>9}{'vs pickle':>11}{'encode µs':>12}{'decode µs':>12}")
+    for nombre, serde in variantes:
+        blob = serde.dumps(data)
+        restaurado = serde.loads(blob)
+        assert restaurado["checkpoint"]["channel_values"]["messages"] == data["checkpoint"]["channel_values"]["messages"]
+        print(
+            f"{nombre:<18}{len(blob):>9}{len(blob) / base:>10.0%} "
+            f"{medir(serde.dumps, data):>11.1f}{medir(serde.loads, blob):>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark: backend remoto (OpenAI, servidor falso local) vs backend local en CPU
+Mide latencia de un texto (p50/p95, como en un turno de chat) y throughput
+de un reindexado en lote, ambos a través del EmbeddingBatcher de la app.
+
+El backend local necesita sentence-transformers; si no está instalado se omite.
+Para medir contra la API real: REMOTE_REAL=1 (usa OPENAI_API_KEY).
+
+Uso: python test/bench_embedding_backends.py
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import uvicorn
+from openai import AsyncOpenAI
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.config import settings
+from app.services.embeddings import EmbeddingBatcher
+from app.services.embedding_backends import OpenAIEmbeddingBackend, LocalEmbeddingBackend
+from bench_embedding_batching import fake_api, PORT
+
+SINGLE_CALLS = 50
+BULK_TEXTS = 256
+
+
+def texto():
+    return f"Hola, tengo una bodega y quiero un dashboard de ventas {random.random()}"
+
+
+async def bench(label: str, backend, max_batch: int):
+    batcher = EmbeddingBatcher(backend, max_batch=max_batch, window_ms=5)
+
+    await batcher.submit(texto())  # calentamiento (carga de modelo, conexión)
+
+    latencias = []
+    for _ in range(SINGLE_CALLS):
+        start = time.perf_counter()
+        vector = await batcher.submit(texto())
+        latencias.append((time.perf_counter() - start) * 1000)
+    latencias.sort()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(batcher.submit(texto()) for _ in range(BULK_TEXTS)))
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{label}")
+    print("-" * 60)
+    print(f"  Dimensiones:       {len(vector)}")
+    print(f"  1 texto p50:       {statistics.median(latencias):.1f} ms")
+    print(f"  1 texto p95:       {latencias[int(len(latencias) * 0.95) - 1]:.1f} ms")
+    print(f"  Lote {BULK_TEXTS} textos:   {elapsed * 1000:.0f} ms "
+          f"({BULK_TEXTS / elapsed:.0f} textos/s)")
+
+
+async def main():
+    dims = settings.EMBEDDING_DIMENSIONS
+    print("=" * 60)
+    print("  BENCHMARK BACKENDS DE EMBEDDINGS")
+    print("=" * 60)
+
+    server = None
+    if os.getenv("REMOTE_REAL") == "1":
+        client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        label = "REMOTO: OpenAI API"
+    else:
+        server = uvicorn.Server(
+            uvicorn.Config(fake_api, host="127.0.0.1", port=PORT, log_level="error")
+        )
+        server_task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        client = AsyncOpenAI(api_key="sk-fake", base_url=f"http://127.0.0.1:{PORT}/v1")
+        label = "REMOTO: servidor falso (latencia simulada)"
+
+    await bench(
+        label,
+        OpenAIEmbeddingBackend(client, None, settings.EMBEDDING_MODEL, dims),
+        max_batch=settings.EMBEDDING_BATCH_SIZE,
+    )
+    await client.close()
+    if server:
+        server.should_exit = True
+        await server_task
+
+    try:
+        import sentence_transformers  # noqa: F401
+    except ImportError:
+        print("\nLOCAL: omitido (pip install sentence-transformers)")
+        return
+
+    for workers in (1, 2):
+        await bench(
+            f"LOCAL: {settings.EMBEDDING_LOCAL_MODEL} ({workers} hilo/s)",
+            LocalEmbeddingBackend(
+                settings.EMBEDDING_LOCAL_MODEL, dims,
+                batch_size=settings.EMBEDDING_LOCAL_BATCH_SIZE, workers=workers,
+            ),
+            max_batch=settings.EMBEDDING_LOCAL_BATCH_SIZE,
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
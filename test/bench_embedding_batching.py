@@ -0,0 +1,123 @@
+"""
+Benchmark: micro-batching de embeddings contra un servidor falso local
+Simula la API /v1/embeddings con latencia fija por request y concurrencia
+limitada del lado servidor (como los rate limits reales).
+
+Uso: python test/bench_embedding_batching.py
+"""
+import asyncio
+import base64
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from openai import AsyncOpenAI
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.embeddings import EmbeddingBatcher
+from app.services.embedding_backends import OpenAIEmbeddingBackend
+
+PORT = 8765
+DIMENSIONS = 384
+REQUEST_LATENCY_S = 0.025
+PER_INPUT_LATENCY_S = 0.0002
+SERVER_CONCURRENCY = 4
+TOTAL_TEXTS = 400
+
+fake_api = FastAPI()
+server_slots = None
+stats = {"requests": 0}
+
+
+@fake_api.post("/v1/embeddings")
+async def fake_embeddings(request: Request):
+    global server_slots
+    if server_slots is None:
+        server_slots = asyncio.Semaphore(SERVER_CONCURRENCY)
+
+    body = await request.json()
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    stats["requests"] += 1
+
+    async with server_slots:
+        await asyncio.sleep(REQUEST_LATENCY_S + PER_INPUT_LATENCY_S * len(inputs))
+
+    data = []
+    for i, _ in enumerate(inputs):
+        vector = np.random.rand(body.get("dimensions", DIMENSIONS)).astype(np.float32)
+        if body.get("encoding_format") == "base64":
+            embedding = base64.b64encode(vector.tobytes()).decode()
+        else:
+            embedding = vector.tolist()
+        data.append({"object": "embedding", "index": i, "embedding": embedding})
+
+    return {
+        "object": "list",
+        "data": data,
+        "model": body["model"],
+        "usage": {"prompt_tokens": 0, "total_tokens": 0},
+    }
+
+
+def textos():
+    return [f"mensaje de prueba {i} {random.random()}" for i in range(TOTAL_TEXTS)]
+
+
+async def run(label: str, embed_one):
+    stats["requests"] = 0
+    items = textos()
+    start = time.perf_counter()
+    await asyncio.gather(*(embed_one(t) for t in items))
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{label}")
+    print("-" * 60)
+    print(f"  Textos:       {TOTAL_TEXTS}")
+    print(f"  Requests:     {stats['requests']}")
+    print(f"  Tiempo:       {elapsed * 1000:.0f} ms")
+    print(f"  Throughput:   {TOTAL_TEXTS / elapsed:.0f} textos/s")
+
+
+async def main():
+    server = uvicorn.Server(
+        uvicorn.Config(fake_api, host="127.0.0.1", port=PORT, log_level="error")
+    )
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    client = AsyncOpenAI(api_key="sk-fake", base_url=f"http://127.0.0.1:{PORT}/v1")
+
+    print("=" * 60)
+    print("  BENCHMARK MICRO-BATCHING DE EMBEDDINGS (servidor falso)")
+    print(f"  Latencia {REQUEST_LATENCY_S * 1000:.0f} ms/request, "
+          f"{SERVER_CONCURRENCY} requests concurrentes en servidor")
+    print("=" * 60)
+
+    async def unbatched(text):
+        response = await client.embeddings.create(
+            model="text-embedding-3-small", input=text, dimensions=DIMENSIONS
+        )
+        return response.data[0].embedding
+
+    await run("ANTES: 1 texto por request", unbatched)
+
+    for batch_size in (3, 16, 64):
+        batcher = EmbeddingBatcher(
+            OpenAIEmbeddingBackend(client, None, "text-embedding-3-small", DIMENSIONS),
+            max_batch=batch_size, window_ms=5,
+        )
+        await run(f"DESPUÉS: dispatcher batch={batch_size}, ventana=5ms", batcher.submit)
+
+    await client.close()
+    server.should_exit = True
+    await server_task
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+"""
+Benchmark: re-ranking MMR vectorizado (un producto matricial + k pasos numpy)
+vs MMR ingenuo en Python (similitudes par a par dentro del bucle greedy).
+No necesita BD ni API: vectores sintéticos de 384 dimensiones.
+
+Uso: python test/bench_mmr.py
+"""
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.vector_index import mmr, normalize_rows
+
+DIMENSIONS = 384
+REPETICIONES = 200
+CASOS = [(8, 2), (20, 2), (50, 5), (200, 10)]
+
+
+def mmr_ingenuo(query, candidatos, k, lambda_=0.7):
+    """Implementación de referencia: bucle Python sobre candidatos y seleccionados"""
+    relevancia = [float(c @ query) for c in candidatos]
+    seleccionados, restantes = [], list(range(len(candidatos)))
+    while restantes and len(seleccionados) < k:
+        mejor, mejor_score = None, -np.inf
+        for i in restantes:
+            redundancia = max(
+                (float(candidatos[i] @ candidatos[j]) for j in seleccionados), default=0.0
+            )
+            score = lambda_ * relevancia[i] - (1 - lambda_) * redundancia
+            if score > mejor_score:
+                mejor, mejor_score = i, score
+        seleccionados.append(mejor)
+        restantes.remove(mejor)
+    return seleccionados
+
+
+def medir(fn, *args) -> float:
+    latencias = []
+    for _ in range(REPETICIONES):
+        start = time.perf_counter()
+        fn(*args)
+        latencias.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(latencias)
+
+
+def main():
+    rng = np.random.default_rng(0)
+
+    print("=" * 60)
+    print(f"  BENCHMARK MMR ({DIMENSIONS} dims, p50 de {REPETICIONES} repeticiones)")
+    print("=" * 60)
+    print(f"  {'candidatos':>10} {'k':>4} {'ingenuo µs':>12} {'numpy µs':>10} {'x':>6}")
+
+    for n, k in CASOS:
+        # Grupos de casi duplicados, como los chunks de una misma guía
+        centros = rng.standard_normal((max(1, n // 4), DIMENSIONS))
+        candidatos = normalize_rows(
+            centros[rng.integers(0, len(centros), n)]
+            + 0.1 * rng.standard_normal((n, DIMENSIONS))
+        )
+        query = normalize_rows(rng.standard_normal((1, DIMENSIONS)))[0]
+
+        assert mmr(query, candidatos, k) == mmr_ingenuo(query, candidatos, k)
+        ingenuo = medir(mmr_ingenuo, query, candidatos, k)
+        vectorizado = medir(mmr, query, candidatos, k)
+        print(f"  {n:>10} {k:>4} {ingenuo:>12.1f} {vectorizado:>10.1f} "
+              f"{ingenuo / vectorizado:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
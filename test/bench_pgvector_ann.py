@@ -0,0 +1,146 @@
+"""
+Benchmark: consulta RAG original (umbral en el WHERE) vs builder ANN
+(ORDER BY distancia LIMIT + umbral después) sobre tablas sintéticas.
+
+Requiere PostgreSQL con pgvector (DATABASE_URL). Crea y borra el esquema
+bench_ann. Para cada tamaño mide: sin índice, con HNSW y varios ef_search,
+más el recall@k del ANN frente al resultado exacto.
+
+Uso: python test/bench_pgvector_ann.py [10000 100000 1000000]
+"""
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.config import settings
+from app.services.vector_search import build_ann_query, ann_params
+
+DIMENSIONS = 384
+QUERIES = 30
+K = 2
+THRESHOLD = 0.1
+EF_SEARCH = (20, 40, 100)
+
+ORIGINAL = text("""
+    SELECT id, 1 - (embedding <=> CAST(:embedding AS vector)) AS sim
+    FROM bench_ann.docs
+    WHERE activo = TRUE
+      AND (1 - (embedding <=> CAST(:embedding AS vector))) >= :threshold
+    ORDER BY embedding <=> CAST(:embedding AS vector)
+    LIMIT :k
+""")
+
+ANN = build_ann_query("bench_ann.docs", ("id",), filters=("activo = TRUE",))
+
+
+async def poblar(conn, filas: int):
+    await conn.execute(text("DROP SCHEMA IF EXISTS bench_ann CASCADE"))
+    await conn.execute(text("CREATE SCHEMA bench_ann"))
+    await conn.execute(text(f"""
+        CREATE TABLE bench_ann.docs (
+            id BIGINT PRIMARY KEY,
+            activo BOOLEAN DEFAULT TRUE,
+            embedding vector({DIMENSIONS})
+        )
+    """))
+    # Vectores aleatorios generados en el servidor (la subconsulta depende de g
+    # para que se evalúe por fila)
+    await conn.execute(text(f"""
+        INSERT INTO bench_ann.docs (id, embedding)
+        SELECT g, (
+            SELECT array_agg(random() - 0.5)
+            FROM generate_series(1, {DIMENSIONS}) WHERE g > 0
+        )::vector
+        FROM generate_series(1, :filas) AS g
+    """), {"filas": filas})
+    await conn.execute(text("ANALYZE bench_ann.docs"))
+
+
+async def medir(conn, query, consultas) -> tuple:
+    latencias, resultados = [], []
+    for q in consultas:
+        start = time.perf_counter()
+        result = await conn.execute(query, ann_params(q, k=K, threshold=THRESHOLD))
+        resultados.append([row[0] for row in result.fetchall()])
+        latencias.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencias), resultados
+
+
+async def plan(conn, query, q) -> str:
+    result = await conn.execute(
+        text(f"EXPLAIN {query.text}"), ann_params(q, k=K, threshold=THRESHOLD)
+    )
+    lineas = [row[0] for row in result.fetchall()]
+    return "index scan HNSW" if any("Index Scan" in l for l in lineas) else "seq scan"
+
+
+def recall(exactos, aproximados) -> float:
+    total = sum(len(e) for e in exactos)
+    if not total:
+        return 1.0
+    return sum(len(set(e) & set(a)) for e, a in zip(exactos, aproximados)) / total
+
+
+async def bench(engine, filas: int):
+    rng = np.random.default_rng(0)
+    consultas = (rng.random((QUERIES, DIMENSIONS)) - 0.5).tolist()
+
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        start = time.perf_counter()
+        await poblar(conn, filas)
+        print(f"\n{filas:,} filas (poblado en {time.perf_counter() - start:.1f} s)")
+        print("-" * 60)
+
+        p50, exactos = await medir(conn, ORIGINAL, consultas)
+        print(f"  Sin índice, original:      p50 {p50:8.2f} ms")
+        p50, _ = await medir(conn, ANN, consultas)
+        print(f"  Sin índice, builder:       p50 {p50:8.2f} ms")
+
+        start = time.perf_counter()
+        await conn.execute(text("""
+            CREATE INDEX ON bench_ann.docs
+            USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64)
+        """))
+        print(f"  HNSW construido en {time.perf_counter() - start:.1f} s")
+
+        p50, _ = await medir(conn, ORIGINAL, consultas)
+        print(f"  HNSW, original:            p50 {p50:8.2f} ms "
+              f"({await plan(conn, ORIGINAL, consultas[0])})")
+
+        for ef in EF_SEARCH:
+            await conn.execute(text(f"SET hnsw.ef_search = {ef}"))
+            p50, aproximados = await medir(conn, ANN, consultas)
+            print(f"  HNSW, builder ef={ef:<4}:    p50 {p50:8.2f} ms "
+                  f"recall@{K} {recall(exactos, aproximados):.2f} "
+                  f"({await plan(conn, ANN, consultas[0])})")
+        await conn.execute(text("RESET hnsw.ef_search"))
+
+        await conn.execute(text("DROP SCHEMA bench_ann CASCADE"))
+
+
+async def main():
+    tamaños = [int(a) for a in sys.argv[1:]] or [10_000, 100_000]
+    engine = create_async_engine(settings.DATABASE_URL)
+
+    print("=" * 60)
+    print("  BENCHMARK pgvector: umbral en WHERE vs ANN + umbral")
+    print(f"  {QUERIES} consultas, k={K}, umbral={THRESHOLD}")
+    print("=" * 60)
+
+    for filas in tamaños:
+        await bench(engine, filas)
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,121 @@
+"""
+Arnés de precisión del pre-extractor determinista frente al corpus etiquetado:
+- precisión / recall por campo de las reglas
+- turnos que se ahorran el extractor_llm (antes: todos los que tenían campos
+  faltantes) y "saltos indebidos": el LLM no se llama pero el mensaje traía
+  un dato que las reglas no resolvieron
+No necesita BD ni API.
+
+Uso: python test/bench_pre_extraction.py
+"""
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.pre_extraction import pre_extract
+
+CAMPOS = [
+    "nombre", "email", "telefono", "sector",
+    "urgencia_dias", "presupuesto_declarado", "es_decisor",
+]
+
+# (mensaje, última pregunta del agente, datos que contiene el mensaje)
+CORPUS = [
+    ("ok", "", {}),
+    ("sí", "", {}),
+    ("gracias!", "", {}),
+    ("Hola", "", {}),
+    ("buenas tardes", "", {}),
+    ("de acuerdo", "", {}),
+    ("perfecto", "", {}),
+    ("quiero un dashboard", "", {}),
+    ("¿cuánto cuesta el CRM?", "", {}),
+    ("cómo funciona la facturación?", "", {}),
+    ("me interesa el agente de cobranzas", "", {}),
+    ("y eso incluye soporte?", "", {}),
+    ("Soy Valerio", "", {"nombre": "Valerio"}),
+    ("me llamo ana torres", "", {"nombre": "Ana Torres"}),
+    ("mi nombre es Carlos", "", {"nombre": "Carlos"}),
+    ("Valerio, 987654321", "", {"nombre": "Valerio", "telefono": "987654321"}),
+    ("Lucía", "¿Cuál es tu nombre?", {"nombre": "Lucía"}),
+    ("jorge", "Perfecto, ¿me dices tu nombre?", {"nombre": "Jorge"}),
+    ("mi correo es valerio@gmail.com", "", {"email": "valerio@gmail.com"}),
+    ("ana.torres@empresa.pe", "", {"email": "ana.torres@empresa.pe"}),
+    ("te paso mi correo: Juan@Hotmail.com y cel 912 345 678", "",
+     {"email": "juan@hotmail.com", "telefono": "912345678"}),
+    ("mi celular es 987654321", "", {"telefono": "987654321"}),
+    ("+51 987654321", "", {"telefono": "51987654321"}),
+    ("tengo una bodega", "", {"sector": "retail"}),
+    ("tenemos un restaurante en Miraflores", "", {"sector": "gastronomia"}),
+    ("vendo por internet, es una tienda online", "", {"sector": "ecommerce"}),
+    ("somos un call center", "", {"sector": "telecomunicaciones"}),
+    ("trabajo en una clínica dental", "", {"sector": "salud"}),
+    ("me dedico a la importación de repuestos", "", {"sector": "retail"}),
+    ("lo necesito urgente", "", {"urgencia_dias": 3}),
+    ("en 2 semanas", "", {"urgencia_dias": 14}),
+    ("para este mes", "", {"urgencia_dias": 30}),
+    ("lo quiero cuanto antes", "", {"urgencia_dias": 3}),
+    ("lo necesito para ayer", "", {"urgencia_dias": 1}),
+    ("ya mismo lo necesito", "", {"urgencia_dias": 1}),
+    ("tengo un presupuesto de 500 soles", "", {"presupuesto_declarado": 500}),
+    ("puedo pagar hasta s/ 1200", "", {"presupuesto_declarado": 1200}),
+    ("unos 800 soles mensuales", "", {"presupuesto_declarado": 800}),
+    ("podría invertir mil soles", "", {"presupuesto_declarado": 1000}),
+    ("yo decido, soy el dueño", "", {"es_decisor": True}),
+    ("tengo que consultarlo con mi socio", "", {"es_decisor": False}),
+    ("lo decide mi jefe", "", {"es_decisor": False}),
+    ("Soy Pedro, tengo una farmacia y lo necesito urgente", "",
+     {"nombre": "Pedro", "sector": "salud", "urgencia_dias": 3}),
+    ("necesito 3 usuarios", "", {}),
+    ("somos 20 personas", "", {}),
+    ("Quiero ver una demo", "", {}),
+]
+
+
+def main():
+    tp, fp, fn = defaultdict(int), defaultdict(int), defaultdict(int)
+    llm_calls = saltos_indebidos = 0
+    latencias = []
+
+    for mensaje, pregunta, esperado in CORPUS:
+        start = time.perf_counter()
+        pre = pre_extract(mensaje, CAMPOS, pregunta)
+        latencias.append((time.perf_counter() - start) * 1e6)
+
+        for campo in CAMPOS:
+            obtenido = pre.data.get(campo)
+            if campo in esperado and obtenido == esperado[campo]:
+                tp[campo] += 1
+            else:
+                if obtenido is not None:
+                    fp[campo] += 1
+                    print(f"  ✗ {campo}: {mensaje!r} -> {obtenido!r}")
+                if campo in esperado:
+                    fn[campo] += 1
+
+        llm_calls += pre.needs_llm
+        sin_resolver = [c for c in esperado if c not in pre.data]
+        if sin_resolver and not pre.needs_llm:
+            saltos_indebidos += 1
+            print(f"  ⚠ salto indebido: {mensaje!r} (faltó {', '.join(sin_resolver)})")
+
+    print("=" * 60)
+    print(f"  PRE-EXTRACTOR ({len(CORPUS)} mensajes etiquetados)")
+    print("=" * 60)
+    print(f"  {'campo':<24}{'precisión':>10}{'recall':>10}")
+    for campo in CAMPOS:
+        p = tp[campo] / (tp[campo] + fp[campo]) if tp[campo] + fp[campo] else 1.0
+        r = tp[campo] / (tp[campo] + fn[campo]) if tp[campo] + fn[campo] else 1.0
+        print(f"  {campo:<24}{p:>10.0%}{r:>10.0%}")
+
+    print(f"\n  Llamadas al LLM: {len(CORPUS)} (antes) -> {llm_calls} "
+          f"({1 - llm_calls / len(CORPUS):.0%} menos)")
+    print(f"  Saltos indebidos: {saltos_indebidos}")
+    print(f"  Latencia reglas: max {max(latencias):.0f} µs")
+
+
+if __name__ == "__main__":
+    main()
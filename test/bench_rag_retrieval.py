@@ -0,0 +1,116 @@
+"""
+Benchmark: retrieve_rag_context anterior (4 consultas secuenciales) vs
+RAGRetriever (una sentencia con CTEs). Cuenta round-trips y mide latencia
+contra la BD de DATABASE_URL; la diferencia crece con la latencia de red
+(BD gestionada en otra región/proveedor).
+
+Uso: python test/bench_rag_retrieval.py [conversacion_id]
+"""
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import text
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.database import AsyncSessionLocal, engine
+from app.services.metrics import count_db_statements
+from app.services.rag_retrieval import rag_retriever
+from app.services.vector_index import knowledge_index
+from app.services.vector_search import build_ann_query, ann_params
+
+ITERACIONES = 30
+SECTOR = "retail"
+
+
+async def retrieve_legacy(db, query_embedding, conversacion_id, sector):
+    """Implementación anterior: una consulta por bloque, en secuencia"""
+    msgs = await db.execute(
+        text("""
+            SELECT contenido, rol FROM mensajes
+            WHERE conversacion_id = :conv_id
+            ORDER BY created_at DESC LIMIT 3
+        """),
+        {"conv_id": conversacion_id},
+    )
+    msgs.fetchall()
+
+    conocimiento = await db.execute(
+        build_ann_query("conocimiento_rag", ("tipo", "titulo", "contenido"),
+                        filters=("activo = TRUE",)),
+        ann_params(query_embedding, k=2, threshold=0.7),
+    )
+    conocimiento.fetchall()
+
+    patrones = await db.execute(
+        build_ann_query(
+            "patrones_aprendidos", ("tipo_patron", "respuesta_agente", "tasa_exito"),
+            vector_column="embedding_contexto",
+            filters=("aprobado_para_uso = TRUE", "tasa_exito >= 70"),
+            order_by="tasa_exito DESC",
+        ),
+        ann_params(query_embedding, k=2, threshold=0.75, candidates=20),
+    )
+    patrones.fetchall()
+
+    productos = await db.execute(
+        text("""
+            SELECT p.nombre, p.descripcion_corta, p.precio_base,
+                   json_agg(json_build_object('nombre', pk.nombre, 'precio', pk.precio_mensual))
+                   FILTER (WHERE pk.id IS NOT NULL) as paquetes
+            FROM productos p
+            LEFT JOIN paquetes pk ON pk.producto_id = p.id AND pk.activo = TRUE
+            WHERE p.activo = TRUE AND :sector = ANY(p.sectores)
+            GROUP BY p.id LIMIT 2
+        """),
+        {"sector": sector},
+    )
+    productos.fetchall()
+
+
+async def medir(label, fn, query_embedding, conversacion_id):
+    latencias, roundtrips = [], 0
+    async with AsyncSessionLocal() as db:
+        await fn(db, query_embedding, conversacion_id, SECTOR)  # calentamiento
+        for _ in range(ITERACIONES):
+            with count_db_statements() as statements:
+                start = time.perf_counter()
+                await fn(db, query_embedding, conversacion_id, SECTOR)
+                latencias.append((time.perf_counter() - start) * 1000)
+            roundtrips = statements[0]
+
+    latencias.sort()
+    print(f"\n{label}")
+    print("-" * 60)
+    print(f"  Round-trips:  {roundtrips}")
+    print(f"  p50:          {statistics.median(latencias):.2f} ms")
+    print(f"  p95:          {latencias[int(len(latencias) * 0.95) - 1]:.2f} ms")
+
+
+async def main():
+    conversacion_id = sys.argv[1] if len(sys.argv) > 1 else str(uuid.uuid4())
+    query_embedding = np.random.default_rng(0).standard_normal(384).tolist()
+
+    print("=" * 60)
+    print("  BENCHMARK RECUPERACIÓN RAG")
+    print("=" * 60)
+
+    await medir("ANTES: 4 consultas secuenciales", retrieve_legacy,
+                query_embedding, conversacion_id)
+    await medir("DESPUÉS: 1 sentencia (CTE), conocimiento en BD",
+                rag_retriever.retrieve, query_embedding, conversacion_id)
+
+    await knowledge_index.load()
+    await medir("DESPUÉS: 1 sentencia (CTE) + índice en memoria",
+                rag_retriever.retrieve, query_embedding, conversacion_id)
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.base import CheckpointTuple
+
+from app.services.checkpoint_cache import CheckpointHotTier
+
+
+def tupla(thread_id: str, checkpoint_id: str, cerrada: bool = False, texto: str = "hola") -> CheckpointTuple:
+    checkpoint = {
+        "id": checkpoint_id,
+        "channel_values": {
+            "messages": [HumanMessage(content=texto)],
+            "should_close": cerrada,
+        },
+    }
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": "", "checkpoint_id": checkpoint_id}}
+    return CheckpointTuple(config, checkpoint, {}, None)
+
+
+def test_ultimo_checkpoint_y_checkpoint_id():
+    hot = CheckpointHotTier(1024 * 1024)
+    hot.put(("t1", ""), tupla("t1", "c1"))
+
+    assert hot.get(("t1", ""))[1]["id"] == "c1"
+    assert hot.get(("t1", ""), "c1") is not None
+    # Un checkpoint histórico no está en el nivel caliente
+    assert hot.get(("t1", ""), "c0") is None
+    assert hot.get(("t2", "")) is None
+    assert hot.stats()["hits"] == 2 and hot.stats()["misses"] == 2
+
+
+def test_copias_no_comparten_listas():
+    hot = CheckpointHotTier(1024 * 1024)
+    original = tupla("t1", "c1")
+    hot.put(("t1", ""), original)
+    original.checkpoint["channel_values"]["messages"].append(HumanMessage(content="x"))
+
+    leido = hot.get(("t1", ""))
+    leido.checkpoint["channel_values"]["messages"].append(HumanMessage(content="y"))
+    assert len(hot.get(("t1", "")).checkpoint["channel_values"]["messages"]) == 1
+
+
+def test_desaloja_finalizadas_primero():
+    hot = CheckpointHotTier(1024 * 1024)
+    hot.put(("x", ""), tupla("x", "c1"))
+    hot.max_bytes = hot.stats()["bytes"] * 3
+    hot.clear()
+    hot.put(("cerrada", ""), tupla("cerrada", "c1", cerrada=True))
+    hot.put(("a", ""), tupla("a", "c1"))
+    hot.put(("b", ""), tupla("b", "c1"))
+    # "cerrada" es la más reciente en uso, pero es la primera en salir
+    hot.get(("cerrada", ""))
+    hot.put(("c", ""), tupla("c", "c1"))
+
+    assert hot.get(("cerrada", "")) is None
+    assert all(hot.get((t, "")) is not None for t in "abc")
+    assert hot.stats()["finished_evictions"] == 1
+
+    hot.put(("d", ""), tupla("d", "c1"))
+    assert hot.get(("a", "")) is None
+    assert hot.stats()["bytes"] <= hot.max_bytes
+
+
+def test_presupuesto_en_bytes():
+    hot = CheckpointHotTier(4096)
+    hot.put(("grande", ""), tupla("grande", "c1", texto="x" * 10000))
+    assert hot.get(("grande", "")) is None and hot.stats()["bytes"] == 0
@@ -0,0 +1,181 @@
+import operator
+from typing import Annotated, Sequence, TypedDict
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import END, StateGraph
+
+from app.services.checkpoint_delta import ThreadTip, apply_delta, compute_delta, rebuild
+from app.services.checkpoint_serde import CheckpointSerializer
+
+
+class Estado(TypedDict):
+    messages: Annotated[Sequence[BaseMessage], operator.add]
+    extracted_data: dict
+    mensaje_count: int
+
+
+def extraer(state: Estado) -> dict:
+    return {"extracted_data": {**state["extracted_data"], f"campo{state['mensaje_count']}": True}}
+
+
+def responder(state: Estado) -> dict:
+    return {
+        "messages": [AIMessage(content=f"respuesta {state['mensaje_count']}")],
+        "mensaje_count": state["mensaje_count"] + 1,
+    }
+
+
+def checkpoints_reales(turnos: int = 6) -> list:
+    """Checkpoints de LangGraph, del más antiguo al más reciente"""
+    grafo = StateGraph(Estado)
+    grafo.add_node("extraer", extraer)
+    grafo.add_node("responder", responder)
+    grafo.set_entry_point("extraer")
+    grafo.add_edge("extraer", "responder")
+    grafo.add_edge("responder", END)
+    saver = InMemorySaver()
+    app = grafo.compile(checkpointer=saver)
+    config = {"configurable": {"thread_id": "t1"}}
+    estado = {"messages": [], "extracted_data": {}, "mensaje_count": 0}
+    for i in range(turnos):
+        estado = app.invoke({**estado, "messages": [HumanMessage(content=f"hola {i}")]}, config)
+        estado.pop("messages")
+    return [t.checkpoint for t in reversed(list(saver.list(config)))]
+
+
+def test_deltas_reconstruyen_cada_checkpoint():
+    checkpoints = checkpoints_reales()
+    serde = CheckpointSerializer("msgpack")
+    cadena = [{"checkpoint": checkpoints[0]}]
+    tip = ThreadTip("c0", checkpoints[0], 0)
+
+    for i, checkpoint in enumerate(checkpoints[1:], start=1):
+        delta = compute_delta(checkpoint, tip)
+        # Mensajes: solo los nuevos, nunca la lista completa
+        if "messages" in tip.lists:
+            assert "messages" not in delta["changed"]
+        cadena.append(serde.loads(serde.dumps({"delta": delta})))
+        tip = ThreadTip(f"c{i}", checkpoint, i)
+
+        assert rebuild(cadena) == checkpoint
+
+
+def test_append_in_place_no_rompe_el_delta():
+    base = {"channel_values": {"messages": [HumanMessage(content="a")]}, "channel_versions": {"messages": "1"}}
+    tip = ThreadTip("c0", base, 0)
+    # Un nodo hace append sobre la misma lista después de escribir el checkpoint
+    base["channel_values"]["messages"].append(AIMessage(content="b"))
+    siguiente = {
+        "channel_values": {"messages": list(base["channel_values"]["messages"])},
+        "channel_versions": {"messages": "2"},
+    }
+    delta = compute_delta(siguiente, tip)
+    assert [m.content for m in delta["appended"]["messages"]] == ["b"]
+    assert apply_delta(
+        {"channel_values": {"messages": [HumanMessage(content="a")]}}, delta
+    )["channel_values"] == siguiente["channel_values"]
+
+
+def test_canal_reemplazado_o_eliminado():
+    base = {"channel_values": {"lista": [1, 2], "x": 1}, "channel_versions": {"lista": "1", "x": "1"}}
+    siguiente = {"channel_values": {"lista": [3]}, "channel_versions": {"lista": "2"}}
+    delta = compute_delta(siguiente, ThreadTip("c0", base, 0))
+    assert delta["changed"] == {"lista": [3]} and delta["removed"] == ["x"]
+    assert apply_delta(base, delta)["channel_values"] == {"lista": [3]}
+
+
+def test_cadena_sin_snapshot():
+    assert rebuild([{"delta": {}}]) is None
+    assert rebuild([]) is None
+
+
+def test_checkpointer_snapshot_cada_n(monkeypatch):
+    from app.config import settings
+    from app.services.checkpointer import PostgresCheckpointer
+
+    monkeypatch.setattr(settings, "CHECKPOINT_MODE", "delta")
+    monkeypatch.setattr(settings, "CHECKPOINT_SNAPSHOT_EVERY", 3)
+    saver = PostgresCheckpointer()
+
+    snapshots, padre = [], None
+    for i, checkpoint in enumerate(checkpoints_reales(turnos=3)):
+        _, es_snapshot, tip = saver._payload(("t1", ""), f"c{i}", padre, checkpoint)
+        saver._remember(("t1", ""), tip)
+        snapshots.append(es_snapshot)
+        padre = f"c{i}"
+    assert snapshots == [i % 3 == 0 for i in range(len(snapshots))]
+
+    # Padre distinto del último escrito (otro proceso, fork): snapshot completo
+    _, es_snapshot, _ = saver._payload(("t1", ""), "x", "c0", checkpoint)
+    assert es_snapshot
+
+
+def test_langgraph_escribe_deltas(monkeypatch):
+    """El grafo real (no aput a mano): el padre que pasa LangGraph es checkpoint["id"]"""
+    import asyncio
+    from app.config import settings
+    from app.services.checkpoint_cache import CheckpointHotTier
+    from app.services.checkpointer import PostgresCheckpointer
+
+    class Sesion:
+        def __init__(self):
+            self.filas = []
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def execute(self, statement, params=None):
+            if "INSERT INTO graph_checkpoints" in str(statement):
+                self.filas += [
+                    (params[f"checkpoint_id_{i}"], params[f"parent_id_{i}"], params[f"es_snapshot_{i}"])
+                    for i in range(len(params) // 8)
+                ]
+
+            class Vacio:
+                def fetchall(self):
+                    return []
+            return Vacio()
+
+        async def commit(self):
+            pass
+
+    monkeypatch.setattr(settings, "CHECKPOINT_MODE", "delta")
+    sesion = Sesion()
+    saver = PostgresCheckpointer(lambda: sesion, durable=True, hot_tier=CheckpointHotTier(0))
+    grafo = StateGraph(Estado)
+    grafo.add_node("extraer", extraer)
+    grafo.add_node("responder", responder)
+    grafo.set_entry_point("extraer")
+    grafo.add_edge("extraer", "responder")
+    grafo.add_edge("responder", END)
+    app = grafo.compile(checkpointer=saver)
+    asyncio.run(app.ainvoke(
+        {"messages": [HumanMessage(content="hola")], "extracted_data": {}, "mensaje_count": 0},
+        {"configurable": {"thread_id": "t1"}},
+    ))
+
+    ids = [fila[0] for fila in sesion.filas]
+    assert [fila[2] for fila in sesion.filas][:2] == [True, False]
+    # Cada fila apunta a una fila escrita: las cadenas se pueden reconstruir
+    assert all(padre in ids for _, padre, _ in sesion.filas[1:])
+
+
+def test_tips_acotados_por_bytes():
+    from app.services.checkpointer import PostgresCheckpointer
+
+    saver = PostgresCheckpointer()
+    checkpoint = checkpoints_reales(turnos=2)[-1]
+    saver._remember(("t1", ""), ThreadTip("c1", checkpoint, 0))
+    tam = saver._tips_bytes
+    saver.max_tips_bytes = tam * 2
+
+    saver._remember(("t2", ""), ThreadTip("c1", checkpoint, 0))
+    saver._remember(("t1", ""), ThreadTip("c2", checkpoint, 1))
+    saver._remember(("t3", ""), ThreadTip("c1", checkpoint, 0))
+    # t2 era el menos reciente; reescribir t1 no duplica su tamaño
+    assert list(saver._tips) == [("t1", ""), ("t3", "")]
+    assert saver._tips_bytes == tam * 2
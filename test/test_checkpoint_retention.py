@@ -0,0 +1,140 @@
+import asyncio
+
+from langchain_core.messages import HumanMessage
+
+from app.services.checkpoint_delta import ThreadTip, compute_delta
+from app.services.checkpoint_retention import CheckpointRetention
+from app.services.checkpoint_serde import CheckpointSerializer
+
+serde = CheckpointSerializer("msgpack")
+
+
+class FakeResult:
+    def __init__(self, rows=(), rowcount=0):
+        self.rows = list(rows)
+        self.rowcount = rowcount
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeDB:
+    """Responde cada sentencia con la siguiente respuesta guionizada de su tipo"""
+
+    def __init__(self, finalizadas=(), cadena=(), borrados=(), podas=(), cortes=()):
+        self.respuestas = {
+            "finalizadas": [FakeResult(finalizadas)],
+            "cortes": [FakeResult(cortes)],
+            "cadena": [FakeResult(cadena)],
+            "borrar": [FakeResult(rowcount=n) for n in borrados],
+            "podar": [FakeResult(rowcount=n) for n in podas],
+        }
+        self.log = []
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, params=None):
+        sql = str(statement)
+        if "HAVING COUNT" in sql:
+            tipo = "finalizadas"
+        elif "WITH RECURSIVE" in sql:
+            tipo = "cadena"
+        elif "UPDATE graph_checkpoints" in sql:
+            self.log.append(("actualizar", params))
+            return FakeResult(rowcount=1)
+        elif "ROW_NUMBER()" in sql:
+            tipo = "cortes"
+        elif "unnest" in sql:
+            tipo = "podar"
+        else:
+            tipo = "borrar"
+        self.log.append((tipo, params))
+        cola = self.respuestas[tipo]
+        return cola.pop(0) if cola else FakeResult()
+
+    async def commit(self):
+        self.log.append(("commit", None))
+
+
+def cadena_con_deltas(n: int = 3) -> tuple:
+    """Filas (data, metadata, id, padre, es_snapshot): snapshot + n-1 deltas"""
+    filas, tip, final = [], None, None
+    for i in range(n):
+        final = {
+            "v": 1, "id": f"c{i}", "ts": "",
+            "channel_values": {"messages": [HumanMessage(content=f"m{j}") for j in range(i + 1)]},
+            "channel_versions": {"messages": i + 1},
+            "versions_seen": {},
+        }
+        payload = {"delta": compute_delta(final, tip)} if tip else {"checkpoint": final}
+        filas.append((serde.dumps({**payload, "metadata": {"step": i}, "new_versions": {}}),
+                      {"step": i}, f"c{i}", f"c{i - 1}" if i else None, tip is None))
+        tip = ThreadTip(f"c{i}", final, i)
+    return filas, final
+
+
+def test_finalizada_queda_en_un_snapshot_y_borra_por_lotes():
+    filas, final = cadena_con_deltas()
+    db = FakeDB(finalizadas=[("s1", "")], cadena=filas, borrados=[2, 2, 1], podas=[0])
+    retencion = CheckpointRetention(batch_size=2, max_batches=10, pause_s=0, serializer=serde, session_factory=db)
+
+    resultado = asyncio.run(retencion.run_once())
+
+    tipos = [t for t, _ in db.log]
+    # El snapshot final se confirma antes de borrar nada
+    assert tipos.index("commit") < tipos.index("borrar")
+    _, update = next(e for e in db.log if e[0] == "actualizar")
+    assert update["checkpoint_id"] == "c2"
+    assert serde.loads(update["data"])["checkpoint"] == final
+    borrados = [p for t, p in db.log if t == "borrar"]
+    assert len(borrados) == 3 and all(p["checkpoint_id"] == "c2" for p in borrados)
+    assert resultado == {"deleted": 5, "compacted": 1, "batches": 3}
+
+
+def test_ultimo_snapshot_no_se_reescribe():
+    filas, _ = cadena_con_deltas(1)
+    db = FakeDB(finalizadas=[("s1", "")], cadena=filas, borrados=[0], podas=[0])
+    asyncio.run(CheckpointRetention(pause_s=0, serializer=serde, session_factory=db).run_once())
+    assert "actualizar" not in [t for t, _ in db.log]
+
+
+def test_poda_activos_acotada_por_max_batches():
+    cortes = [(f"s{i}", "", f"t{i}") for i in range(3)]
+    db = FakeDB(cortes=cortes, podas=[100] * 10)
+    retencion = CheckpointRetention(keep=5, batch_size=100, max_batches=3, pause_s=0, session_factory=db)
+
+    resultado = asyncio.run(retencion.run_once())
+
+    # La ventana sobre toda la tabla se calcula una vez por pasada, no por lote
+    assert [p for t, p in db.log if t == "cortes"] == [{"keep": 5}]
+    podas = [p for t, p in db.log if t == "podar"]
+    assert len(podas) == 3 and podas[0]["thread_ids"] == ["s0", "s1", "s2"]
+    assert podas[0]["desdes"] == ["t0", "t1", "t2"] and podas[0]["batch"] == 100
+    assert resultado["deleted"] == 300
+    assert retencion.stats()["deleted"] == 300 and retencion.stats()["runs"] == 1
+
+
+def test_poda_activos_avanza_por_grupos_de_hilos():
+    cortes = [(f"s{i}", "", f"t{i}") for i in range(5)]
+    db = FakeDB(cortes=cortes, podas=[2, 1, 1, 0])
+    retencion = CheckpointRetention(batch_size=2, max_batches=10, pause_s=0, session_factory=db)
+
+    resultado = asyncio.run(retencion.run_once())
+
+    grupos = [p["thread_ids"] for t, p in db.log if t == "podar"]
+    # Un grupo lleno se repite; uno que no llena el lote da paso al siguiente
+    assert grupos == [["s0", "s1"], ["s0", "s1"], ["s2", "s3"], ["s4"]]
+    assert resultado["deleted"] == 4
+
+
+def test_sin_hilos_que_podar_no_borra():
+    db = FakeDB()
+    resultado = asyncio.run(CheckpointRetention(pause_s=0, session_factory=db).run_once())
+    assert "podar" not in [t for t, _ in db.log] and resultado["deleted"] == 0
@@ -0,0 +1,112 @@
+import pickle
+from datetime import datetime, timezone
+from decimal import Decimal
+from uuid import uuid4
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from app.services.checkpoint_serde import CheckpointSerializer, ZSTD_AVAILABLE
+
+
+class Externo:
+    """Tipo sin codificación propia: viaja como pickle embebido"""
+
+    def __init__(self, valor):
+        self.valor = valor
+
+    def __eq__(self, otro):
+        return isinstance(otro, Externo) and otro.valor == self.valor
+
+
+def checkpoint(mensajes: int = 6) -> dict:
+    return {
+        "checkpoint": {
+            "id": "1f1c9df8",
+            "channel_values": {
+                "messages": [
+                    HumanMessage(content=f"hola {i}") if i % 2 == 0
+                    else AIMessage(content=f"respuesta {i}", response_metadata={"finish_reason": "stop"})
+                    for i in range(mensajes)
+                ] + [ToolMessage(content="ok", tool_call_id="t1")],
+                "extracted_data": {"nombre": "Ana", "presupuesto_declarado": 800, "es_decisor": True},
+                "creado": datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+                "precio": Decimal("299.90"),
+                "otro": Externo(3),
+            },
+        },
+        "metadata": {"step": 3, 7: "clave no str"},
+        "new_versions": {"messages": "0003.0.1"},
+    }
+
+
+@pytest.mark.parametrize("fmt", ["msgpack", "orjson"])
+def test_round_trip(fmt):
+    serde = CheckpointSerializer(fmt)
+    data = checkpoint()
+    restaurado = serde.loads(serde.dumps(data))
+
+    valores = restaurado["checkpoint"]["channel_values"]
+    assert valores["messages"] == data["checkpoint"]["channel_values"]["messages"]
+    assert type(valores["messages"][1]) is AIMessage
+    assert valores["creado"] == data["checkpoint"]["channel_values"]["creado"]
+    assert valores["precio"] == Decimal("299.90")
+    assert valores["otro"] == Externo(3)
+    assert restaurado["metadata"]["step"] == 3
+
+    # Los defaults mutables no se comparten entre mensajes reconstruidos
+    a, b = valores["messages"][1], valores["messages"][3]
+    a.tool_calls.append({"name": "x", "args": {}, "id": "1"})
+    assert b.tool_calls == []
+
+
+def test_msgpack_conserva_uuid_y_tuplas():
+    serde = CheckpointSerializer("msgpack")
+    valor = {"id": uuid4(), "par": (1, "a"), "conjunto": {1, 2}}
+    assert serde.loads(serde.dumps(valor)) == valor
+
+
+def test_lee_checkpoints_antiguos_en_pickle():
+    data = checkpoint()
+    legado = pickle.dumps(data)
+    restaurado = CheckpointSerializer("msgpack").loads(legado)
+    assert restaurado["checkpoint"]["channel_values"]["messages"] == data["checkpoint"]["channel_values"]["messages"]
+
+
+@pytest.mark.skipif(not ZSTD_AVAILABLE, reason="zstandard no instalado")
+def test_zstd_solo_por_encima_del_minimo():
+    serde = CheckpointSerializer("msgpack", zstd_level=3)
+    grande = checkpoint(mensajes=40)
+    blob = serde.dumps(grande)
+    assert blob[0] == 0x11
+    assert len(blob) < len(CheckpointSerializer("msgpack").dumps(grande))
+    assert serde.loads(blob)["checkpoint"]["id"] == "1f1c9df8"
+
+    assert serde.dumps({"a": 1})[0] == 0x01  # payload pequeño: sin comprimir
+    # Un lector sin compresión configurada también descomprime
+    assert CheckpointSerializer("msgpack").loads(blob)["checkpoint"]["id"] == "1f1c9df8"
+
+
+def test_cabecera_desconocida():
+    with pytest.raises(ValueError):
+        CheckpointSerializer().loads(b"\x07datos")
+
+
+def test_pickle_embebido_se_cuenta(capsys):
+    from app.services.metrics import metrics
+
+    antes = metrics.snapshot()["counters"].get("checkpoint.pickle_fallbacks", 0)
+    serde = CheckpointSerializer("msgpack")
+    serde.dumps({"a": Externo(1), "b": Externo(2)})
+    assert metrics.snapshot()["counters"]["checkpoint.pickle_fallbacks"] == antes + 2
+    # Un aviso por tipo, no por objeto
+    assert capsys.readouterr().out.count("Externo serializado con pickle") <= 1
+
+
+def test_aviso_si_falta_zstandard(monkeypatch, capsys):
+    from app.services import checkpoint_serde
+
+    monkeypatch.setattr(checkpoint_serde, "ZSTD_AVAILABLE", False)
+    serde = CheckpointSerializer("msgpack", zstd_level=3)
+    assert serde.zstd_level == 0
+    assert "CHECKPOINT_ZSTD_LEVEL=3" in capsys.readouterr().out
@@ -0,0 +1,318 @@
+import asyncio
+import inspect
+import json
+import operator
+import re
+from typing import Annotated, Sequence, TypedDict
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langgraph.graph import END, StateGraph
+
+from app.config import settings
+from app.services.checkpoint_cache import CheckpointHotTier
+from app.services import checkpointer
+from app.services.checkpointer import INSERT_COLUMNS, PostgresCheckpointer
+
+
+class Estado(TypedDict):
+    messages: Annotated[Sequence[BaseMessage], operator.add]
+    mensaje_count: int
+
+
+def responder(state: Estado) -> dict:
+    return {
+        "messages": [AIMessage(content=f"respuesta {state['mensaje_count']}")],
+        "mensaje_count": state["mensaje_count"] + 1,
+    }
+
+
+class FakeResult:
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeSession:
+    """Sesión sin BD: guarda los INSERT en memoria y responde las lecturas del checkpointer"""
+
+    def __init__(self, fallar: bool = False):
+        self.inserts = []
+        self.filas = {}
+        self.selects = 0
+        self.queries = []
+        self.commits = 0
+        self.fallar = fallar
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, params=None):
+        sql = str(statement)
+        if "INSERT INTO graph_checkpoints" in sql:
+            if self.fallar:
+                raise RuntimeError("BD caída")
+            self.inserts.append(params)
+            for i in range(len(params) // 8):
+                fila = {c: params[f"{c}_{i}"] for c in INSERT_COLUMNS}
+                self.filas[fila["checkpoint_id"]] = fila
+            return FakeResult()
+        self.selects += 1
+        self.queries.append((sql, dict(params or {})))
+        if "WITH RECURSIVE" in sql:
+            return FakeResult(self._cadena(params.get("checkpoint_id")))
+        if "ORDER BY created_at DESC, checkpoint_id DESC" in sql:
+            return FakeResult(self._pagina(sql, params))
+        return FakeResult()
+
+    @staticmethod
+    def _row(fila, created_at=False):
+        row = (fila["checkpoint_data"], json.loads(fila["metadata"]), fila["checkpoint_id"],
+               fila["parent_id"], fila["es_snapshot"])
+        return row + (fila["created_at"],) if created_at else row
+
+    def _ordenadas(self):
+        return sorted(self.filas.values(), key=lambda f: (f["created_at"], f["checkpoint_id"]), reverse=True)
+
+    def _cadena(self, checkpoint_id):
+        if not self.filas:
+            return []
+        actual = checkpoint_id or self._ordenadas()[0]["checkpoint_id"]
+        cadena = []
+        while actual in self.filas:
+            fila = self.filas[actual]
+            cadena.append(self._row(fila))
+            if fila["es_snapshot"]:
+                break
+            actual = fila["parent_id"]
+        return cadena[::-1]
+
+    def _pagina(self, sql, params):
+        filas = self._ordenadas()
+        if "before_id" in params:
+            b = self.filas[params["before_id"]]
+            filas = [f for f in filas if (f["created_at"], f["checkpoint_id"]) < (b["created_at"], b["checkpoint_id"])]
+        if "cursor_at" in params:
+            cursor = (params["cursor_at"], params["cursor_id"])
+            filas = [f for f in filas if (f["created_at"], f["checkpoint_id"]) < cursor]
+        if "filter" in params:
+            filtro = json.loads(params["filter"]).items()
+            filas = [f for f in filas if filtro <= json.loads(f["metadata"]).items()]
+        limite = int(re.search(r"LIMIT (\d+)", sql).group(1))
+        return [self._row(f, created_at=True) for f in filas[:limite]]
+
+    async def commit(self):
+        self.commits += 1
+
+
+def grafo(saver):
+    g = StateGraph(Estado)
+    g.add_node("responder", responder)
+    g.set_entry_point("responder")
+    g.add_edge("responder", END)
+    return g.compile(checkpointer=saver)
+
+
+def turno(app, texto: str) -> dict:
+    config = {"configurable": {"thread_id": "t1"}}
+    entrada = {"messages": [HumanMessage(content=texto)], "mensaje_count": 0}
+    return asyncio.run(app.ainvoke(entrada, config))
+
+
+def test_turnos_en_buffer_y_un_insert_multi_fila(monkeypatch):
+    monkeypatch.setattr(settings, "CHECKPOINT_MODE", "delta")
+    session = FakeSession()
+    # Sin nivel caliente: el segundo turno tiene que salir del buffer
+    saver = PostgresCheckpointer(lambda: session, durable=False, hot_tier=CheckpointHotTier(0))
+    app = grafo(saver)
+
+    turno(app, "hola")
+    estado = turno(app, "sigo aquí")
+
+    # El segundo turno parte del primero leyendo el buffer, sin tocar la BD
+    assert [m.content for m in estado["messages"]] == [
+        "hola", "respuesta 0", "sigo aquí", "respuesta 0",
+    ]
+    assert session.selects == 1
+    assert session.inserts == []
+
+    filas = len(saver._buffer[("t1", "")])
+    assert asyncio.run(saver.flush("t1")) == filas
+    assert len(session.inserts) == 1 and session.commits == 1
+    params = session.inserts[0]
+    assert len(params) == filas * 8
+    assert params["es_snapshot_0"] is True
+    assert params["es_snapshot_1"] is False
+    # created_at por fila: el más reciente es el último checkpoint del turno
+    fechas = [params[f"created_at_{i}"] for i in range(filas)]
+    assert fechas == sorted(fechas)
+    assert saver._buffer == {}
+
+
+def test_durable_escribe_cada_checkpoint():
+    session = FakeSession()
+    saver = PostgresCheckpointer(lambda: session, durable=True, hot_tier=CheckpointHotTier(0))
+    turno(grafo(saver), "hola")
+
+    assert len(session.inserts) == session.commits > 1
+    assert all(len(p) == 8 for p in session.inserts)
+    assert saver._buffer == {}
+
+
+def test_flush_fallido_fuerza_snapshot(monkeypatch):
+    monkeypatch.setattr(settings, "CHECKPOINT_MODE", "delta")
+    session = FakeSession(fallar=True)
+    saver = PostgresCheckpointer(lambda: session, durable=False, hot_tier=CheckpointHotTier(0))
+    turno(grafo(saver), "hola")
+
+    assert asyncio.run(saver.flush("t1")) == 0
+    # El siguiente checkpoint no puede ser delta de filas que no se escribieron
+    assert saver._tips == {}
+
+
+def test_nivel_caliente_sirve_el_ultimo_checkpoint():
+    session = FakeSession()
+    hot = CheckpointHotTier(1024 * 1024)
+    saver = PostgresCheckpointer(lambda: session, durable=False, hot_tier=hot)
+    app = grafo(saver)
+
+    turno(app, "hola")
+    asyncio.run(saver.flush())
+    estado = turno(app, "sigo aquí")
+
+    assert len(estado["messages"]) == 4
+    # Solo el primer turno (hilo nuevo) llega a la BD
+    assert session.selects == 1
+    assert hot.hits == 1 and hot.misses == 1
+
+
+def test_alist_generador_paginado_con_before_y_filter(monkeypatch):
+    monkeypatch.setattr(settings, "CHECKPOINT_MODE", "delta")
+    monkeypatch.setattr(checkpointer, "LIST_PAGE_SIZE", 2)
+    session = FakeSession()
+    saver = PostgresCheckpointer(lambda: session, durable=False, hot_tier=CheckpointHotTier(0))
+    app = grafo(saver)
+    for texto in ("hola", "sigo aquí", "adiós"):
+        turno(app, texto)
+    config = {"configurable": {"thread_id": "t1"}}
+
+    async def todos(**kwargs):
+        gen = saver.alist(config, **kwargs)
+        assert inspect.isasyncgen(gen)
+        return [t async for t in gen]
+
+    # alist vuelca el buffer antes de leer
+    historial = asyncio.run(todos())
+    assert len(historial) == len(session.filas) == 9
+    # Cada delta reconstruido en la página coincide con su cadena completa
+    esperado = [asyncio.run(saver.aget_tuple(t.config)).checkpoint for t in historial]
+    assert [t.checkpoint for t in historial] == esperado
+    assert len(historial[0].checkpoint["channel_values"]["messages"]) == 6
+    # Páginas de 2 filas: las primeras con cursor, sin cargar todo el hilo
+    paginas = [p for sql, p in session.queries if "checkpoint_id DESC" in sql]
+    assert len(paginas) == 5 and "cursor_at" in paginas[-1]
+
+    assert len(asyncio.run(todos(limit=3))) == 3
+    anteriores = asyncio.run(todos(before=historial[2].config))
+    assert [t.config for t in anteriores] == [t.config for t in historial[3:]]
+    pasos = asyncio.run(todos(filter={"source": "input"}))
+    assert len(pasos) == 3 and all(t.metadata["source"] == "input" for t in pasos)
+
+
+def test_initialize_system_conecta_el_checkpointer(monkeypatch):
+    from app.agents import graph_system
+
+    monkeypatch.setattr(graph_system.SalesAgent, "_instance", None)
+    saver = PostgresCheckpointer(lambda: FakeSession(), hot_tier=CheckpointHotTier(0))
+
+    async def default_checkpointer():
+        return saver
+
+    monkeypatch.setattr(graph_system, "default_checkpointer", default_checkpointer)
+    agent = asyncio.run(graph_system.initialize_system("sk-x"))
+    assert agent.checkpointer is saver and agent.graph.checkpointer is saver
+
+    # Un checkpointer posterior no se ignora: se recompila el grafo con él
+    otro = PostgresCheckpointer(lambda: FakeSession(), hot_tier=CheckpointHotTier(0))
+    assert asyncio.run(graph_system.initialize_system("sk-x", otro)) is agent
+    assert agent.graph.checkpointer is otro
+    assert asyncio.run(graph_system.initialize_system("sk-x")).checkpointer is otro
+
+
+def test_nivel_caliente_solo_tras_flush_y_discard_limpia_el_hilo(monkeypatch):
+    monkeypatch.setattr(settings, "CHECKPOINT_MODE", "delta")
+    session = FakeSession()
+    hot = CheckpointHotTier(1024 * 1024)
+    saver = PostgresCheckpointer(lambda: session, durable=False, hot_tier=hot)
+    app = grafo(saver)
+
+    turno(app, "hola")
+    assert asyncio.run(saver.flush("t1")) > 0
+    assert hot.get(("t1", ""))
+
+    # Turno cuyo commit falla: nada de él puede sobrevivir
+    turno(app, "sigo aquí")
+    assert hot.get(("t1", "")) is None  # el nivel caliente no adelanta a la BD
+    saver.discard("t1")
+    assert saver._buffer == {} and saver._tips == {} and saver._pending_hot == {}
+    assert asyncio.run(saver.flush("t1")) == 0
+
+    # El siguiente turno parte de lo confirmado en la BD
+    estado = turno(app, "otra vez")
+    assert [m.content for m in estado["messages"]] == [
+        "hola", "respuesta 0", "otra vez", "respuesta 0",
+    ]
+
+
+def test_flush_fallido_invalida_el_nivel_caliente():
+    session = FakeSession()
+    hot = CheckpointHotTier(1024 * 1024)
+    saver = PostgresCheckpointer(lambda: session, durable=False, hot_tier=hot)
+    app = grafo(saver)
+    turno(app, "hola")
+    asyncio.run(saver.flush("t1"))
+
+    turno(app, "sigo aquí")
+    session.fallar = True
+    assert asyncio.run(saver.flush("t1")) == 0
+    assert hot.get(("t1", "")) is None and saver._pending_hot == {}
+
+
+def test_commit_fallido_descarta_los_checkpoints_del_turno(monkeypatch):
+    import pytest
+    from app.agents import graph_system
+    from app.services.unit_of_work import TurnUnitOfWork
+
+    class Saver:
+        descartados = []
+        flushes = 0
+
+        def discard(self, thread_id):
+            self.descartados.append(thread_id)
+
+        async def flush(self, thread_id):
+            self.flushes += 1
+
+    class Grafo:
+        async def ainvoke(self, state, config):
+            return {**state, "messages": [AIMessage(content="hola")]}
+
+    async def abierta(db, session_id):
+        return False
+
+    async def commit(self, db):
+        raise RuntimeError("rollback")
+
+    agent = graph_system.SalesAgent.__new__(graph_system.SalesAgent)
+    agent.checkpointer, agent.graph = Saver(), Grafo()
+    monkeypatch.setattr(agent, "_is_conversation_closed", abierta)
+    monkeypatch.setattr(TurnUnitOfWork, "commit", commit)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(agent.process_message(db=None, session_id="s1", message="hola"))
+    assert agent.checkpointer.descartados == ["s1"]
+    assert agent.checkpointer.flushes == 0
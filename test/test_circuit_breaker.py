@@ -0,0 +1,185 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessageChunk
+
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+class Reloj:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+async def ok():
+    return "ok"
+
+
+async def falla():
+    raise RuntimeError("503")
+
+
+def breaker(reloj, **kwargs):
+    opciones = dict(failure_rate=0.5, min_calls=4, window=10, open_s=30, clock=reloj)
+    opciones.update(kwargs)
+    return CircuitBreaker("test", **opciones)
+
+
+def test_abre_por_errores_y_rechaza_sin_llamar():
+    reloj = Reloj()
+    cb = breaker(reloj)
+
+    async def run():
+        await cb.call(ok)
+        await cb.call(ok)
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await cb.call(falla)
+        assert cb.state == "open"
+
+        llamadas = []
+
+        async def registra():
+            llamadas.append(1)
+
+        with pytest.raises(CircuitOpenError):
+            await cb.call(registra)
+        assert not llamadas
+
+    asyncio.run(run())
+    assert cb.stats()["transitions"] == {"closed_to_open": 1}
+
+
+def test_half_open_cierra_con_sonda_ok_y_reabre_si_falla():
+    reloj = Reloj()
+    cb = breaker(reloj, min_calls=1)
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await cb.call(falla)
+        assert cb.is_open
+
+        reloj.t = 31
+        assert not cb.is_open
+        with pytest.raises(RuntimeError):
+            await cb.call(falla)  # la sonda falla: vuelve a abrir
+        assert cb.state == "open"
+
+        reloj.t = 62
+        assert await cb.call(ok) == "ok"
+        assert cb.state == "closed"
+
+    asyncio.run(run())
+    transiciones = cb.stats()["transitions"]
+    assert transiciones["open_to_half_open"] == 2
+    assert transiciones["half_open_to_open"] == 1
+    assert transiciones["half_open_to_closed"] == 1
+
+
+def test_abre_por_latencia_y_timeout_cuenta_como_fallo():
+    reloj = Reloj()
+    cb = breaker(reloj, slow_ms=0, slow_rate=0.5)
+
+    async def run():
+        for _ in range(4):
+            await cb.call(ok)  # todas "lentas" con slow_ms=0
+        assert cb.state == "open"
+        assert cb.last_reason.startswith("lentas")
+
+        otro = breaker(reloj, min_calls=1)
+        with pytest.raises(asyncio.TimeoutError):
+            await otro.call(lambda: asyncio.sleep(1), timeout_s=0.01)
+        assert otro.state == "open"
+
+    asyncio.run(run())
+
+
+def test_half_open_solo_una_sonda():
+    reloj = Reloj()
+    cb = breaker(reloj, min_calls=1)
+    cb.record_failure()
+    reloj.t = 31
+    assert cb.allow()
+    assert not cb.allow()  # el resto sigue degradado hasta que termine la sonda
+    cb.record_success(10)
+    assert cb.state == "closed" and cb.allow()
+
+
+def _agente(monkeypatch, astream):
+    from app.agents import graph_system
+
+    breaker = CircuitBreaker("llm", min_calls=2, window=4, open_s=60)
+    monkeypatch.setattr(graph_system, "llm_breaker", breaker)
+
+    class LLM:
+        def astream(self, messages):
+            return astream()
+
+    agent = graph_system.SalesAgent.__new__(graph_system.SalesAgent)
+    agent.llm = LLM()
+    return agent, breaker
+
+
+def _turno():
+    from langchain_core.messages import HumanMessage
+    from app.services.unit_of_work import TurnUnitOfWork
+
+    state = {
+        "messages": [HumanMessage(content="me interesa, soy el dueño y decido yo")],
+        "lead_id": "l", "conversacion_id": "c", "session_id": "s",
+        "extracted_data": {"nombre": "Ana"}, "profile": "", "cooperatividad": 0,
+        "probability": 0, "interest_signals": [], "current_stage": "x",
+        "productos_recomendados": [{"nombre": "CRM", "descripcion": "d"}],
+        "mensaje_count": 3, "should_close": False, "is_first_interaction": False,
+    }
+    frames = []
+
+    async def on_delta(delta, replace=False):
+        frames.append((delta, replace))
+
+    config = {"configurable": {
+        "uow": TurnUnitOfWork(), "speculation": {}, "pending_messages": [], "on_delta": on_delta,
+    }}
+    return state, config, frames
+
+
+def test_cliente_desconectado_no_abre_el_breaker(monkeypatch):
+    from app.agents.graph_system import DeltaSendError
+
+    async def astream():
+        for texto in ("Hola", " Ana"):
+            yield AIMessageChunk(content=texto)
+
+    agent, breaker = _agente(monkeypatch, astream)
+
+    async def roto(delta):
+        raise ConnectionError("socket cerrado")
+
+    async def run():
+        state, _, _ = _turno()
+        for _ in range(4):
+            with pytest.raises(DeltaSendError):
+                await agent._stream_llm_response(state, "continue", roto)
+
+    asyncio.run(run())
+    assert breaker.state == "closed" and breaker.stats()["window_failures"] == 0
+
+
+def test_error_a_mitad_de_stream_reemplaza_lo_enviado(monkeypatch):
+    async def astream():
+        yield AIMessageChunk(content="Claro Ana, el CRM")
+        raise RuntimeError("503")
+
+    agent, breaker = _agente(monkeypatch, astream)
+    state, config, frames = _turno()
+
+    state = asyncio.run(agent._respond(state, config))
+
+    final = state["messages"][-1].content
+    assert frames[0] == ("Claro Ana, el CRM", False)
+    # La plantilla degradada sustituye al texto parcial: stream == frame final
+    assert frames[-1] == (final, True) and final != "Claro Ana, el CRM"
+    assert breaker.stats()["window_failures"] == 1
@@ -0,0 +1,84 @@
+import numpy as np
+from app.services.embeddings import EmbeddingCache
+from app.services.embedding_disk_cache import DiskEmbeddingCache
+
+DIMENSIONS = 384
+
+
+def vector(seed: int):
+    return np.random.default_rng(seed).random(DIMENSIONS).tolist()
+
+
+def test_lru_byte_budget():
+    entrada = DIMENSIONS * 4 + EmbeddingCache.ENTRY_OVERHEAD
+    cache = EmbeddingCache(max_bytes=entrada * 3)
+
+    for i in range(3):
+        cache.set(f"texto {i}", vector(i))
+
+    # "texto 0" pasa a ser el más reciente; se desaloja "texto 1"
+    assert cache.get("texto 0") is not None
+    cache.set("texto 3", vector(3))
+
+    assert cache.get("texto 1") is None
+    assert cache.get("texto 3") is not None
+    assert cache.bytes_used <= cache.max_bytes
+
+    stats = cache.stats()
+    print(f"\nCache: {stats}")
+    assert stats["entries"] == 3
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+
+
+def test_float32_roundtrip():
+    cache = EmbeddingCache(max_bytes=1024 * 1024)
+    original = vector(42)
+    cache.set("hola", original)
+
+    recuperado = cache.get("hola")
+    assert isinstance(recuperado, list)
+    assert np.allclose(recuperado, original, atol=1e-6)
+
+    # Reescribir la misma clave no duplica bytes
+    usado = cache.bytes_used
+    cache.set("hola", original)
+    assert cache.bytes_used == usado
+
+
+def test_disk_cache_survives_restart(tmp_path):
+    cache = DiskEmbeddingCache(str(tmp_path), "text-embedding-3-small", DIMENSIONS)
+    for i in range(5):
+        cache.set(f"texto {i}", vector(i))
+
+    # Simula un crash a mitad de escritura: fila incompleta al final
+    with open(cache.vectors_path, "ab") as f:
+        f.write(b"\x00" * 10)
+
+    reiniciada = DiskEmbeddingCache(str(tmp_path), "text-embedding-3-small", DIMENSIONS)
+    assert len(reiniciada.index) == 5
+    assert np.allclose(reiniciada.get("texto 3"), vector(3), atol=1e-6)
+    assert reiniciada.get("otro") is None
+
+    reiniciada.set("texto 5", vector(5))
+    assert np.allclose(reiniciada.get("texto 5"), vector(5), atol=1e-6)
+    assert reiniciada.vectors_path.stat().st_size == 6 * DIMENSIONS * 4
+
+
+def test_disk_cache_escribe_fuera_del_event_loop(tmp_path, monkeypatch):
+    import threading
+
+    cache = DiskEmbeddingCache(str(tmp_path), "text-embedding-3-small", DIMENSIONS)
+    hilos = []
+    escribir = cache.set
+    monkeypatch.setattr(cache, "set", lambda *a: hilos.append(threading.current_thread()) or escribir(*a))
+
+    for i in range(3):
+        cache.set_background(f"texto {i}", vector(i))
+    cache.set_background("texto 0", vector(0))
+    cache.flush()
+
+    assert hilos and threading.main_thread() not in hilos
+    assert len(cache.index) == 3 and cache.stats()["pending_writes"] == 0
+    assert np.allclose(cache.get("texto 2"), vector(2), atol=1e-6)
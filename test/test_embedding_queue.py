@@ -0,0 +1,32 @@
+import asyncio
+
+from app.services.embedding_queue import MessageEmbeddingQueue
+
+
+def test_recupera_en_plazo_fijo_aunque_haya_trafico(monkeypatch):
+    cola = MessageEmbeddingQueue(recovery_interval_s=0.05)
+    recuperaciones = []
+    procesados = []
+
+    async def recover():
+        recuperaciones.append(len(procesados))
+        return 0
+
+    async def process(batch):
+        procesados.extend(batch)
+
+    monkeypatch.setattr(cola, "recover", recover)
+    monkeypatch.setattr(cola, "_process", process)
+
+    async def trafico():
+        await cola.start()
+        # Un mensaje cada 10 ms: la cola nunca pasa recovery_interval_s en reposo
+        for i in range(30):
+            cola.enqueue(f"m{i}", "hola")
+            await asyncio.sleep(0.01)
+        await cola.stop()
+
+    asyncio.run(trafico())
+    assert len(procesados) == 30
+    # Arranque + al menos una recuperación periódica con la cola ocupada
+    assert len(recuperaciones) >= 3 and recuperaciones[0] == 0
@@ -0,0 +1,16 @@
+import asyncio
+
+from app.agents import graph_system
+
+
+def test_conversacion_cerrada_devuelve_el_mismo_contrato(monkeypatch):
+    async def cerrada(db, session_id):
+        return True
+
+    agent = graph_system.SalesAgent.__new__(graph_system.SalesAgent)
+    monkeypatch.setattr(agent, "_is_conversation_closed", cerrada)
+    result = asyncio.run(agent.process_message(db=None, session_id="s1", message="hola"))
+
+    # chat.py lee pending_messages en cada turno, también en el de cierre
+    assert result["closed"] is True
+    assert result["pending_messages"] == []
@@ -0,0 +1,82 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from app.services.http_client import ConnectionTracker
+
+
+class KeepAlive(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+def test_tracker_cuenta_handshakes_y_reutilizacion():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAlive)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    tracker = ConnectionTracker(prefix="test_http")
+
+    try:
+        with httpx.Client(event_hooks={"response": [tracker.observe]}) as client:
+            for _ in range(4):
+                client.get(url)
+        with httpx.Client(event_hooks={"response": [tracker.observe]}) as otro:
+            otro.get(url)
+    finally:
+        server.shutdown()
+
+    stats = tracker.stats()
+    assert stats["requests"] == 5
+    assert stats["handshakes"] == 2  # una conexión por cliente
+    assert stats["reused"] == 3
+
+
+def test_tracker_acota_los_ids():
+    from types import SimpleNamespace
+
+    from app.services import http_client
+
+    tracker = ConnectionTracker(prefix="test_ids")
+    for _ in range(http_client.MAX_TRACKED_IDS + 50):
+        # object() no admite weakref: se cuenta por id()
+        tracker.observe(SimpleNamespace(http_version="HTTP/1.1", extensions={"network_stream": object()}))
+    assert len(tracker._ids) <= http_client.MAX_TRACKED_IDS
+
+
+def test_agente_no_conserva_un_cliente_cerrado(monkeypatch):
+    import asyncio
+
+    from app.agents.graph_system import SalesAgent
+    from app.services import http_client
+
+    monkeypatch.setattr(SalesAgent, "_instance", None)
+    agente = SalesAgent.get_instance("sk-x")
+    asyncio.run(http_client.aclose())
+
+    nuevo = SalesAgent.get_instance("sk-x")
+    assert nuevo is not agente
+    assert not nuevo.http_client.is_closed
+
+
+def test_embeddings_no_conservan_un_pool_cerrado():
+    import asyncio
+
+    from app.services import http_client
+    from app.services.embeddings import EmbeddingService
+
+    service = EmbeddingService()
+    asyncio.run(http_client.aclose())
+    service._reopen_if_closed()
+
+    assert not service._async_http.is_closed and not service._sync_http.is_closed
+    assert service.backend.async_client is service.async_client
+    assert service.backend.sync_client is service.sync_client
@@ -0,0 +1,56 @@
+import asyncio
+
+from app.services.hybrid_search import HybridProductSearch, reciprocal_rank_fusion
+
+
+def test_rrf_favours_documents_ranked_by_several_sources():
+    fusion = reciprocal_rank_fusion([
+        ["crm", "dashboard"],          # léxico guías
+        ["crm"],                       # léxico productos
+        ["agentes", "dashboard"],      # vectorial
+    ])
+    ids = [doc_id for doc_id, _ in fusion]
+
+    assert ids[0] == "crm"
+    assert set(ids) == {"crm", "dashboard", "agentes"}
+    # dashboard aparece en dos rankings (2º y 2º) y supera a agentes (1º en uno)
+    assert ids.index("dashboard") < ids.index("agentes")
+
+
+class _Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+
+class _DB:
+    """(producto_id, slug, rank_guia, rank_producto) como LEXICAL_PRODUCTS"""
+
+    async def execute(self, stmt, params=None):
+        return _Result([
+            ("1", "dashboard", None, None),
+            ("2", "crm-facturacion", 1, 1),
+            ("3", "agentes-ia", None, None),
+        ])
+
+
+def test_detect_product_fuses_lexical_and_vector_rankings():
+    search = HybridProductSearch()
+    search.lexical_available = True
+
+    async def vector_ranking(db, embedding):
+        return ["1"]
+
+    search._vector_ranking = vector_ranking
+
+    slug = asyncio.run(search.detect_product(_DB(), "boleta electrónica SUNAT", [0.1] * 384))
+    assert slug == "crm-facturacion"
+
+    async def sin_vector(db, embedding):
+        return []
+
+    search._vector_ranking = sin_vector
+    search.lexical_available = False
+    assert asyncio.run(search.detect_product(_DB(), "hola", [0.1] * 384)) is None
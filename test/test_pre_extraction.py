@@ -0,0 +1,48 @@
+from app.services.pre_extraction import pre_extract
+
+CAMPOS = [
+    "nombre", "email", "telefono", "sector",
+    "urgencia_dias", "presupuesto_declarado", "es_decisor",
+]
+
+
+def test_acuses_no_llaman_al_llm():
+    for mensaje in ["ok", "sí", "Gracias!", "de acuerdo", "buenas tardes"]:
+        pre = pre_extract(mensaje, CAMPOS)
+        assert not pre.needs_llm and not pre.data
+
+
+def test_reglas_resuelven_sin_llm():
+    pre = pre_extract("Soy Pedro, mi correo es Pedro@Gmail.com, cel 987 654 321", CAMPOS)
+    assert pre.data == {
+        "nombre": "Pedro", "email": "pedro@gmail.com", "telefono": "987654321",
+    }
+    assert not pre.needs_llm
+
+    pre = pre_extract("tengo una tienda online, presupuesto de 900 soles, en 2 semanas", CAMPOS)
+    assert pre.data == {
+        "sector": "ecommerce", "presupuesto_declarado": 900, "urgencia_dias": 14,
+    }
+
+    assert pre_extract("lo decide mi jefe", CAMPOS).data == {"es_decisor": False}
+
+
+def test_indicios_sin_resolver_van_al_llm():
+    pre = pre_extract("podría invertir mil soles", CAMPOS)
+    assert pre.needs_llm and pre.motivo == "presupuesto_declarado"
+
+    # Solo faltaba el nombre y el agente lo acaba de preguntar
+    pre = pre_extract("lucía", ["nombre"], "¿Cuál es tu nombre?")
+    assert pre.needs_llm and not pre.data
+    assert not pre_extract("lucía", ["nombre"], "¿Qué producto te interesa?").needs_llm
+
+    # Campo ya capturado: sus indicios no cuentan
+    assert not pre_extract("mi correo cambió", ["nombre"]).needs_llm
+
+
+def test_verbos_no_son_nombres_y_para_ayer_es_urgente():
+    assert "nombre" not in pre_extract("somos 20 personas", CAMPOS).data
+    assert pre_extract("lo necesito para ayer", CAMPOS).data == {"urgencia_dias": 1}
+    assert pre_extract("ya mismo lo necesito", CAMPOS).data == {"urgencia_dias": 1}
+    # Sin regla que lo resuelva, "ayer" al menos pasa al LLM
+    assert pre_extract("ayer vi la demo, ¿cuándo podrían tenerlo?", ["urgencia_dias"]).needs_llm
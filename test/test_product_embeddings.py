@@ -0,0 +1,38 @@
+import asyncio
+
+from app.services import product_embeddings
+from app.services.embeddings import embedding_service
+
+
+class Sesion:
+    def __init__(self):
+        self.sentencias = []
+
+    async def execute(self, statement, params=None):
+        self.sentencias.append((str(statement).split()[0], dict(params or {})))
+
+
+def test_reindexado_salta_productos_sin_embedding(monkeypatch):
+    async def cargar(db, producto_id):
+        return producto_id, f"Producto {producto_id}", f"texto {producto_id}"
+
+    async def embed(texto):
+        if texto == "texto malo":
+            raise RuntimeError("timeout")
+        if texto == "texto vacio":
+            return [0.0] * 3
+        return [0.1, 0.2, 0.3]
+
+    monkeypatch.setattr(product_embeddings, "_cargar_texto_producto", cargar)
+    monkeypatch.setattr(embedding_service, "embed_text_strict", embed)
+    monkeypatch.setattr(product_embeddings.knowledge_index, "refresh_after_commit", lambda db: None)
+
+    db = Sesion()
+    sincronizados, errores = asyncio.run(
+        product_embeddings.generar_embeddings_productos(db, ["bueno", "malo", "vacio"])
+    )
+
+    assert sincronizados == 1 and len(errores) == 2
+    # Solo el producto con vector válido borra (y reemplaza) su fila anterior
+    borrados = [p["producto_id"] for sql, p in db.sentencias if sql == "DELETE"]
+    assert borrados == ["bueno"]
@@ -0,0 +1,10 @@
+from app.services.rag_retrieval import _retrieval_query
+
+
+def test_mensajes_previos_solo_con_embedding():
+    # Igual que la consulta original: los mensajes que el write-behind aún
+    # no ha embebido no entran como contexto previo
+    for sql_conocimiento in (True, False):
+        sql = str(_retrieval_query(sql_conocimiento))
+        previos = sql[sql.index("mensajes_previos AS"):sql.index("LIMIT 3")]
+        assert "embedding IS NOT NULL" in previos
@@ -0,0 +1,47 @@
+from app.agents.response_templates import ResponseTemplates, TEMPLATES
+
+templates = ResponseTemplates(TEMPLATES, ["greeting", "ask_name_only", "ask_missing_correo"])
+
+
+def test_solo_estrategias_seleccionadas():
+    assert templates.render("ask_sector", {"nombre": "Ana"}) is None
+    assert templates.render("ask_missing_teléfono", {"nombre": "Ana"}) is None
+    assert not templates.handles("continue")
+
+
+def test_slots_y_variantes():
+    texto = templates.render("ask_name_only", {"producto": "Dashboard Analítico"}, seed="c1:1")
+    assert "Dashboard Analítico" in texto and "nombre" in texto
+
+    # Sin producto: solo variantes genéricas, nunca un slot sin rellenar
+    texto = templates.render("ask_name_only", {"producto": None}, seed="c1:1")
+    assert "{" not in texto and "nombre" in texto
+
+    assert "Ana" in templates.render("ask_missing_correo", {"nombre": "Ana"}, seed="x")
+
+    # Estable por seed y sin repetir el mensaje anterior
+    a = templates.render("greeting", {}, seed="c2:0")
+    assert a == templates.render("greeting", {}, seed="c2:0")
+    assert templates.render("greeting", {}, seed="c2:0", previous=a) != a
+    assert len({templates.render("greeting", {}, seed=f"c{i}:0") for i in range(30)}) > 1
+
+
+def test_modo_degradado_cubre_todas_las_estrategias():
+    from app.agents.graph_system import CLOSING_STRATEGIES
+    from app.agents.response_templates import DEGRADED_TEMPLATES
+
+    degradado = ResponseTemplates(TEMPLATES, [], DEGRADED_TEMPLATES)
+    estrategias = {
+        "greeting", "ask_product", "ask_name_only", "ask_sector", "present_ask_contact",
+        "ask_missing_teléfono", "ask_missing_correo", "continue",
+    } | CLOSING_STRATEGIES
+    for strategy in estrategias:
+        # Sin datos del lead siempre hay una variante genérica
+        texto = degradado.render_degraded(strategy, {}, seed="c:1")
+        assert texto and "{" not in texto
+    assert degradado.render("ask_sector", {"nombre": "Ana"}) is None
+
+    texto = degradado.render_degraded(
+        "close_confirmed", {"nombre": "Ana", "producto": "CRM", "email": "a@b.pe"}, seed="c:2"
+    )
+    assert "Ana" in texto and "CRM" in texto
@@ -0,0 +1,64 @@
+import numpy as np
+from app.services.semantic_cache import SemanticCache
+
+DIMENSIONS = 384
+
+
+def vectores(seed: int = 0):
+    rng = np.random.default_rng(seed)
+    base = rng.standard_normal(DIMENSIONS).astype(np.float32)
+    base /= np.linalg.norm(base)
+    return base, rng
+
+
+def test_consultas_casi_identicas_comparten_resultado():
+    base, rng = vectores()
+    cache = SemanticCache(DIMENSIONS)
+    cache.set("producto", base, "dashboard")
+
+    aciertos = 0
+    for _ in range(50):
+        ruido = rng.standard_normal(DIMENSIONS).astype(np.float32)
+        parecida = base + 0.15 * ruido / np.linalg.norm(ruido)  # coseno ~0.99
+        aciertos += cache.get("producto", parecida) == "dashboard"
+    assert aciertos >= 45  # multi-probe: casi siempre encuentra el bucket
+
+    otra = rng.standard_normal(DIMENSIONS)
+    assert cache.get("producto", otra) is None
+    assert cache.get("conocimiento", base) is None  # namespaces separados
+
+
+def test_ttl_version_y_capacidad():
+    base, rng = vectores(1)
+    version = [1]
+    cache = SemanticCache(DIMENSIONS, catalog_version=lambda: version[0], max_entries=3)
+
+    cache.set("producto", base, "crm-facturacion")
+    assert cache.get("producto", base) == "crm-facturacion"
+    version[0] = 2  # recarga del índice = catálogo nuevo
+    assert cache.get("producto", base) is None
+    assert not cache.entries
+
+    cache.set("producto", base, "agentes-ia")
+    cache.entries[next(iter(cache.entries))].expires_at = 0
+    assert cache.get("producto", base) is None
+
+    for i in range(5):
+        cache.set("producto", rng.standard_normal(DIMENSIONS), str(i))
+    assert len(cache.entries) == 3
+    assert sum(len(b) for b in cache.buckets.values()) == 3
+
+
+def test_clave_lexica_separa_cifras_y_codigos():
+    from app.services.semantic_cache import lexical_key
+
+    assert lexical_key("precio del plan 2") != lexical_key("precio del plan 3")
+    assert lexical_key("CRM-500 por 1,200 soles") == lexical_key("1200 soles, el crm-500")
+    assert lexical_key("quiero un dashboard") == ""
+
+    base, _ = vectores(2)
+    cache = SemanticCache(DIMENSIONS)
+    cache.set("producto", base, "crm-basico", lexical_key("precio del plan 2"))
+    # Mismo embedding, otra cifra: no es un acierto
+    assert cache.get("producto", base, lexical_key("precio del plan 3")) is None
+    assert cache.get("producto", base, lexical_key("el plan 2, precio")) == "crm-basico"
@@ -0,0 +1,78 @@
+import numpy as np
+from app.services.vector_index import KnowledgeVectorIndex, KnowledgeEntry, mmr
+
+DIMENSIONS = 384
+TIPOS = ["faq", "objecion", "guia_producto"]
+
+
+def construir_indice(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    vectores = rng.standard_normal((n, DIMENSIONS)).astype(np.float32)
+    entries = [
+        KnowledgeEntry(id=str(i), tipo=TIPOS[i % len(TIPOS)], titulo=f"t{i}", contenido="...")
+        for i in range(n)
+    ]
+    index = KnowledgeVectorIndex(DIMENSIONS)
+    index.build(entries, vectores)
+    return index, vectores, rng
+
+
+def referencia(vectores, query, k, threshold, tipo=None):
+    """Lo que devolvería pgvector: coseno >= threshold, ordenado, LIMIT k"""
+    sims = []
+    for i, v in enumerate(vectores):
+        if tipo and TIPOS[i % len(TIPOS)] != tipo:
+            continue
+        sim = float(v @ query / (np.linalg.norm(v) * np.linalg.norm(query)))
+        if sim >= threshold:
+            sims.append((str(i), sim))
+    return sorted(sims, key=lambda x: -x[1])[:k]
+
+
+def test_search_matches_cosine_reference():
+    index, vectores, rng = construir_indice(300)
+
+    for tipo in (None, "guia_producto"):
+        # Consulta cercana a una fila existente para que haya resultados
+        query = vectores[8] + 0.3 * rng.standard_normal(DIMENSIONS).astype(np.float32)
+        esperado = referencia(vectores, query, k=2, threshold=0.1, tipo=tipo)
+        obtenido = [(e.id, s) for e, s in index.search(query, k=2, threshold=0.1, tipo=tipo)]
+
+        assert [i for i, _ in obtenido] == [i for i, _ in esperado]
+        assert np.allclose([s for _, s in obtenido], [s for _, s in esperado], atol=1e-5)
+
+
+def test_search_threshold_and_zero_query():
+    index, _, rng = construir_indice(50)
+
+    assert index.search(np.zeros(DIMENSIONS), k=2, threshold=0.0) == []
+    # Vector aleatorio: ninguna fila supera 0.9 de similitud
+    assert index.search(rng.standard_normal(DIMENSIONS), k=2, threshold=0.9) == []
+
+
+def test_mmr_evita_casi_duplicados():
+    rng = np.random.default_rng(1)
+    query = rng.standard_normal(DIMENSIONS).astype(np.float32)
+    query /= np.linalg.norm(query)
+    ruido = rng.standard_normal((3, DIMENSIONS)).astype(np.float32)
+    ruido /= np.linalg.norm(ruido, axis=1, keepdims=True)
+
+    # 0 y 1: chunks casi idénticos y muy relevantes; 2: relevante pero distinto
+    base = 0.9 * query + 0.44 * ruido[0]
+    candidatos = np.stack([base, base + 0.01 * ruido[1], 0.8 * query + 0.6 * ruido[2]])
+    candidatos /= np.linalg.norm(candidatos, axis=1, keepdims=True)
+
+    assert mmr(query, candidatos, 2, lambda_=1.0) == [0, 1]
+    assert mmr(query, candidatos, 2, lambda_=0.7) == [0, 2]
+    assert sorted(mmr(query, candidatos, 5)) == [0, 1, 2]
+    assert mmr(query, candidatos[:0], 2) == []
+
+
+def test_search_mmr_devuelve_entries_del_umbral():
+    index, vectores, rng = construir_indice(300)
+    query = rng.standard_normal(DIMENSIONS).astype(np.float32)
+    candidatos = {e.id for e, _ in index.search(query, k=8, threshold=-1.0)}
+    resultado = index.search_mmr(query, k=3, threshold=-1.0, candidates=8)
+    assert len(resultado) == 3
+    assert {e.id for e, _ in resultado} <= candidatos
+    assert index.search_mmr(query, k=3, threshold=2.0, candidates=8) == []